@@ -1,37 +1,119 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+from contextlib import aclosing, asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 import uvicorn
 
-from src.utils.utils import ProcessRequest
+from config import config
+from src.utils.app_container import AppContainer
+from src.utils.llm_scheduler import INTERACTIVE, set_llm_priority
 from src.data_layer.sql_operations import log_request_response
+from src.utils.streaming import sse_stream
+from src.utils.telemetry import HTTP_DURATION, HTTP_ERRORS, get_request_id, render_metrics, set_request_id
+import time
 import uuid
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    container = AppContainer()
+    app.state.container = container
+    await container.start()
+    if config.ingest_on_startup:
+        container.ingestion_service.start_job(trigger="startup")
+
+    yield
+
+    await container.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # Every span, log record and metric of this request carries the same request ID
+    request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+    set_request_id(request_id)
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_DURATION.observe(time.perf_counter() - start_time, method=request.method, path=path, status=status)
+        if status >= 500:
+            HTTP_ERRORS.inc(method=request.method, path=path)
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+TICKER_FIELD_PATTERN = r"^[A-Za-z0-9][A-Za-z0-9._&-]{0,31}$"
+
+# Error bodies answered with their own status: bad or unknown ticker, queue full, no slot in time
+REJECTION_STATUSES = (400, 404, 429, 503)
 
 class ChatRequest(BaseModel):
     query: str
+    # "fast" (single call over prefetched context) or "agentic" (tool-calling loop), defaults to FORECAST_MODE
+    mode: Optional[Literal["fast", "agentic"]] = None
+    # company the question is about, defaults to DEFAULT_TICKER
+    ticker: Optional[str] = Field(default=None, pattern=TICKER_FIELD_PATTERN)
+
+class IngestRequest(BaseModel):
+    # only (re)ingest these companies, every company under the data directory when omitted
+    tickers: Optional[List[str]] = None
+
+@app.post("/ingest", status_code=202)
+async def ingest(request: Optional[IngestRequest] = None):
+    tickers = request.tickers if request is not None else None
+    return app.state.container.ingestion_service.start_job(trigger="api", tickers=tickers)
+
+@app.get("/ingest/{job_id}")
+async def ingest_status(job_id: str):
+    job = app.state.container.ingestion_service.get_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={
+            "status_code": 404,
+            "status_messages": f"Ingestion job {job_id} not found"
+        })
+    return job
 
 @app.post("/chat")
-async def chat(request: ChatRequest):
-    session_id = str(uuid.uuid4())
+async def chat(request: ChatRequest, http_response: Response):
+    session_id = get_request_id() or str(uuid.uuid4())
+    # A user is waiting on this forecast, its LLM calls go ahead of batch work
+    set_llm_priority(INTERACTIVE)
     query = request.query
+    request_data = {"query": query, "mode": request.mode, "ticker": request.ticker}
 
     try:
         # Log incoming request
         await log_request_response(
             request_id=session_id,
-            request_data={"query": query},
+            request_data=request_data,
             response_data={}
         )
 
-        # Process the request
-        process_request = ProcessRequest()
-        response = await process_request.process_request(query, session_id)
+        # Process the request against the company's already-indexed corpus
+        response = await app.state.container.process_request.process_request(
+            query, session_id, request.mode, request.ticker
+        )
+        if "cache_status" in response:
+            http_response.headers["X-Cache"] = response.pop("cache_status")
+        if response.get("status_code") in REJECTION_STATUSES:
+            http_response.status_code = response["status_code"]
+        if "retry_after" in response:
+            http_response.headers["Retry-After"] = str(response["retry_after"])
 
         # Log response
         await log_request_response(
             request_id=session_id,
-            request_data={"query": query},
+            request_data=request_data,
             response_data=response
         )
 
@@ -46,11 +128,69 @@ async def chat(request: ChatRequest):
         # Log error
         await log_request_response(
             request_id=session_id,
-            request_data={"query": query},
+            request_data=request_data,
             response_data=error_response
         )
 
         return error_response
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    session_id = get_request_id() or str(uuid.uuid4())
+    set_llm_priority(INTERACTIVE)
+    query = request.query
+    request_data = {"query": query, "mode": request.mode, "ticker": request.ticker}
+
+    # Log incoming request
+    await log_request_response(
+        request_id=session_id,
+        request_data=request_data,
+        response_data={}
+    )
+
+    stream = app.state.container.process_request.stream_request(query, session_id, request.mode, request.ticker)
+    # The first event tells whether the run was admitted, a rejection is answered with its status
+    first_event = await anext(stream)
+    if first_event["event"] == "result" and first_event["data"].get("status_code") in REJECTION_STATUSES:
+        await stream.aclose()
+        await log_request_response(
+            request_id=session_id,
+            request_data=request_data,
+            response_data=first_event["data"]
+        )
+        headers = {}
+        if "retry_after" in first_event["data"]:
+            headers["Retry-After"] = str(first_event["data"]["retry_after"])
+        return JSONResponse(status_code=first_event["data"]["status_code"], content=first_event["data"], headers=headers)
+
+    async def replay():
+        yield first_event
+        async for event in stream:
+            yield event
+
+    async def events():
+        # Closed explicitly so a disconnect hands the forecast slot back at once
+        async with aclosing(stream), aclosing(replay()) as replayed:
+            async for event in replayed:
+                if event["event"] == "result":
+                    # Log response
+                    await log_request_response(
+                        request_id=session_id,
+                        request_data=request_data,
+                        response_data=event["data"]
+                    )
+                yield event
+
+    return StreamingResponse(
+        sse_stream(
+            events(),
+            is_disconnected=http_request.is_disconnected,
+            queue_size=config.stream_queue_size,
+            heartbeat_seconds=config.stream_heartbeat_seconds
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,328 @@
+"""
+Offline benchmark suite: times the hot paths against the local fakes in benchmarks.fakes,
+so no Groq, Pinecone or Postgres account is needed.
+
+Usage:
+    python -m benchmarks.bench_offline
+    python -m benchmarks.bench_offline --suites chat --concurrency 1,8,32 --requests 200
+    python -m benchmarks.bench_offline --output bench_output.json
+    python -m benchmarks.bench_offline --suites ratelimit --provider-requests 10 --provider-window-seconds 2
+
+Suites:
+    ingestion   ingestion_to_vector over data/ into a fresh in-memory index (cold), then again (unchanged)
+    chunking    StructuredDataHandler.chunk_dataframe on a synthetic frame
+    json        ForecastingAgent.extract_json_from_text on clean, fenced, malformed and truncated outputs
+    chat        end-to-end POST /chat through the ASGI app, per forecast mode and concurrency level
+    ratelimit   a burst of interactive /chat and batch forecasts against a provider with request and
+                token quotas (RateLimitedChatModel), with and without the LLM scheduler
+
+The result is one JSON document (stdout, and --output when given) tagged with the git
+commit, so runs can be compared commit to commit. The pipeline's own progress output
+goes to stderr.
+"""
+import os
+import tempfile
+
+# Offline settings must be in place before config is imported. Extraction workers are
+# spawned processes that re-import this module, they inherit the same state directory.
+_state_dir = os.environ.get("BENCH_STATE_DIR") or tempfile.mkdtemp(prefix="forecast-bench-")
+os.environ["BENCH_STATE_DIR"] = _state_dir
+os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["INGEST_ON_STARTUP"] = "false"
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+os.environ["SPAN_LOGGING"] = "false"
+os.environ["INGESTION_MANIFEST_PATH"] = os.path.join(_state_dir, "manifest.json")
+os.environ["LEXICAL_INDEX_PATH"] = os.path.join(_state_dir, "lexical_index.json")
+os.environ["METRICS_STORE_PATH"] = os.path.join(_state_dir, "metrics.sqlite")
+os.environ.pop("EMBEDDING_CACHE_PATH", None)
+
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+# The pipeline reports progress with print(), keep stdout for the JSON result
+with contextlib.redirect_stdout(sys.stderr):
+    from benchmarks.bench_structured_data import build_frame
+    from benchmarks.fakes import (
+        InMemoryVectorBackend,
+        LocalLogSink,
+        RateLimitedChatModel,
+        SAMPLE_FORECAST,
+        ScriptedChatModel,
+    )
+    from src.data_extraction.structured_data_handler import StructuredDataHandler
+    from src.data_layer import sql_operations
+    from src.data_layer.vectordb_operations import VectorDBOperations
+    from src.forecasting_agent.agent.agent import ForecastingAgent
+    from src.utils.app_container import AppContainer
+    from src.utils.llm_scheduler import LLMScheduler, ScheduledChatModel
+
+
+def latency_summary(latencies):
+    values = np.asarray(latencies) * 1000
+    return {
+        "count": len(latencies),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def build_container(llm_latency_seconds: float) -> AppContainer:
+    forecasting_agent = ForecastingAgent()
+    forecasting_agent.forecasting_llm = ScriptedChatModel(latency_seconds=llm_latency_seconds)
+    return AppContainer(
+        vector_db=VectorDBOperations(backend=InMemoryVectorBackend()),
+        forecasting_agent=forecasting_agent
+    )
+
+
+async def bench_ingestion(container: AppContainer):
+    results = {}
+    for run in ("cold", "unchanged"):
+        start_time = time.perf_counter()
+        result = await container.process_request.ingestion_to_vector(f"bench-{run}")
+        results[run] = {
+            "seconds": round(time.perf_counter() - start_time, 4),
+            "status": result.get("status"),
+            "records_ingested": result.get("records_ingested", 0),
+            "files_skipped": result.get("files_skipped", 0),
+        }
+    return results
+
+
+def bench_chunking(rows: int, chunk_size: int, repeats: int):
+    handler = StructuredDataHandler()
+    df = build_frame(rows)
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        chunks = handler.chunk_dataframe(df, chunk_size)
+        timings.append(time.perf_counter() - start_time)
+    best = min(timings)
+    return {
+        "rows": rows,
+        "chunk_size": chunk_size,
+        "chunks": len(chunks),
+        "best_seconds": round(best, 4),
+        "rows_per_second": round(rows / best),
+    }
+
+
+async def bench_json(iterations: int):
+    agent = ForecastingAgent()
+    clean = json.dumps(SAMPLE_FORECAST, indent=2)
+    samples = {
+        "clean": clean,
+        "fenced": f"```json\n{clean}\n```",
+        "malformed": clean.replace('"forecast": {', '"forecast": {,', 1)[:-1],
+        "truncated": clean[:len(clean) * 2 // 3],
+    }
+    results = {}
+    for name, text in samples.items():
+        parsed = await agent.extract_json_from_text(text)
+        start_time = time.perf_counter()
+        for _ in range(iterations):
+            await agent.extract_json_from_text(text)
+        seconds = time.perf_counter() - start_time
+        results[name] = {
+            "iterations": iterations,
+            "microseconds_per_call": round(seconds / iterations * 1e6, 2),
+            "fields_parsed": len(parsed or {}),
+        }
+    await agent.aclose()
+    return results
+
+
+async def bench_chat(app, mode: str, concurrency: int, requests: int):
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i):
+            async with semaphore:
+                start_time = time.perf_counter()
+                response = await client.post("/chat", json={"query": f"Forecast revenue for next quarter #{i}", "mode": mode})
+                latencies.append(time.perf_counter() - start_time)
+                status = str(response.json().get("status_code", response.status_code))
+                statuses[status] = statuses.get(status, 0) + 1
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(requests)])
+        elapsed = time.perf_counter() - start_time
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": requests,
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(requests / elapsed, 2),
+        "latency": latency_summary(latencies),
+        "status_codes": statuses,
+    }
+
+
+async def bench_ratelimit(app, container: AppContainer, args):
+    """
+    The same burst of interactive (/chat) and batch (direct) fast path forecasts against a
+    fresh rate-limited provider, once calling it directly and once through the scheduler
+    configured with the provider's budgets.
+    """
+    transport = httpx.ASGITransport(app=app)
+    window_seconds = args.provider_window_seconds
+    original_llm = container.forecasting_agent.forecasting_llm
+    results = []
+    try:
+        for scheduled in (False, True):
+            provider = RateLimitedChatModel(
+                latency_seconds=args.llm_latency_ms / 1000,
+                requests_per_window=args.provider_requests,
+                tokens_per_window=args.provider_tokens,
+                window_seconds=window_seconds
+            )
+            llm = provider
+            if scheduled:
+                scheduler = LLMScheduler(
+                    requests_per_minute=args.provider_requests,
+                    tokens_per_minute=args.provider_tokens,
+                    period_seconds=window_seconds,
+                    backoff_base_seconds=window_seconds / 20,
+                    backoff_max_seconds=window_seconds
+                )
+                llm = ScheduledChatModel(model=provider, scheduler=scheduler)
+            container.forecasting_agent.forecasting_llm = llm
+
+            latencies = {"interactive": [], "batch": []}
+            statuses = {"interactive": {}, "batch": {}}
+
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                async def one(priority, i):
+                    query = f"Forecast {priority} revenue for next quarter #{i}"
+                    start_time = time.perf_counter()
+                    if priority == "interactive":
+                        response = await client.post("/chat", json={"query": query, "mode": "fast"})
+                        status = str(response.json().get("status_code", response.status_code))
+                    else:
+                        response = await container.process_request.process_request(query, f"bench-batch-{i}", "fast")
+                        status = str(response.get("status_code"))
+                    latencies[priority].append(time.perf_counter() - start_time)
+                    statuses[priority][status] = statuses[priority].get(status, 0) + 1
+
+                start_time = time.perf_counter()
+                # Batch work is queued first, interactive requests arrive while it is waiting
+                batch = [asyncio.create_task(one("batch", i)) for i in range(args.batch_requests)]
+                await asyncio.sleep(0)
+                await asyncio.gather(*[one("interactive", i) for i in range(args.requests)], *batch)
+                elapsed = time.perf_counter() - start_time
+
+            results.append({
+                "scheduled": scheduled,
+                "seconds": round(elapsed, 4),
+                "provider_accepted": provider.quota.accepted,
+                "provider_rate_limited": provider.quota.rejected,
+                "interactive": {"latency": latency_summary(latencies["interactive"]), "status_codes": statuses["interactive"]},
+                "batch": {"latency": latency_summary(latencies["batch"]), "status_codes": statuses["batch"]},
+            })
+    finally:
+        container.forecasting_agent.forecasting_llm = original_llm
+    return results
+
+
+async def run(args):
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "suites": {},
+    }
+    suites = args.suites.split(",")
+
+    if "chunking" in suites:
+        results["suites"]["chunking"] = bench_chunking(args.rows, args.chunk_size, args.repeats)
+
+    if "json" in suites:
+        results["suites"]["json"] = await bench_json(args.json_iterations)
+
+    if "ingestion" in suites or "chat" in suites or "ratelimit" in suites:
+        log_sink = LocalLogSink()
+        sql_operations.log_writer.sink = log_sink.write
+        container = build_container(args.llm_latency_ms / 1000)
+        try:
+            await container.start()
+            ingestion = await bench_ingestion(container)
+            if "ingestion" in suites:
+                results["suites"]["ingestion"] = ingestion
+
+            with contextlib.redirect_stdout(sys.stderr):
+                from app import app
+            app.state.container = container
+
+            if "chat" in suites:
+                chat_results = []
+                for mode in args.modes.split(","):
+                    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                        chat_results.append(await bench_chat(app, mode, concurrency, args.requests))
+                results["suites"]["chat"] = chat_results
+
+            if "ratelimit" in suites:
+                results["suites"]["ratelimit"] = await bench_ratelimit(app, container, args)
+        finally:
+            await container.shutdown()
+        results["log_sink"] = log_sink.stats()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", default="ingestion,chunking,json,chat")
+    parser.add_argument("--modes", default="fast,agentic", help="Forecast modes for the chat suite")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma separated concurrency levels for the chat suite")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per mode and concurrency level")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Simulated latency of every LLM call")
+    parser.add_argument("--batch-requests", type=int, default=16, help="Batch forecasts of the ratelimit suite")
+    parser.add_argument("--provider-requests", type=int, default=10, help="Requests the fake provider accepts per window")
+    parser.add_argument("--provider-tokens", type=int, default=200000, help="Tokens the fake provider accepts per window")
+    parser.add_argument("--provider-window-seconds", type=float, default=2.0, help="Quota window of the fake provider")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows of the synthetic frame for the chunking suite")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json-iterations", type=int, default=2000)
+    parser.add_argument("--output", type=str, default=None, help="Also write the JSON result to this file")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(run(args))
+    document = json.dumps(results, indent=2)
+    print(document)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(document + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
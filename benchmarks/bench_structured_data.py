@@ -0,0 +1,139 @@
+"""
+Throughput benchmark for StructuredDataHandler on a large synthetic workbook.
+
+Usage:
+    python -m benchmarks.bench_structured_data --rows 100000
+    python -m benchmarks.bench_structured_data --rows 100000 --workbook /tmp/bench.xlsx
+
+With --workbook the synthetic frame is written to an .xlsx file once and the full
+load_and_chunk_excel path is timed as well. The row-wise implementation this module
+replaced is kept below as a reference so the speedup can be measured side by side.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.data_extraction.structured_data_handler import StructuredDataHandler
+
+
+def build_frame(rows: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    periods = pd.period_range("2000Q1", periods=rows, freq="Q").astype(str)
+    segments = np.array(["BFSI", "Retail", "Manufacturing", "Life Sciences", "Communications", "Technology"])
+    return pd.DataFrame({
+        "Period": periods,
+        "Segment": segments[rng.integers(0, len(segments), rows)],
+        "Sales": rng.normal(60000, 5000, rows).round(2),
+        "Expenses": rng.normal(45000, 4000, rows).round(2),
+        "Operating Profit": rng.normal(15000, 2000, rows).round(2),
+        "Net profit": rng.normal(12000, 1500, rows).round(2),
+        "OPM": rng.uniform(0.2, 0.3, rows).round(4),
+        "Employees": rng.integers(1000, 50000, rows),
+    })
+
+
+def legacy_chunk_dataframe(handler: StructuredDataHandler, df: pd.DataFrame, chunk_size: int):
+    """The previous iterrows/per-row tokenization implementation, for comparison."""
+    chunks = []
+    header_str = ','.join([str(i) for i in df.columns])
+    header_size = handler.estimate_tokens(header_str)
+    current_chunk = []
+    current_chunk_size = header_size
+
+    for _, row in df.iterrows():
+        row_str = ','.join(map(str, row.values))
+        row_size = handler.estimate_tokens(row_str)
+
+        if row_size > (chunk_size - header_size):
+            if current_chunk:
+                chunks.append(pd.DataFrame(current_chunk, columns=df.columns))
+                current_chunk = []
+                current_chunk_size = header_size
+            chunks.append(pd.DataFrame([row.to_dict()], columns=df.columns))
+            continue
+
+        if current_chunk and (current_chunk_size + row_size) > chunk_size:
+            chunks.append(pd.DataFrame(current_chunk, columns=df.columns))
+            current_chunk = []
+            current_chunk_size = header_size
+
+        current_chunk.append(row.to_dict())
+        current_chunk_size += row_size
+
+    if current_chunk:
+        chunks.append(pd.DataFrame(current_chunk, columns=df.columns))
+    return chunks
+
+
+def chunk_rows(chunks):
+    return [StructuredDataHandler.join_columns(chunk.astype(str), ",").tolist() for chunk in chunks]
+
+
+def assert_matches_legacy(handler: StructuredDataHandler, df: pd.DataFrame, chunk_size: int, chunks=None):
+    """The chunks must hold the same rows, split at the same boundaries, as the row-wise implementation."""
+    chunks = handler.chunk_dataframe(df, chunk_size) if chunks is None else chunks
+    legacy_chunks = legacy_chunk_dataframe(handler, df, chunk_size)
+    assert [len(chunk) for chunk in chunks] == [len(chunk) for chunk in legacy_chunks], "chunk boundaries differ"
+    assert chunk_rows(chunks) == chunk_rows(legacy_chunks), "chunk rows differ"
+    return legacy_chunks
+
+
+def timed(func, *args, **kwargs):
+    start_time = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workbook", type=str, default=None, help="Write and time a real .xlsx at this path")
+    parser.add_argument("--skip-legacy", action="store_true", help="Do not time the row-wise reference implementation")
+    args = parser.parse_args()
+
+    handler = StructuredDataHandler()
+    df = build_frame(args.rows)
+    results = {"rows": args.rows, "chunk_size": args.chunk_size}
+
+    chunks, seconds = timed(handler.chunk_dataframe, df, args.chunk_size)
+    results["chunk_dataframe"] = {"seconds": round(seconds, 4), "rows_per_second": round(args.rows / seconds), "chunks": len(chunks)}
+
+    if not args.skip_legacy:
+        legacy_chunks, legacy_seconds = timed(legacy_chunk_dataframe, handler, df, args.chunk_size)
+        results["legacy_chunk_dataframe"] = {
+            "seconds": round(legacy_seconds, 4),
+            "rows_per_second": round(args.rows / legacy_seconds),
+            "chunks": len(legacy_chunks)
+        }
+        results["speedup"] = round(legacy_seconds / seconds, 1)
+        # Mixed column types, then only the int and float columns, which iterrows upcasts row by row
+        assert_matches_legacy(handler, df, args.chunk_size, chunks)
+        assert_matches_legacy(handler, df.select_dtypes("number").head(10000), args.chunk_size // 10)
+        results["matches_legacy"] = True
+
+    text, seconds = timed(handler.extract_sheet_as_text, df)
+    results["extract_sheet_as_text"] = {"seconds": round(seconds, 4), "rows_per_second": round(args.rows / seconds)}
+
+    if args.workbook:
+        workbook_path = Path(args.workbook)
+        if not workbook_path.exists():
+            df.to_excel(workbook_path, sheet_name="Data", index=False)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200, length_function=len)
+        sheet_chunks, seconds = timed(handler.load_and_chunk_excel, str(workbook_path), args.chunk_size, splitter)
+        results["load_and_chunk_excel"] = {
+            "seconds": round(seconds, 4),
+            "rows_per_second": round(args.rows / seconds),
+            "chunks": sum(len(chunks) for chunks in sheet_chunks.values())
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Deterministic local stand-ins for the external services, used by the offline benchmarks:
+
+- ScriptedChatModel replaces Groq: a fixed latency per call, a scripted tool-calling
+  turn followed by a final JSON forecast, and usage_metadata like ChatGroq reports.
+- RateLimitedChatModel is a ScriptedChatModel with per-window request and token quotas
+  that answers over-quota calls with the 429 (groq.RateLimitError) Groq sends.
+- InMemoryVectorBackend replaces Pinecone: numpy vectors per namespace, embedded with
+  the dependency-free HashingEmbedder.
+- LocalLogSink replaces Postgres as the log writer's destination.
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import groq
+import httpx
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.data_layer.embedders import HashingEmbedder
+from src.data_layer.lexical_index import matches_filter
+from src.data_layer.vector_backends import VectorBackend
+
+SAMPLE_FORECAST = {
+    "financial_metrics_extracted": {
+        "sales": "Rs 64,259 Cr in Q1 FY26",
+        "net_profit": "Rs 12,760 Cr in Q1 FY26",
+        "operating_profit": "Rs 16,555 Cr in Q1 FY26",
+    },
+    "qualitative_analysis": {
+        "management_sentiment": "Cautiously optimistic",
+        "recurring_themes": "Deal wins, AI-led transformation, margin discipline",
+        "forward_looking_statements": "Management expects demand to recover in the second half",
+    },
+    "forecast": {
+        "revenue_outlook": "Low single digit sequential growth",
+        "profitability_outlook": "Operating margin stable around 24-25%",
+        "key_growth_drivers": "BFSI recovery and large deal ramp-ups",
+        "risks": "Macro uncertainty and delayed discretionary spend",
+        "opportunities": "GenAI services and vendor consolidation",
+    },
+}
+
+DEFAULT_TOOL_PLAN = [
+    {
+        "name": "multi_query_retriever",
+        "args": {
+            "queries": ["quarterly sales revenue", "quarterly net profit", "management outlook and guidance"],
+            "source": "all",
+            "k": 3,
+        },
+    },
+]
+
+
+def estimate_tokens(messages) -> int:
+    return max(1, sum(len(str(message.content)) for message in messages) // 4)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that answers from a script. A conversation without tool results gets the
+    tool calls of tool_plan (when tools are bound), otherwise the final answer. Every
+    call waits latency_seconds to stand in for the network round trip.
+    """
+
+    latency_seconds: float = 0.05
+    final_answer: str = json.dumps(SAMPLE_FORECAST)
+    tool_plan: List[Dict] = DEFAULT_TOOL_PLAN
+    tools_bound: bool = False
+    stream_chunk_chars: int = 24
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tools_bound": True})
+
+    def next_message(self, messages) -> AIMessage:
+        prompt_tokens = estimate_tokens(messages)
+        has_tool_results = any(isinstance(message, ToolMessage) for message in messages)
+
+        if self.tools_bound and self.tool_plan and not has_tool_results:
+            tool_calls = [
+                {"name": call["name"], "args": call["args"], "id": f"call_{uuid.uuid4().hex[:12]}"}
+                for call in self.tool_plan
+            ]
+            content, completion_tokens = "", 20 * len(tool_calls)
+        else:
+            tool_calls = []
+            content, completion_tokens = self.final_answer, max(1, len(self.final_answer) // 4)
+
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_seconds)
+        return ChatResult(generations=[ChatGeneration(message=self.next_message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_seconds)
+        return ChatResult(generations=[ChatGeneration(message=self.next_message(messages))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_seconds)
+        message = self.next_message(messages)
+        tool_call_chunks = [
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+            for i, call in enumerate(message.tool_calls)
+        ]
+        content = message.content or ""
+        parts = [content[i:i + self.stream_chunk_chars] for i in range(0, len(content), self.stream_chunk_chars)] or [""]
+
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            chunk = ChatGenerationChunk(message=AIMessageChunk(
+                content=part,
+                tool_call_chunks=tool_call_chunks if i == 0 else [],
+                usage_metadata=message.usage_metadata if last else None,
+            ))
+            if run_manager:
+                await run_manager.on_llm_new_token(part, chunk=chunk)
+            yield chunk
+
+
+class ProviderQuota:
+    """Sliding window of the calls a fake provider accepted, shared by the copies bind_tools makes."""
+
+    def __init__(self, requests_per_window: int, tokens_per_window: int, window_seconds: float):
+        self.requests_per_window = requests_per_window
+        self.tokens_per_window = tokens_per_window
+        self.window_seconds = window_seconds
+        self.calls = deque()
+        self.accepted = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def admit(self, tokens: int) -> Optional[Dict[str, str]]:
+        """Record an accepted call, or return the headers of the 429 that rejects it."""
+        with self.lock:
+            now = time.monotonic()
+            while self.calls and self.calls[0][0] <= now - self.window_seconds:
+                self.calls.popleft()
+            used_tokens = sum(call_tokens for _, call_tokens in self.calls)
+            if len(self.calls) < self.requests_per_window and used_tokens + tokens <= self.tokens_per_window:
+                self.calls.append((now, tokens))
+                self.accepted += 1
+                return None
+
+            self.rejected += 1
+            reset = self.calls[0][0] + self.window_seconds - now if self.calls else self.window_seconds
+            return {
+                "retry-after": f"{max(reset, 0.001):.3f}",
+                "x-ratelimit-remaining-requests": str(max(self.requests_per_window - len(self.calls), 0)),
+                "x-ratelimit-remaining-tokens": str(max(self.tokens_per_window - used_tokens, 0)),
+            }
+
+
+class RateLimitedChatModel(ScriptedChatModel):
+    """
+    ScriptedChatModel behind provider quotas: more than requests_per_window calls or
+    tokens_per_window tokens (prompt estimate plus the scripted answer) within
+    window_seconds are rejected with groq.RateLimitError, carrying retry-after and
+    x-ratelimit-remaining-* headers like Groq's.
+    """
+
+    requests_per_window: int = 30
+    tokens_per_window: int = 60000
+    window_seconds: float = 60.0
+    quota: Any = None
+
+    def model_post_init(self, __context):
+        if self.quota is None:
+            self.quota = ProviderQuota(self.requests_per_window, self.tokens_per_window, self.window_seconds)
+
+    @property
+    def _llm_type(self) -> str:
+        return "rate-limited-scripted"
+
+    def check_quota(self, messages):
+        message = self.next_message(messages)
+        headers = self.quota.admit(message.usage_metadata["total_tokens"])
+        if headers is not None:
+            request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+            response = httpx.Response(429, headers=headers, request=request)
+            raise groq.RateLimitError("Rate limit reached, please try again later", response=response, body=None)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.check_quota(messages)
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.check_quota(messages)
+        return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.check_quota(messages)
+        async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            yield chunk
+
+
+class InMemoryVectorBackend(VectorBackend):
+    """Vector index held in process memory, brute-force cosine search per namespace."""
+
+    name = "memory"
+    upsert_batch_size = 10000
+    delete_batch_size = 100000
+
+    def __init__(self, dimension: int = 384):
+        self.embedder = HashingEmbedder(dimension=dimension)
+        self.embedding_model = self.embedder.model_name
+        self.namespaces: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    def ensure_index(self):
+        return "memory"
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        return self.embedder.embed_queries(queries).tolist()
+
+    def upsert(self, namespace: str, records: List[Dict]):
+        vectors = self.embedder.embed_documents([record["chunk_text"] for record in records])
+        with self.lock:
+            store = self.namespaces.setdefault(namespace, {"ids": [], "metadata": [], "vectors": None})
+            positions = {doc_id: i for i, doc_id in enumerate(store["ids"])}
+            new_rows = []
+            for record, vector in zip(records, vectors):
+                metadata = {k: v for k, v in record.items() if k != "_id"}
+                if record["_id"] in positions:
+                    i = positions[record["_id"]]
+                    store["metadata"][i] = metadata
+                    store["vectors"][i] = vector
+                else:
+                    store["ids"].append(record["_id"])
+                    store["metadata"].append(metadata)
+                    new_rows.append(vector)
+            if new_rows:
+                new_rows = np.vstack(new_rows)
+                store["vectors"] = new_rows if store["vectors"] is None else np.vstack([store["vectors"], new_rows])
+
+    def delete(self, namespace: str, ids: List[str]):
+        with self.lock:
+            store = self.namespaces.get(namespace)
+            if store is None:
+                return
+            remove = set(ids)
+            keep = [i for i, doc_id in enumerate(store["ids"]) if doc_id not in remove]
+            store["ids"] = [store["ids"][i] for i in keep]
+            store["metadata"] = [store["metadata"][i] for i in keep]
+            store["vectors"] = store["vectors"][keep] if keep else None
+
+    def query(self, namespace: str, vector: List[float], top_k: int,
+              metadata_filter: Optional[Dict] = None, rerank: bool = False,
+              include_values: bool = False) -> List[Dict]:
+        with self.lock:
+            store = self.namespaces.get(namespace)
+            if store is None or store["vectors"] is None:
+                return []
+            scores = store["vectors"] @ np.asarray(vector, dtype=np.float32)
+            results = []
+            for i in np.argsort(-scores):
+                metadata = store["metadata"][i]
+                if not matches_filter(metadata, metadata_filter):
+                    continue
+                result = {"id": store["ids"][i], "score": float(scores[i]), "metadata": dict(metadata)}
+                if include_values:
+                    result["values"] = store["vectors"][i].tolist()
+                results.append(result)
+                if len(results) >= top_k:
+                    break
+            return results
+
+
+class LocalLogSink:
+    """Collects log batches in memory in place of the forecast_logs table."""
+
+    def __init__(self):
+        self.batches = 0
+        self.records = 0
+        self.lock = threading.Lock()
+
+    def write(self, records: List[Dict]):
+        with self.lock:
+            self.batches += 1
+            self.records += len(records)
+
+    def stats(self) -> Dict:
+        return {"batches": self.batches, "records": self.records}
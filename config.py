@@ -14,13 +14,103 @@ class Config:
         # llm configurations
         self.forecasting_model = "moonshotai/kimi-k2-instruct-0905"
         self.groq_api_key = os.getenv("GROQ_API_KEY")
+        # "fast" prefetches the standard contexts and answers in one call, "agentic" runs the tool-calling loop
+        self.forecast_mode = os.getenv("FORECAST_MODE", "fast")
+        self.fast_path_k = int(os.getenv("FAST_PATH_K", "3"))
+        # llm rate budgets (0 is unpaced), retries of rate limited calls and the share of the budgets batch work must leave free
+        self.llm_requests_per_minute = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+        self.llm_tokens_per_minute = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+        self.llm_completion_tokens_estimate = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "1024"))
+        self.llm_max_retries = int(os.getenv("LLM_MAX_RETRIES", "4"))
+        self.llm_backoff_base_seconds = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+        self.llm_backoff_max_seconds = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+        self.llm_interactive_reserve = float(os.getenv("LLM_INTERACTIVE_RESERVE", "0.2"))
+        # admission control: concurrent forecast runs, runs waiting for a slot and how long they may wait
+        self.max_concurrent_forecasts = int(os.getenv("MAX_CONCURRENT_FORECASTS", "8"))
+        self.forecast_queue_size = int(os.getenv("FORECAST_QUEUE_SIZE", "32"))
+        self.forecast_queue_timeout_seconds = float(os.getenv("FORECAST_QUEUE_TIMEOUT_SECONDS", "30"))
+
+        # shared http connection pool configurations
+        self.http_max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+        self.http_max_keepalive_connections = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.http_timeout = float(os.getenv("HTTP_TIMEOUT", "120"))
 
         # vector db configurations
+        self.vector_backend = os.getenv("VECTOR_BACKEND", "pinecone")
+        self.local_index_path = os.getenv("LOCAL_INDEX_PATH", "data/.local_index")
+        self.local_embedder = os.getenv("LOCAL_EMBEDDER", "hashing")
         self.pinecone_api_key = os.getenv("PINECONE_API_KEY")
-        self.pinecone_index_name = "tcs-financial-forecast"
+        self.pinecone_index_name = os.getenv("PINECONE_INDEX_NAME", "tcs-financial-forecast")
+        self.namespace_per_type = os.getenv("NAMESPACE_PER_TYPE", "false").lower() == "true"
+        self.embedding_model = "llama-text-embed-v2"
+        self.embedding_cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+        self.embedding_cache_ttl_seconds = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+        self.embedding_cache_path = os.getenv("EMBEDDING_CACHE_PATH")
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid")
+        self.hybrid_candidate_multiplier = 3
+        self.rrf_k = 60
+        # context assembly: MMR picks k of context_candidate_multiplier x k candidates, merged and packed to a token budget
+        self.context_candidate_multiplier = 2
+        self.context_mmr_lambda = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+        self.fast_path_token_budget = int(os.getenv("FAST_PATH_TOKEN_BUDGET", "3000"))
+        self.lexical_index_path = os.getenv("LEXICAL_INDEX_PATH", f"data/.lexical_index.{self.vector_backend}.json")
+        # threads running vector db calls, also the size of the Pinecone index's connection pool they share
+        self.vectordb_max_workers = int(os.getenv("VECTORDB_MAX_WORKERS", "16"))
+
+        # company (tenant) configurations
+        # documents live under data/<TICKER>/transcripts and data/<TICKER>/quaterly, each company in its own namespace
+        self.data_dir = os.getenv("DATA_DIR", "data")
+        # ticker of /chat requests without one, and owner of documents directly under data/transcripts and data/quaterly
+        self.default_ticker = os.getenv("DEFAULT_TICKER", "TCS")
+        self.ingestion_max_concurrent_companies = int(os.getenv("INGESTION_MAX_CONCURRENT_COMPANIES", "4"))
+
+        # ingestion configurations
+        # one manifest per backend, so switching backends re-ingests into the new store
+        self.ingestion_manifest_path = os.getenv("INGESTION_MANIFEST_PATH", f"data/.ingestion_manifest.{self.vector_backend}.json")
+        self.extraction_max_workers = int(os.getenv("EXTRACTION_MAX_WORKERS", str(os.cpu_count() or 1)))
+        self.pdf_min_pages_per_shard = int(os.getenv("PDF_MIN_PAGES_PER_SHARD", "4"))
+        self.ingest_on_startup = os.getenv("INGEST_ON_STARTUP", "true").lower() == "true"
+        self.ingestion_job_history = 20
+        # quarterly/annual figures parsed from the Data Sheet of the results workbooks
+        self.metrics_store_path = os.getenv("METRICS_STORE_PATH", "data/.metrics.sqlite")
+        # baseline time-series forecasts fitted over the metrics store
+        self.quant_forecast_horizon = int(os.getenv("QUANT_FORECAST_HORIZON", "2"))
+        self.quant_forecast_interval = float(os.getenv("QUANT_FORECAST_INTERVAL", "0.8"))
+
+        # forecast response cache configurations
+        self.response_cache_enabled = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+        self.response_cache_size = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+        self.response_cache_ttl_seconds = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+        # cosine similarity above which a differently phrased query reuses a cached forecast, unset disables it
+        similarity_threshold = os.getenv("RESPONSE_CACHE_SIMILARITY_THRESHOLD")
+        self.response_cache_similarity_threshold = float(similarity_threshold) if similarity_threshold else None
+
+        # streaming (/chat/stream) configurations
+        # events buffered per stream before the producer blocks on a slow client
+        self.stream_queue_size = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+        self.stream_heartbeat_seconds = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+        # request/response log writer configurations
+        self.log_queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+        self.log_batch_size = int(os.getenv("LOG_BATCH_SIZE", "200"))
+        self.log_flush_interval_seconds = float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", "1.0"))
+        # records that could not be written to Postgres, replayed once it is reachable again
+        self.log_spill_path = os.getenv("LOG_SPILL_PATH", "data/.log_spill.jsonl")
+        # forecast_logs is partitioned by month, partitions older than the retention window are dropped
+        self.log_retention_months = int(os.getenv("LOG_RETENTION_MONTHS", "6"))
+        self.log_partitions_ahead = 2
+        self.log_maintenance_interval_seconds = float(os.getenv("LOG_MAINTENANCE_INTERVAL_SECONDS", "86400"))
+        # log reads running at once, kept below the pool's 10 connections so reads never starve the writer
+        self.log_read_concurrency = int(os.getenv("LOG_READ_CONCURRENCY", "4"))
+
+        # observability configurations
+        # print every span as a JSON line, metrics are always collected and served at /metrics
+        self.span_logging = os.getenv("SPAN_LOGGING", "true").lower() == "true"
 
         # chunking model for tokenization
         self.chunking_model = "gpt-4"
+        self.tokenizer_threads = int(os.getenv("TOKENIZER_THREADS", "8"))
 
     @staticmethod
     def load_environment_variables(env_file: str):
@@ -1,3 +1,4 @@
+import numpy as np
 import tiktoken
 import pandas as pd
 from config import config
@@ -11,40 +12,62 @@ class StructuredDataHandler:
     def estimate_tokens(self, text):
         return len(self.encoding.encode(text))
 
+    def estimate_tokens_batch(self, texts):
+        if not texts:
+            return np.zeros(0, dtype=np.int64)
+        encoded = self.encoding.encode_batch(texts, num_threads=config.tokenizer_threads)
+        return np.fromiter((len(tokens) for tokens in encoded), dtype=np.int64, count=len(encoded))
+
+    @staticmethod
+    def upcast_rows(df):
+        """
+        The frame as iterrows() sees it: an all-numeric frame mixing dtypes is cast to their
+        common dtype, so int and float columns together give 1.0, not 1.
+        """
+        dtypes = set(df.dtypes)
+        if len(dtypes) > 1 and all(isinstance(d, np.dtype) and d.kind in "iuf" for d in dtypes):
+            return df.astype(np.result_type(*dtypes))
+        return df
+
+    @staticmethod
+    def to_str_frame(df):
+        """str() every cell in one vectorized conversion (NaN becomes 'nan', as str() would)."""
+        values = df.to_numpy(dtype=object).astype(str)
+        return pd.DataFrame(values, index=df.index, dtype=object)
+
+    @staticmethod
+    def join_columns(str_df, sep):
+        """Join the columns of an all-string frame row-wise using column-at-a-time vector ops."""
+        if str_df.shape[1] == 0:
+            return pd.Series([''] * len(str_df), index=str_df.index, dtype=object)
+        joined = str_df.iloc[:, 0]
+        for col in range(1, str_df.shape[1]):
+            joined = joined + sep + str_df.iloc[:, col]
+        return joined
+
+    def serialize_rows(self, df):
+        return self.join_columns(self.to_str_frame(self.upcast_rows(df)), ',').tolist()
+
     def chunk_dataframe(self, df, chunk_size):
-        chunks = []
+        df = self.upcast_rows(df)
         header_str = ','.join([str(i) for i in df.columns])
         header_size = self.estimate_tokens(header_str)
-        current_chunk = []
-        current_chunk_size = header_size
-        
-        for _, row in df.iterrows():
-            row_str = ','.join(map(str, row.values))
-            row_size = self.estimate_tokens(row_str)
-            
-            if row_size > (chunk_size - header_size):
-                if current_chunk:
-                    chunks.append(pd.DataFrame(current_chunk, columns=df.columns))
-                    current_chunk = []
-                    current_chunk_size = header_size
-                
-                single_row_chunk = pd.DataFrame([row.to_dict()], columns=df.columns)
-                chunks.append(single_row_chunk)
-                current_chunk = []
-                current_chunk_size = header_size
-                continue
-            
-            if current_chunk and (current_chunk_size + row_size) > chunk_size:
-                chunks.append(pd.DataFrame(current_chunk, columns=df.columns))
-                current_chunk = []
-                current_chunk_size = header_size
-            
-            current_chunk.append(row.to_dict())
-            current_chunk_size += row_size
-        
-        if current_chunk:
-            chunks.append(pd.DataFrame(current_chunk, columns=df.columns))
-        
+        row_budget = chunk_size - header_size
+
+        row_sizes = self.estimate_tokens_batch(self.serialize_rows(df))
+        cumulative_sizes = np.concatenate(([0], np.cumsum(row_sizes)))
+
+        # Greedy packing on the cumulative sum: each chunk ends at the last row that still fits the budget,
+        # a row larger than the budget on its own becomes a single-row chunk
+        chunks = []
+        start = 0
+        n_rows = len(row_sizes)
+        while start < n_rows:
+            end = int(np.searchsorted(cumulative_sizes, cumulative_sizes[start] + row_budget, side='right')) - 1
+            end = min(max(end, start + 1), n_rows)
+            chunks.append(df.iloc[start:end])
+            start = end
+
         return chunks
 
     def load_and_chunk_csv(self, file_path, chunk_size):
@@ -54,7 +77,7 @@ class StructuredDataHandler:
     def dataframe_to_markdown(self, df):
         if df.empty:
             return None
-        
+
         try:
             return df.to_markdown(index=False)
         except:
@@ -62,16 +85,17 @@ class StructuredDataHandler:
             headers = df.columns.tolist()
             markdown.append("| " + " | ".join(str(h) for h in headers) + " |")
             markdown.append("| " + " | ".join(["---" for _ in headers]) + " |")
-            
-            for _, row in df.iterrows():
-                markdown.append("| " + " | ".join(str(v) if pd.notna(v) else "" for v in row) + " |")
-            
+
+            str_df = self.to_str_frame(self.upcast_rows(df).astype(object).where(df.notna(), ""))
+            rows = self.join_columns(str_df, " | ")
+            markdown.extend(("| " + rows + " |").tolist())
+
             return "\n".join(markdown)
-        
+
 
     def sheet_requires_header(self, df, irregularity_threshold=0.5):
         header_row = df.columns
-        unnamed_cols_ratio = sum(header_row.str.contains('Unnamed')) / len(header_row)
+        unnamed_cols_ratio = sum(header_row.astype(str).str.contains('Unnamed')) / len(header_row)
 
         if unnamed_cols_ratio > 0.5:
             return False
@@ -80,10 +104,10 @@ class StructuredDataHandler:
         if non_empty_rows.empty:
             return False
 
-        col_counts = non_empty_rows.apply(lambda row: row.count(), axis=1)
+        col_counts = non_empty_rows.notna().sum(axis=1)
         if col_counts.empty:
             return False
-        
+
         mode_count = col_counts.mode().iloc[0]
         inconsistency_ratio = (col_counts != mode_count).mean()
 
@@ -91,7 +115,7 @@ class StructuredDataHandler:
 
     def extract_sheet_as_text(self, df):
         header = ' '.join(df.columns.astype(str)).strip()
-        rows = df.fillna('').astype(str).apply(lambda row: ' '.join(row).strip(), axis=1).tolist()
+        rows = self.join_columns(self.to_str_frame(df.fillna('')), ' ').str.strip().tolist()
         return "\n".join([header] + rows)
 
 
@@ -112,8 +136,8 @@ class StructuredDataHandler:
                         chunks = kb_text_splitter.split_text(sheet_text)
                     else:
                         chunks = []
-                
+
                 if chunks:
                     all_chunks[sheet_name] = chunks
 
-        return all_chunks
\ No newline at end of file
+        return all_chunks
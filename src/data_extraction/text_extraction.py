@@ -1,55 +1,137 @@
+import asyncio
+import math
+import multiprocessing
 import re
 import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pymupdf
 import pymupdf4llm
 import pandas as pd
+from config import config
 from src.data_extraction.structured_data_handler import StructuredDataHandler
+from src.utils.telemetry import span
+
+# Per worker process handler, built on first use so the tiktoken encoding loads once per worker
+_worker_structured_data_handler = None
+
+
+def _get_worker_structured_data_handler():
+    global _worker_structured_data_handler
+    if _worker_structured_data_handler is None:
+        _worker_structured_data_handler = StructuredDataHandler()
+    return _worker_structured_data_handler
+
+
+def clean_pdf_markdown(content: str) -> str:
+    cleaned_text = re.sub(r'\n{3,}', '\n', content)
+    cleaned_text = re.sub(r'\n\s*\n\s*\n', '\n', cleaned_text)
+    cleaned_text = cleaned_text.strip()
+    cleaned_text = cleaned_text.replace('-----', '')
+    return cleaned_text.strip()
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    with pymupdf.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def extract_pdf_markdown(pdf_path: str, pages=None) -> str:
+    """Process pool entry point: convert a pdf, or the given 0-based pages of it, to raw markdown."""
+    return pymupdf4llm.to_markdown(pdf_path, pages=pages, show_progress=False)
+
+
+def shard_pages(page_count: int, max_shards: int, min_pages_per_shard: int):
+    """Split range(page_count) into at most max_shards contiguous, ordered page ranges."""
+    if page_count <= 0:
+        return []
+    shard_count = max(1, min(max_shards, page_count // max(1, min_pages_per_shard)))
+    shard_size = math.ceil(page_count / shard_count)
+    return [list(range(start, min(start + shard_size, page_count))) for start in range(0, page_count, shard_size)]
+
+
+def chunk_excel_to_text(excel_path: str, kb_text_splitter, chunk_size: int):
+    """Process pool entry point: chunk every sheet of a workbook into text chunks."""
+    structured_data_handler = _get_worker_structured_data_handler()
+    chunks_dict = structured_data_handler.load_and_chunk_excel(excel_path, chunk_size=chunk_size, kb_text_splitter=kb_text_splitter)
+    if not chunks_dict:
+        return []
+
+    chunks = []
+    for sheet_name, sheet_data in chunks_dict.items():
+        for data in sheet_data:
+            text = f"Sheet Name: {sheet_name}\n\n"
+
+            if type(data) == pd.DataFrame:
+                resp = structured_data_handler.dataframe_to_markdown(data)
+                if resp:
+                    text += resp
+            else:
+                text += data
+
+            chunks.append(text)
+    return chunks
+
 
 class TextExtractor:
     def __init__(self):
-        self.structured_data_handler = StructuredDataHandler()
+        self.process_pool = None
+
+    def get_process_pool(self):
+        # PDF parsing and spreadsheet chunking are CPU bound, run them in worker processes off the event loop
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=config.extraction_max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.process_pool
+
+    def close(self):
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+            self.process_pool = None
 
     async def extract_pdf_text_pymupdf(self, session_id, pdf_path: str):
         try:
             start_time = time.time()
-            content = pymupdf4llm.to_markdown(pdf_path, show_progress=False)
+            loop = asyncio.get_running_loop()
+            process_pool = self.get_process_pool()
+
+            with span("extraction", "pdf", file=Path(pdf_path).name) as attributes:
+                # Large transcripts are split into page ranges converted in parallel, then stitched back in page order
+                page_count = await loop.run_in_executor(process_pool, count_pdf_pages, pdf_path)
+                page_shards = shard_pages(page_count, config.extraction_max_workers, config.pdf_min_pages_per_shard)
+                shard_contents = await asyncio.gather(*[
+                    loop.run_in_executor(process_pool, extract_pdf_markdown, pdf_path, pages)
+                    for pages in page_shards
+                ])
+                cleaned_text = clean_pdf_markdown(''.join(shard_contents))
+                attributes.update(pages=page_count, shards=len(page_shards))
 
-            cleaned_text = re.sub(r'\n{3,}', '\n', content)
-            cleaned_text = re.sub(r'\n\s*\n\s*\n', '\n', cleaned_text)
-            cleaned_text = cleaned_text.strip()
-            cleaned_text = cleaned_text.replace('-----', '')
             end_time = time.time()
-            print(f"{session_id}: Time taken to extract pdf: {end_time - start_time} seconds")
+            print(f"{session_id}: Time taken to extract pdf: {end_time - start_time} seconds ({page_count} pages, {len(page_shards)} shards)")
 
-            return cleaned_text.strip()
+            return cleaned_text
         except Exception as e:
             print(f"ERROR: {session_id}: Error extracting pdf: {e}")
             return None
-        
+
     async def chunk_excel(self, session_id, excel_path, kb_text_splitter, chunk_size):
         try:
             start_time = time.time()
-            chunks_dict = self.structured_data_handler.load_and_chunk_excel(excel_path, chunk_size=chunk_size, kb_text_splitter=kb_text_splitter)
-            if not chunks_dict:
+            loop = asyncio.get_running_loop()
+            with span("chunking", "excel", file=Path(excel_path).name) as attributes:
+                chunks = await loop.run_in_executor(
+                    self.get_process_pool(), chunk_excel_to_text, excel_path, kb_text_splitter, chunk_size
+                )
+                attributes["chunks"] = len(chunks or [])
+            if not chunks:
                 print(f"{session_id}: No chunks found in excel")
                 return None
-            
-            chunks = []
-            for sheet_name, sheet_data in chunks_dict.items():
-                for data in sheet_data:
-                    text = f"Sheet Name: {sheet_name}\n\n"
-
-                    if type(data) == pd.DataFrame:
-                        resp = self.structured_data_handler.dataframe_to_markdown(data)
-                        if resp:
-                            text += resp
-                    else:
-                        text += data
-                    
-                    chunks.append(text)
-            
+
             end_time = time.time()
             print(f"{session_id}: Time taken to extract excel: {end_time - start_time} seconds")
             return chunks
         except Exception as e:
             print(f"ERROR: {session_id}: Error extracting excel: {e}")
-            return None
\ No newline at end of file
+            return None
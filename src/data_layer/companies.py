@@ -0,0 +1,62 @@
+import re
+from pathlib import Path
+from typing import Dict, List
+
+from config import config
+
+TICKER_PATTERN = re.compile(r"^[A-Z0-9][A-Z0-9._&-]{0,31}$")
+
+# Document directories of a company, per document type
+DOCUMENT_DIRS = {
+    "transcriptions": ("transcripts",),
+    "quarterly_reports": ("quaterly", "quarterly"),
+}
+
+
+def normalize_ticker(ticker: str = None) -> str:
+    """Upper-cased ticker, the configured default when empty. Raises ValueError on anything else than a ticker symbol."""
+    ticker = (ticker or config.default_ticker).strip().upper()
+    if not TICKER_PATTERN.match(ticker):
+        raise ValueError(f"Invalid ticker '{ticker}'")
+    return ticker
+
+
+def document_dirs(company_dir: Path) -> Dict[str, List[Path]]:
+    dirs = {}
+    for doc_type, names in DOCUMENT_DIRS.items():
+        existing = [company_dir / name for name in names if (company_dir / name).is_dir()]
+        if existing:
+            dirs[doc_type] = existing
+    return dirs
+
+
+def discover_companies(data_dir: str = None) -> Dict[str, Dict[str, List[Path]]]:
+    """
+    Companies with documents under data_dir, as ticker -> document type -> directories.
+    Each company has its own directory (data/<TICKER>/transcripts, data/<TICKER>/quaterly);
+    documents directly under data/transcripts and data/quaterly belong to the default ticker.
+    """
+    data_dir = Path(data_dir or config.data_dir)
+    if not data_dir.is_dir():
+        return {}
+
+    companies = {}
+    legacy_dirs = document_dirs(data_dir)
+    if legacy_dirs:
+        companies[normalize_ticker()] = legacy_dirs
+
+    for company_dir in sorted(data_dir.iterdir()):
+        if not company_dir.is_dir() or company_dir.name.startswith("."):
+            continue
+        dirs = document_dirs(company_dir)
+        if not dirs:
+            continue
+        try:
+            ticker = normalize_ticker(company_dir.name)
+        except ValueError:
+            print(f"Warning: Skipping {company_dir}, its name is not a valid ticker")
+            continue
+        company = companies.setdefault(ticker, {})
+        for doc_type, type_dirs in dirs.items():
+            company.setdefault(doc_type, []).extend(type_dirs)
+    return companies
@@ -0,0 +1,84 @@
+import re
+import zlib
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+
+class Embedder(ABC):
+    """Produces L2-normalized float32 embeddings for the local vector backend."""
+
+    model_name = "base"
+    dimension = 0
+
+    @abstractmethod
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        ...
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        return self.embed_documents(texts)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class HashingEmbedder(Embedder):
+    """
+    Dependency-free, deterministic embedder based on signed feature hashing of word
+    unigrams and bigrams. Lower quality than a trained model, but it runs offline and
+    is stable across processes, which is what CI and air-gapped runs need.
+    """
+
+    token_pattern = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.model_name = f"hashing-{dimension}"
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = self.token_pattern.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                digest = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if digest & 1 else -1.0
+                matrix[row, (digest >> 1) % self.dimension] += sign
+        return normalize_rows(matrix)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Local transformer embeddings, requires the optional sentence-transformers package."""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "sentence-transformers is required for the sentence-transformers embedder, "
+                "install it with `pip install sentence-transformers`"
+            ) from e
+        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        embeddings = self.model.encode(texts, batch_size=64, show_progress_bar=False, convert_to_numpy=True)
+        return normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+
+def get_embedder(spec: str) -> Embedder:
+    """
+    Build an embedder from a spec string: "hashing", "hashing:<dimension>" or
+    "sentence-transformers:<model name>".
+    """
+    name, _, option = spec.partition(":")
+    if name == "hashing":
+        return HashingEmbedder(int(option) if option else 384)
+    if name == "sentence-transformers":
+        return SentenceTransformerEmbedder(option or "all-MiniLM-L6-v2")
+    raise ValueError(f"Unknown local embedder: {spec}")
@@ -0,0 +1,163 @@
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+# Bound on the host parameters of one SQLite statement (999 on older builds)
+SQLITE_MAX_PARAMETERS = 900
+
+
+class EmbeddingCache:
+    """
+    In-process LRU cache for query embeddings with a TTL, keyed by normalized query
+    text and embedding model. An optional SQLite tier keeps embeddings across restarts;
+    its get_disk/set_disk calls block, async callers run them in a thread.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        # The SQLite tier has its own lock so memory lookups never wait behind disk I/O
+        self.disk_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self.disk = None
+        if disk_path:
+            try:
+                Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+                self.disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self.disk.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+                )
+                self.disk.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+                self.disk.commit()
+            except Exception as e:
+                print(f"Warning: Could not open embedding cache at {disk_path}, continuing in-memory only: {e}")
+                self.disk = None
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    def make_key(self, text: str, model: str) -> str:
+        return f"{model}\x1f{self.normalize(text)}"
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        vector = self.get_memory([text], model)[0]
+        if vector is None:
+            vector = self.get_disk([text], model)[0]
+        return vector
+
+    def set(self, text: str, model: str, vector: List[float]):
+        self.set_memory([text], model, [vector])
+        self.set_disk([text], model, [vector])
+
+    def get_memory(self, texts: List[str], model: str) -> List[Optional[List[float]]]:
+        """Look texts up in the in-memory tier only, it never blocks on I/O. Misses are counted by get_disk."""
+        now = time.time()
+        vectors = []
+        with self.lock:
+            for text in texts:
+                key = self.make_key(text, model)
+                vector = None
+                entry = self.entries.get(key)
+                if entry is not None:
+                    if now - entry[1] <= self.ttl_seconds:
+                        self.entries.move_to_end(key)
+                        self.hits += 1
+                        vector = entry[0]
+                    else:
+                        del self.entries[key]
+                vectors.append(vector)
+        return vectors
+
+    def get_disk(self, texts: List[str], model: str) -> List[Optional[List[float]]]:
+        """Look texts missed in memory up in the SQLite tier with one query (blocking, run it off the event loop)."""
+        keys = [self.make_key(text, model) for text in texts]
+        rows = {}
+        now = time.time()
+        unique_keys = list(dict.fromkeys(keys))
+        with self.disk_lock:
+            if self.disk is not None:
+                try:
+                    for i in range(0, len(unique_keys), SQLITE_MAX_PARAMETERS):
+                        batch = unique_keys[i:i + SQLITE_MAX_PARAMETERS]
+                        rows.update(
+                            (key, (array("f", vector).tolist(), created_at))
+                            for key, vector, created_at in self.disk.execute(
+                                f"SELECT key, vector, created_at FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                                batch
+                            )
+                            if now - created_at <= self.ttl_seconds
+                        )
+                except Exception as e:
+                    # A locked or corrupt cache file must not fail the search, the keys are embedded again
+                    print(f"Warning: Could not read embeddings from disk cache: {e}")
+                    rows = {}
+
+        vectors = []
+        with self.lock:
+            for key in keys:
+                row = rows.get(key)
+                if row is None:
+                    self.misses += 1
+                    vectors.append(None)
+                    continue
+                self._put_memory(key, *row)
+                self.hits += 1
+                self.disk_hits += 1
+                vectors.append(row[0])
+        return vectors
+
+    def set_memory(self, texts: List[str], model: str, vectors: List[List[float]]):
+        created_at = time.time()
+        with self.lock:
+            for text, vector in zip(texts, vectors):
+                self._put_memory(self.make_key(text, model), list(vector), created_at)
+
+    def set_disk(self, texts: List[str], model: str, vectors: List[List[float]]):
+        """Write embeddings to the SQLite tier in one transaction (blocking, run it off the event loop)."""
+        created_at = time.time()
+        with self.disk_lock:
+            if self.disk is None or not texts:
+                return
+            try:
+                self.disk.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                    [(self.make_key(text, model), array("f", vector).tobytes(), created_at)
+                     for text, vector in zip(texts, vectors)]
+                )
+                self.disk.commit()
+            except Exception as e:
+                print(f"Warning: Could not persist embeddings to disk cache: {e}")
+
+    def _put_memory(self, key: str, vector: List[float], created_at: float):
+        self.entries[key] = (vector, created_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        with self.disk_lock:
+            if self.disk is not None:
+                self.disk.close()
+                self.disk = None
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import config
+
+
+class IngestionManifest:
+    """
+    Persistent record of what has already been ingested into the vector database.
+
+    For every source file the manifest keeps its size, mtime, content hash and the
+    hash of every chunk that was upserted for it, so that re-ingestion only touches
+    files and chunks that actually changed.
+    """
+
+    def __init__(self, manifest_path: str = None):
+        self.manifest_path = Path(manifest_path or config.ingestion_manifest_path)
+        self.files: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self):
+        if not self.manifest_path.exists():
+            self.files = {}
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+        except Exception as e:
+            print(f"Warning: Could not read ingestion manifest {self.manifest_path}: {e}")
+            self.files = {}
+
+    def save(self):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(self.manifest_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def file_digest(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def chunk_digest(record: Dict) -> str:
+        payload = {k: v for k, v in record.items() if k != "id"}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def check_file(self, path: Path, namespace: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        Return (unchanged, file_hash) for a source file.
+
+        A matching size and mtime short-circuits to the stored hash, so the steady
+        state costs a single stat call per file. A file that now belongs to a different
+        namespace is always reported as changed.
+        """
+        entry = self.files.get(str(path))
+        stat = path.stat()
+
+        if entry and entry.get("namespace") != namespace:
+            return False, self.file_digest(path)
+
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return True, entry.get("file_hash")
+
+        file_hash = self.file_digest(path)
+        if entry and entry.get("file_hash") == file_hash:
+            # Touched but not modified, refresh the stat fields so the next run is a stat-only check
+            entry["size"] = stat.st_size
+            entry["mtime_ns"] = stat.st_mtime_ns
+            return True, file_hash
+
+        return False, file_hash
+
+    def diff_chunks(self, path: Path, records: List[Dict], namespace: Optional[str] = None) -> Tuple[List[Dict], Dict[str, List[str]]]:
+        """
+        Compare freshly built records against the manifest.
+
+        Returns the records whose content changed (or are new) and, per namespace, the
+        ids that were previously ingested for this file but no longer exist there.
+        """
+        entry = self.files.get(str(path), {})
+        previous_namespace = entry.get("namespace")
+        previous_chunks = entry.get("chunks", {})
+
+        if previous_namespace != namespace:
+            # Moved to another namespace: everything is new there and everything old is orphaned
+            return list(records), {previous_namespace: list(previous_chunks)} if previous_chunks else {}
+
+        changed_records = []
+        for record in records:
+            if previous_chunks.get(record["id"]) != self.chunk_digest(record):
+                changed_records.append(record)
+
+        current_ids = {record["id"] for record in records}
+        orphaned_ids = [chunk_id for chunk_id in previous_chunks if chunk_id not in current_ids]
+
+        return changed_records, {namespace: orphaned_ids} if orphaned_ids else {}
+
+    def update(self, path: Path, file_hash: str, records: List[Dict], namespace: Optional[str] = None,
+               ticker: Optional[str] = None):
+        stat = path.stat()
+        self.files[str(path)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "file_hash": file_hash,
+            "namespace": namespace,
+            "ticker": ticker,
+            "chunks": {record["id"]: self.chunk_digest(record) for record in records},
+        }
+
+    def missing_files(self, existing_paths: List[Path], tickers: Optional[Set[str]] = None) -> List[str]:
+        """
+        Return manifest entries whose source file is no longer present, only among the
+        entries of tickers when given (entries from before per-company ingestion have none).
+        """
+        existing = {str(path) for path in existing_paths}
+        return [
+            path for path, entry in self.files.items()
+            if path not in existing and (tickers is None or entry.get("ticker") in tickers)
+        ]
+
+    def tickers(self) -> Set[str]:
+        return {entry["ticker"] for entry in self.files.values() if entry.get("ticker")}
+
+    def corpus_version(self, ticker: Optional[str] = None) -> Optional[str]:
+        """
+        Short fingerprint of every ingested file (of one company when ticker is given),
+        changes whenever that part of the indexed corpus changes.
+        """
+        fingerprint = {
+            path: entry.get("file_hash") for path, entry in self.files.items()
+            if ticker is None or entry.get("ticker") == ticker
+        }
+        if not fingerprint:
+            return None
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+    def chunk_ids(self, path: str) -> List[str]:
+        return list(self.files.get(path, {}).get("chunks", {}).keys())
+
+    def namespace(self, path: str) -> Optional[str]:
+        return self.files.get(path, {}).get("namespace")
+
+    def remove(self, path: str):
+        self.files.pop(path, None)
@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from operator import ge, gt, le, lt
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+RANGE_OPERATORS = {"$gt": gt, "$gte": ge, "$lt": lt, "$lte": le}
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def matches_filter(metadata: Dict, metadata_filter: Optional[Dict]) -> bool:
+    """Evaluate a Pinecone-style metadata filter ($eq/$ne/$in/$nin/$gt/$gte/$lt/$lte/$and/$or) against one record."""
+    if not metadata_filter:
+        return True
+
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub_filter) for sub_filter in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub_filter) for sub_filter in condition):
+                return False
+            continue
+
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        for operator, operand in condition.items():
+            if operator == "$eq":
+                matched = value == operand
+            elif operator == "$ne":
+                matched = value != operand
+            elif operator == "$in":
+                matched = value in operand
+            elif operator == "$nin":
+                matched = value not in operand
+            elif operator in RANGE_OPERATORS:
+                # Only numeric metadata can satisfy a range, as in the local vector index
+                matched = isinstance(value, (int, float)) and RANGE_OPERATORS[operator](value, operand)
+            else:
+                raise ValueError(f"Unsupported metadata filter operator: {operator}")
+            if not matched:
+                return False
+    return True
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk text, kept alongside the vector index so exact-term
+    queries ("net profit Q2 FY26", segment names) can be matched lexically. Stored as
+    one JSON file with, per namespace, the postings lists and per-document lengths.
+    """
+
+    def __init__(self, index_path: str, k1: float = 1.5, b: float = 0.75):
+        self.index_path = Path(index_path)
+        self.k1 = k1
+        self.b = b
+        self.namespaces: Dict[str, Dict] = {}
+        self.loaded = False
+        self.dirty = False
+        self.lock = threading.RLock()
+
+    def load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            if self.index_path.exists():
+                try:
+                    with open(self.index_path, "r", encoding="utf-8") as f:
+                        self.namespaces = json.load(f).get("namespaces", {})
+                except Exception as e:
+                    print(f"Warning: Could not read lexical index {self.index_path}: {e}")
+                    self.namespaces = {}
+            self.loaded = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(self.index_path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"namespaces": self.namespaces}, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+            self.dirty = False
+
+    def is_empty(self) -> bool:
+        self.load()
+        return not any(namespace["docs"] for namespace in self.namespaces.values())
+
+    def get_namespace(self, namespace: str) -> Dict:
+        return self.namespaces.setdefault(namespace, {"docs": {}, "postings": {}, "total_length": 0})
+
+    def _remove(self, index: Dict, doc_id: str):
+        doc = index["docs"].pop(doc_id, None)
+        if doc is None:
+            return
+        for term in doc["terms"]:
+            postings = index["postings"].get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del index["postings"][term]
+        index["total_length"] -= doc["length"]
+
+    def add_documents(self, namespace: str, records: List[Dict]):
+        """Index flattened records ({"_id", "chunk_text", <metadata>}), replacing existing ids."""
+        self.load()
+        with self.lock:
+            index = self.get_namespace(namespace)
+            for record in records:
+                doc_id = record["_id"]
+                self._remove(index, doc_id)
+
+                term_counts = Counter(tokenize(record["chunk_text"]))
+                length = sum(term_counts.values())
+                index["docs"][doc_id] = {
+                    "length": length,
+                    "terms": list(term_counts),
+                    "metadata": {k: v for k, v in record.items() if k != "_id"}
+                }
+                for term, tf in term_counts.items():
+                    index["postings"].setdefault(term, {})[doc_id] = tf
+                index["total_length"] += length
+            self.dirty = True
+
+    def remove_documents(self, namespace: str, ids: List[str]):
+        self.load()
+        with self.lock:
+            index = self.get_namespace(namespace)
+            for doc_id in ids:
+                self._remove(index, doc_id)
+            self.dirty = True
+
+    def search(self, namespace: str, query: str, top_k: int, metadata_filter: Optional[Dict] = None) -> List[Dict]:
+        self.load()
+        with self.lock:
+            index = self.namespaces.get(namespace)
+            if not index or not index["docs"]:
+                return []
+
+            doc_count = len(index["docs"])
+            avg_length = index["total_length"] / doc_count or 1.0
+            scores: Dict[str, float] = {}
+
+            for term in set(tokenize(query)):
+                postings = index["postings"].get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    length = index["docs"][doc_id]["length"]
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            results = []
+            for doc_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                metadata = index["docs"][doc_id]["metadata"]
+                if not matches_filter(metadata, metadata_filter):
+                    continue
+                results.append({"id": doc_id, "score": score, "metadata": dict(metadata)})
+                if len(results) >= top_k:
+                    break
+            return results
+
+
+def reciprocal_rank_fusion(result_lists: Dict[str, List[Dict]], top_k: int, rrf_k: int = 60) -> List[Dict]:
+    """
+    Fuse named ranked result lists by reciprocal rank. The fused score is normalized so
+    a document ranked first in every list scores 1.0, keeping it comparable with the
+    score thresholds the retrieval tools apply to dense similarity. Each source's own
+    score is kept as "<name>_score", and the stored vector as "values" when a source returned it.
+    """
+    fused: Dict[str, Dict] = {}
+    for name, results in result_lists.items():
+        for rank, result in enumerate(results, start=1):
+            entry = fused.setdefault(result["id"], {"id": result["id"], "rrf": 0.0, "metadata": result.get("metadata", {})})
+            entry["rrf"] += 1.0 / (rrf_k + rank)
+            entry[f"{name}_score"] = result.get("score", 0)
+            if result.get("values") is not None:
+                entry["values"] = result["values"]
+
+    max_score = len(result_lists) / (rrf_k + 1)
+    ranked = sorted(fused.values(), key=lambda entry: entry["rrf"], reverse=True)[:top_k]
+    for entry in ranked:
+        entry["score"] = entry.pop("rrf") / max_score
+    return ranked
@@ -0,0 +1,254 @@
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import config
+from src.data_layer.embedders import Embedder, get_embedder, normalize_rows
+from src.data_layer.vector_backends import VectorBackend
+
+
+class LocalNamespace:
+    """
+    One namespace of the local index: an (n, d) float32 matrix of L2-normalized vectors,
+    memory-mapped from vectors.npy, and a parallel list of ids and metadata dicts.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.vectors: Optional[np.ndarray] = None
+        self.ids: List[str] = []
+        self.metadata: List[Dict] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.embedding_model: Optional[str] = None
+        self.field_cache: Dict[str, np.ndarray] = {}
+
+    @property
+    def vectors_path(self):
+        return self.directory / "vectors.npy"
+
+    @property
+    def records_path(self):
+        return self.directory / "records.json"
+
+    def load(self):
+        if not self.records_path.exists() or not self.vectors_path.exists():
+            return
+        with open(self.records_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self.ids = records["ids"]
+        self.metadata = records["metadata"]
+        self.embedding_model = records.get("embedding_model")
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+        self.id_to_row = {record_id: row for row, record_id in enumerate(self.ids)}
+        self.field_cache = {}
+
+    def save(self, vectors: np.ndarray, ids: List[str], metadata: List[Dict], embedding_model: str):
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        tmp_vectors = self.directory / "vectors.tmp.npy"
+        np.save(tmp_vectors, np.ascontiguousarray(vectors, dtype=np.float32))
+        tmp_records = self.directory / "records.tmp.json"
+        with open(tmp_records, "w", encoding="utf-8") as f:
+            json.dump({"embedding_model": embedding_model, "ids": ids, "metadata": metadata}, f)
+
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_records, self.records_path)
+        self.load()
+
+    def field_values(self, field: str) -> np.ndarray:
+        # Column view of one metadata field, built once per load so filters are vectorized comparisons
+        if field not in self.field_cache:
+            values = np.empty(len(self.metadata), dtype=object)
+            values[:] = [item.get(field) for item in self.metadata]
+            self.field_cache[field] = values
+        return self.field_cache[field]
+
+
+def evaluate_filter(namespace: LocalNamespace, metadata_filter: Dict) -> np.ndarray:
+    """Evaluate a Pinecone-style metadata filter into a boolean row mask."""
+    mask = np.ones(len(namespace.ids), dtype=bool)
+
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            for sub_filter in condition:
+                mask &= evaluate_filter(namespace, sub_filter)
+            continue
+        if key == "$or":
+            any_mask = np.zeros(len(namespace.ids), dtype=bool)
+            for sub_filter in condition:
+                any_mask |= evaluate_filter(namespace, sub_filter)
+            mask &= any_mask
+            continue
+
+        values = namespace.field_values(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        for operator, operand in condition.items():
+            if operator == "$eq":
+                mask &= values == operand
+            elif operator == "$ne":
+                mask &= values != operand
+            elif operator == "$in":
+                mask &= np.isin(values, list(operand))
+            elif operator == "$nin":
+                mask &= ~np.isin(values, list(operand))
+            elif operator in ("$gt", "$gte", "$lt", "$lte"):
+                numeric = np.array([v if isinstance(v, (int, float)) else np.nan for v in values], dtype=float)
+                with np.errstate(invalid="ignore"):
+                    if operator == "$gt":
+                        mask &= numeric > operand
+                    elif operator == "$gte":
+                        mask &= numeric >= operand
+                    elif operator == "$lt":
+                        mask &= numeric < operand
+                    else:
+                        mask &= numeric <= operand
+            else:
+                raise ValueError(f"Unsupported metadata filter operator: {operator}")
+
+    return mask
+
+
+class LocalVectorBackend(VectorBackend):
+    """
+    In-process vector index persisted under config.local_index_path, one directory per
+    namespace. Namespaces are loaded lazily on first use and searched with a single
+    matrix product, so retrieval needs no network round trip at all.
+    """
+
+    name = "local"
+    upsert_batch_size = 10000
+    delete_batch_size = 100000
+
+    def __init__(self, index_path: str = None, embedder: Embedder = None):
+        self.index_path = Path(index_path or config.local_index_path)
+        self.embedder = embedder or get_embedder(config.local_embedder)
+        self.embedding_model = self.embedder.model_name
+        self.namespaces: Dict[str, LocalNamespace] = {}
+        self.lock = threading.RLock()
+
+    def ensure_index(self):
+        self.index_path.mkdir(parents=True, exist_ok=True)
+        return str(self.index_path)
+
+    def get_namespace(self, namespace: str) -> LocalNamespace:
+        with self.lock:
+            if namespace not in self.namespaces:
+                safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace)
+                local_namespace = LocalNamespace(self.index_path / safe_name)
+                local_namespace.load()
+                if local_namespace.embedding_model and local_namespace.embedding_model != self.embedding_model:
+                    raise ValueError(
+                        f"Local index namespace '{namespace}' was built with {local_namespace.embedding_model}, "
+                        f"not {self.embedding_model}. Re-ingest into a fresh LOCAL_INDEX_PATH."
+                    )
+                self.namespaces[namespace] = local_namespace
+            return self.namespaces[namespace]
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        return self.embedder.embed_queries(queries).tolist()
+
+    def upsert(self, namespace: str, records: List[Dict]):
+        new_vectors = self.embedder.embed_documents([record["chunk_text"] for record in records])
+
+        with self.lock:
+            local_namespace = self.get_namespace(namespace)
+            if local_namespace.vectors is not None:
+                vectors = np.array(local_namespace.vectors, dtype=np.float32)
+            else:
+                vectors = np.zeros((0, self.embedder.dimension), dtype=np.float32)
+            ids = list(local_namespace.ids)
+            metadata = list(local_namespace.metadata)
+            id_to_row = dict(local_namespace.id_to_row)
+
+            appended_vectors = []
+            for record, vector in zip(records, new_vectors):
+                record_metadata = {k: v for k, v in record.items() if k != "_id"}
+                row = id_to_row.get(record["_id"])
+                if row is None:
+                    id_to_row[record["_id"]] = len(ids)
+                    ids.append(record["_id"])
+                    metadata.append(record_metadata)
+                    appended_vectors.append(vector)
+                else:
+                    vectors[row] = vector
+                    metadata[row] = record_metadata
+
+            if appended_vectors:
+                vectors = np.vstack([vectors, np.asarray(appended_vectors, dtype=np.float32)])
+            local_namespace.save(vectors, ids, metadata, self.embedding_model)
+
+    def delete(self, namespace: str, ids: List[str]):
+        with self.lock:
+            local_namespace = self.get_namespace(namespace)
+            if local_namespace.vectors is None:
+                return
+            delete_ids = set(ids)
+            keep = np.array([record_id not in delete_ids for record_id in local_namespace.ids], dtype=bool)
+            if keep.all():
+                return
+            local_namespace.save(
+                np.asarray(local_namespace.vectors)[keep],
+                [record_id for record_id, kept in zip(local_namespace.ids, keep) if kept],
+                [item for item, kept in zip(local_namespace.metadata, keep) if kept],
+                self.embedding_model
+            )
+
+    def query(self, namespace: str, vector: List[float], top_k: int, metadata_filter: Optional[Dict] = None,
+              rerank: bool = False, include_values: bool = False) -> List[Dict]:
+        return self.query_batch(namespace, [vector], top_k, metadata_filter, include_values)[0]
+
+    def query_batch(self, namespace: str, vectors: List[List[float]], top_k: int,
+                    metadata_filter: Optional[Dict] = None, include_values: bool = False) -> List[List[Dict]]:
+        """Top-k cosine search for several query vectors with one matrix product."""
+        queries = normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+        # Held for the search itself so a concurrent upsert cannot swap the matrix and metadata mid-query
+        with self.lock:
+            local_namespace = self.get_namespace(namespace)
+            if local_namespace.vectors is None or not local_namespace.ids or top_k <= 0:
+                return [[] for _ in vectors]
+
+            scores = queries @ local_namespace.vectors.T
+
+            if metadata_filter:
+                mask = evaluate_filter(local_namespace, metadata_filter)
+                scores[:, ~mask] = -np.inf
+                candidate_count = int(mask.sum())
+            else:
+                candidate_count = scores.shape[1]
+            record_ids = local_namespace.ids
+            record_metadata = local_namespace.metadata
+            record_vectors = local_namespace.vectors
+
+        k = min(top_k, candidate_count)
+        if k == 0:
+            return [[] for _ in vectors]
+
+        top_rows = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, rows in zip(scores, top_rows):
+            rows = rows[np.argsort(-query_scores[rows])]
+            matches = [
+                {
+                    "id": record_ids[row],
+                    "score": float(query_scores[row]),
+                    "metadata": dict(record_metadata[row])
+                }
+                for row in rows
+            ]
+            if include_values:
+                for match, row in zip(matches, rows):
+                    match["values"] = record_vectors[row].tolist()
+            results.append(matches)
+        return results
+
+    def close(self):
+        with self.lock:
+            self.namespaces = {}
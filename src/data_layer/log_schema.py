@@ -0,0 +1,112 @@
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+# Serializes migration runs when several app workers start at once
+MIGRATION_LOCK_ID = 7245301
+
+
+def month_start(day: date, offset: int = 0) -> date:
+    month_index = day.year * 12 + day.month - 1 + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def apply_migrations(conn) -> List[str]:
+    """Apply every migrations/*.sql file not yet recorded in schema_migrations, in name order."""
+    applied = []
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version VARCHAR(255) PRIMARY KEY,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+            conn.commit()
+
+            cursor.execute("SELECT version FROM schema_migrations")
+            done = {row[0] for row in cursor.fetchall()}
+
+            for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+                if path.stem in done:
+                    continue
+                try:
+                    cursor.execute(path.read_text(encoding="utf-8"))
+                    cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (path.stem,))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                applied.append(path.stem)
+                print(f"Applied migration {path.stem}")
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+    return applied
+
+
+def ensure_partitions(conn, months_ahead: int = 2):
+    """Create the forecast_logs partitions for the current month and the next months_ahead."""
+    today = datetime.now(timezone.utc).date()
+    with conn.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            cursor.execute("SELECT create_forecast_logs_partition(%s)", (month_start(today, offset),))
+    conn.commit()
+
+
+def drop_expired_partitions(conn, retention_months: int) -> List[str]:
+    """
+    Retention: drop monthly partitions that ended before the retention window and
+    delete expired rows that landed in the default partition.
+    """
+    cutoff = month_start(datetime.now(timezone.utc).date(), -retention_months)
+    dropped = []
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = 'forecast_logs' AND child.relname LIKE 'forecast_logs\\_p%'
+        """)
+        for (partition_name,) in cursor.fetchall():
+            year, month = partition_name.rsplit("_p", 1)[1].split("_")
+            if date(int(year), int(month), 1) < cutoff:
+                cursor.execute(f'DROP TABLE IF EXISTS "{partition_name}"')
+                dropped.append(partition_name)
+
+        cursor.execute(
+            "DELETE FROM forecast_logs_default WHERE timestamp < %s",
+            (datetime(cutoff.year, cutoff.month, 1, tzinfo=timezone.utc),)
+        )
+    conn.commit()
+
+    if dropped:
+        print(f"Dropped expired log partitions: {', '.join(sorted(dropped))}")
+    return dropped
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from config import config
+    from src.data_layer.sql_operations import connection_pool
+
+    parser = argparse.ArgumentParser(description="Apply forecast_logs migrations and run partition maintenance.")
+    parser.add_argument("command", choices=["migrate", "maintain"])
+    args = parser.parse_args()
+
+    if connection_pool is None:
+        raise SystemExit("No database connection pool available.")
+
+    conn = connection_pool.getconn()
+    try:
+        apply_migrations(conn)
+        if args.command == "maintain":
+            ensure_partitions(conn, config.log_partitions_ahead)
+            drop_expired_partitions(conn, config.log_retention_months)
+    finally:
+        connection_pool.putconn(conn)
+        connection_pool.closeall()
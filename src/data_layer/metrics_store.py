@@ -0,0 +1,369 @@
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import config
+
+DATA_SHEET = "Data Sheet"
+
+# screener.in exports report amounts in Rs. crore, except these rows
+METRIC_UNITS = {
+    "no_of_equity_shares": "shares",
+    "face_value": "INR",
+    "operating_margin": "%",
+}
+DEFAULT_UNIT = "INR Cr"
+
+METRIC_ALIASES = {
+    "revenue": "sales",
+    "total_revenue": "sales",
+    "revenue_from_operations": "sales",
+    "total_expenses": "expenses",
+    "pat": "net_profit",
+    "profit_after_tax": "net_profit",
+    "profit": "net_profit",
+    "pbt": "profit_before_tax",
+    "ebitda": "operating_profit",
+    "opm": "operating_margin",
+    "operating_profit_margin": "operating_margin",
+    "margin": "operating_margin",
+}
+
+# Metrics summarised for every fast path forecast
+STANDARD_METRICS = ["sales", "expenses", "operating_profit", "operating_margin", "net_profit"]
+
+# Bump when the table layout changes, the store is derived data and is rebuilt from the workbooks
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metric_sources (
+    source_file TEXT PRIMARY KEY,
+    ticker TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    company TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    source_file TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    company TEXT,
+    metric TEXT NOT NULL,
+    label TEXT NOT NULL,
+    period_type TEXT NOT NULL,
+    period_end TEXT NOT NULL,
+    period TEXT NOT NULL,
+    value REAL NOT NULL,
+    unit TEXT NOT NULL,
+    PRIMARY KEY (source_file, metric, period_type, period_end)
+);
+CREATE INDEX IF NOT EXISTS metrics_ticker_idx ON metrics (ticker);
+"""
+
+
+def normalize_metric(name: str) -> str:
+    key = re.sub(r"[^a-z0-9]+", "_", str(name).lower()).strip("_")
+    return METRIC_ALIASES.get(key, key)
+
+
+def normalize_period(period: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(period).lower())
+
+
+def month_number(period_end) -> int:
+    """Months since year 0 of a period end, so the period three or twelve months earlier is a subtraction away."""
+    return period_end.year * 12 + period_end.month - 1
+
+
+def fiscal_label(period_end: pd.Timestamp, period_type: str) -> str:
+    """Indian fiscal year labels (April to March): 2025-06-30 is Q1 FY26, 2025-03-31 is FY25."""
+    fiscal_year = period_end.year + 1 if period_end.month > 3 else period_end.year
+    if period_type == "annual":
+        return f"FY{fiscal_year % 100:02d}"
+    quarter = ((period_end.month - 4) % 12) // 3 + 1
+    return f"Q{quarter} FY{fiscal_year % 100:02d}"
+
+
+def parse_data_sheet(file_path: str) -> Tuple[Optional[str], List[Dict]]:
+    """
+    Normalize the Data Sheet of a screener.in export into (metric, period, value, unit)
+    rows. Every section is a 'Report Date' row of period ends followed by one row per
+    metric; sections whose periods are about three months apart are quarterly, the rest
+    annual. Returns the company name and the rows.
+    """
+    df = pd.read_excel(file_path, sheet_name=DATA_SHEET, header=None)
+    labels = df.iloc[:, 0]
+    company = None
+    company_rows = df.index[labels.astype(str).str.strip().str.upper() == "COMPANY NAME"]
+    if len(company_rows):
+        company = str(df.iat[company_rows[0], 1]).strip()
+
+    rows = []
+    for header_index in df.index[labels.astype(str).str.strip() == "Report Date"]:
+        period_ends = pd.to_datetime(df.iloc[header_index, 1:], errors="coerce")
+        valid = period_ends.notna().to_numpy()
+        if not valid.any():
+            continue
+        period_ends = period_ends[valid]
+        spacing_days = period_ends.diff().dt.days.median() if len(period_ends) > 1 else 365
+        period_type = "quarter" if spacing_days < 120 else "annual"
+
+        section = {}
+        index = header_index + 1
+        while index < len(df) and pd.notna(labels.iat[index]):
+            label = str(labels.iat[index]).strip()
+            metric = normalize_metric(label)
+            values = pd.to_numeric(df.iloc[index, 1:][valid], errors="coerce")
+            # Repeated rows (the balance sheet has two Totals) keep the first
+            section.setdefault(metric, (label, values.to_numpy()))
+            index += 1
+
+        if period_type == "quarter" and "sales" in section and "operating_profit" in section:
+            sales, operating_profit = section["sales"][1], section["operating_profit"][1]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                margin = np.where(sales != 0, operating_profit / sales * 100, np.nan)
+            section.setdefault("operating_margin", ("Operating Margin (OPM)", margin.round(2)))
+
+        for metric, (label, values) in section.items():
+            for period_end, value in zip(period_ends, values):
+                if pd.isna(value):
+                    continue
+                rows.append({
+                    "metric": metric,
+                    "label": label,
+                    "period_type": period_type,
+                    "period_end": period_end.date().isoformat(),
+                    "period": fiscal_label(period_end, period_type),
+                    "value": float(value),
+                    "unit": METRIC_UNITS.get(metric, DEFAULT_UNIT),
+                })
+    return company, rows
+
+
+class MetricsStore:
+    """
+    Normalized (ticker, metric, period, value, unit) table of the quarterly and annual
+    results, persisted in SQLite and served from memory. Ingestion replaces a source
+    file's rows whenever its content hash changes; lookups and QoQ/YoY deltas never
+    touch the vector database.
+    """
+
+    def __init__(self, store_path: str = None):
+        self.store_path = Path(store_path or config.metrics_store_path)
+        self.lock = threading.Lock()
+        self.sources: Dict[str, Dict] = {}
+        # (ticker, metric, period_type) -> rows ordered by period_end
+        self.series: Dict[Tuple[str, str, str], List[Dict]] = {}
+        # (ticker, metric, period_type, normalized period) -> position in the series
+        self.period_index: Dict[Tuple[str, str, str, str], int] = {}
+        # (ticker, metric, period_type, month number of period_end) -> position, finds the previous and year-ago periods
+        self.month_index: Dict[Tuple[str, str, str, int], int] = {}
+        # Bumped on every change, lets derived results (e.g. the baseline forecasts) be cached
+        self.version = 0
+        self.load()
+
+    def connect(self):
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.store_path)
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            conn.executescript(
+                f"DROP TABLE IF EXISTS metrics; DROP TABLE IF EXISTS metric_sources; PRAGMA user_version = {SCHEMA_VERSION};"
+            )
+        conn.executescript(SCHEMA)
+        return conn
+
+    def load(self):
+        try:
+            with self.lock:
+                conn = self.connect()
+                try:
+                    sources = conn.execute("SELECT source_file, ticker, file_hash, company FROM metric_sources").fetchall()
+                    rows = conn.execute(
+                        "SELECT source_file, ticker, company, metric, label, period_type, period_end, period, value, unit "
+                        "FROM metrics"
+                    ).fetchall()
+                finally:
+                    conn.close()
+        except Exception as e:
+            print(f"Warning: Could not read metrics store {self.store_path}: {e}")
+            sources, rows = [], []
+
+        columns = ["source_file", "ticker", "company", "metric", "label", "period_type", "period_end", "period", "value", "unit"]
+        rows = [dict(zip(columns, row)) for row in rows]
+        self.sources = {
+            source_file: {"ticker": ticker, "file_hash": file_hash, "company": company}
+            for source_file, ticker, file_hash, company in sources
+        }
+        self.series, self.period_index, self.month_index = {}, {}, {}
+        for ticker in {row["ticker"] for row in rows}:
+            self.index_company(ticker, [row for row in rows if row["ticker"] == ticker])
+
+    def index_company(self, ticker: str, rows: List[Dict]):
+        """Rebuild the in-memory series of one company. The maps are swapped, never mutated, so readers need no lock."""
+        company_series: Dict[Tuple[str, str, str], List[Dict]] = {}
+        for row in sorted(rows, key=lambda r: (r["metric"], r["period_type"], r["period_end"])):
+            company_series.setdefault((ticker, row["metric"], row["period_type"]), []).append(row)
+
+        company_index = {}
+        company_months = {}
+        for (_, metric, period_type), metric_rows in company_series.items():
+            for i, row in enumerate(metric_rows):
+                period_end = datetime.fromisoformat(row["period_end"])
+                company_months[(ticker, metric, period_type, month_number(period_end))] = i
+                for period in (row["period"], row["period_end"], period_end.strftime("%b %Y"),
+                               row["period"].replace("FY", "FY20")):
+                    company_index[(ticker, metric, period_type, normalize_period(period))] = i
+
+        series = {key: value for key, value in self.series.items() if key[0] != ticker}
+        period_index = {key: value for key, value in self.period_index.items() if key[0] != ticker}
+        month_index = {key: value for key, value in self.month_index.items() if key[0] != ticker}
+        series.update(company_series)
+        period_index.update(company_index)
+        month_index.update(company_months)
+        self.series, self.period_index, self.month_index = series, period_index, month_index
+        self.version += 1
+
+    def is_current(self, source_file: str, file_hash: str) -> bool:
+        return self.sources.get(source_file, {}).get("file_hash") == file_hash
+
+    def company_rows(self, ticker: str) -> List[Dict]:
+        return [row for key, metric_rows in self.series.items() if key[0] == ticker for row in metric_rows]
+
+    def source_files(self, ticker: str) -> List[str]:
+        return sorted(source_file for source_file, source in self.sources.items() if source["ticker"] == ticker)
+
+    def company_name(self, ticker: str) -> Optional[str]:
+        for source_file in self.source_files(ticker):
+            if self.sources[source_file].get("company"):
+                return self.sources[source_file]["company"]
+        return None
+
+    def has_company(self, ticker: str) -> bool:
+        return any(source["ticker"] == ticker for source in self.sources.values())
+
+    def replace_source(self, source_file: str, ticker: str, file_hash: str, company: Optional[str], rows: List[Dict]):
+        """Swap every row of source_file for rows, in one transaction."""
+        rows = [{**row, "source_file": source_file, "ticker": ticker, "company": company} for row in rows]
+        with self.lock:
+            conn = self.connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM metrics WHERE source_file = ?", (source_file,))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO metrics (source_file, ticker, company, metric, label, period_type, period_end, period, value, unit) "
+                        "VALUES (:source_file, :ticker, :company, :metric, :label, :period_type, :period_end, :period, :value, :unit)",
+                        rows
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO metric_sources (source_file, ticker, file_hash, company, updated_at) VALUES (?, ?, ?, ?, ?)",
+                        (source_file, ticker, file_hash, company, datetime.now(timezone.utc).isoformat())
+                    )
+            finally:
+                conn.close()
+
+            self.sources = {**self.sources, source_file: {"ticker": ticker, "file_hash": file_hash, "company": company}}
+            kept = [row for row in self.company_rows(ticker) if row["source_file"] != source_file]
+            self.index_company(ticker, kept + rows)
+
+    def remove_source(self, source_file: str):
+        source = self.sources.get(source_file)
+        if source is None:
+            return
+        with self.lock:
+            conn = self.connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM metrics WHERE source_file = ?", (source_file,))
+                    conn.execute("DELETE FROM metric_sources WHERE source_file = ?", (source_file,))
+            finally:
+                conn.close()
+
+            self.sources = {name: source for name, source in self.sources.items() if name != source_file}
+            ticker = source["ticker"]
+            self.index_company(ticker, [row for row in self.company_rows(ticker) if row["source_file"] != source_file])
+
+    def ingest_excel(self, source_file: str, ticker: str, file_hash: str) -> int:
+        company, rows = parse_data_sheet(source_file)
+        self.replace_source(source_file, ticker, file_hash, company, rows)
+        return len(rows)
+
+    def available_metrics(self, ticker: str, period_type: str = "quarter") -> List[str]:
+        return sorted(
+            metric for series_ticker, metric, metric_period_type in self.series
+            if series_ticker == ticker and metric_period_type == period_type
+        )
+
+    @staticmethod
+    def change(current: Dict, previous: Optional[Dict]) -> Optional[Dict]:
+        if previous is None:
+            return None
+        change = round(current["value"] - previous["value"], 2)
+        result = {"period": previous["period"], "value": previous["value"], "change": change}
+        if current["unit"] != "%" and previous["value"]:
+            result["change_pct"] = round(change / abs(previous["value"]) * 100, 2)
+        return result
+
+    def row_at(self, ticker: str, metric: str, period_type: str, month: int) -> Optional[Dict]:
+        """Row of the period ending in month (a month_number), None when the series has no such period."""
+        position = self.month_index.get((ticker, metric, period_type, month))
+        return None if position is None else self.series[(ticker, metric, period_type)][position]
+
+    def lookup(self, ticker: str, metric: str, period: str = "latest", period_type: str = "quarter") -> Dict:
+        """
+        Value of a company's metric for period ('latest', 'Q1 FY26', '2025-06-30', 'Jun 2025',
+        'FY25'), with the change against the previous period (QoQ for quarters) and against
+        the same period a year earlier (YoY).
+        """
+        metric = normalize_metric(metric)
+        metric_rows = self.series.get((ticker, metric, period_type))
+        if not metric_rows:
+            return {"metric": metric, "error": f"Unknown {period_type} metric '{metric}' for {ticker}"}
+
+        if not period or normalize_period(period) == "latest":
+            position = len(metric_rows) - 1
+        else:
+            position = self.period_index.get((ticker, metric, period_type, normalize_period(period)))
+            if position is None:
+                return {"metric": metric, "error": f"No {period_type} value of '{metric}' for {ticker} in period '{period}'"}
+
+        current = metric_rows[position]
+        # By period end, not position: a quarter missing from the sheet has no row
+        month = month_number(datetime.fromisoformat(current["period_end"]))
+        previous = self.row_at(ticker, metric, period_type, month - 3)
+        year_ago = self.row_at(ticker, metric, period_type, month - 12)
+
+        result = {key: current[key] for key in ("ticker", "metric", "label", "period", "period_end", "value", "unit", "company")}
+        if period_type == "quarter":
+            result["qoq"] = self.change(current, previous)
+        result["yoy"] = self.change(current, year_ago)
+        return result
+
+
+def format_metric_value(value: float, unit: str) -> str:
+    if unit == "%":
+        return f"{value:.2f}%"
+    return f"{value:,.0f} {unit}" if float(value).is_integer() else f"{value:,.2f} {unit}"
+
+
+def format_lookup(result: Dict) -> str:
+    """One line per lookup, e.g. 'Sales, Q2 FY26 (2025-09-30): 65,799 INR Cr | QoQ +3.72% vs 63,437 INR Cr (Q1 FY26) | ...'"""
+    if "error" in result:
+        return result["error"]
+
+    parts = [f"{result['label']}, {result['period']} ({result['period_end']}): {format_metric_value(result['value'], result['unit'])}"]
+    for name, title in (("qoq", "QoQ"), ("yoy", "YoY")):
+        delta = result.get(name)
+        if not delta:
+            continue
+        if result["unit"] == "%":
+            movement = f"{delta['change']:+.2f} pp"
+        elif "change_pct" in delta:
+            movement = f"{delta['change_pct']:+.2f}%"
+        else:
+            movement = f"{delta['change']:+,.2f}"
+        parts.append(f"{title} {movement} vs {format_metric_value(delta['value'], result['unit'])} ({delta['period']})")
+    return " | ".join(parts)
@@ -0,0 +1,84 @@
+-- forecast_logs: one row per request with JSONB payloads, range partitioned by month.
+-- The primary key leads with request_id, so it also serves request_id lookups.
+
+DO $$
+BEGIN
+    IF to_regclass('forecast_logs') IS NOT NULL
+       AND (SELECT relkind FROM pg_class WHERE oid = to_regclass('forecast_logs')) = 'r' THEN
+        ALTER TABLE forecast_logs RENAME TO forecast_logs_legacy;
+        -- frees the forecast_logs_pkey name for the new table
+        IF EXISTS (
+            SELECT 1 FROM pg_constraint
+            WHERE conname = 'forecast_logs_pkey' AND conrelid = 'forecast_logs_legacy'::regclass
+        ) THEN
+            ALTER TABLE forecast_logs_legacy RENAME CONSTRAINT forecast_logs_pkey TO forecast_logs_legacy_pkey;
+        END IF;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS forecast_logs (
+    request_id VARCHAR(255) NOT NULL,
+    request_data JSONB NOT NULL,
+    response_data JSONB NOT NULL DEFAULT '{}'::jsonb,
+    timestamp TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (request_id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE IF NOT EXISTS forecast_logs_default PARTITION OF forecast_logs DEFAULT;
+
+CREATE INDEX IF NOT EXISTS forecast_logs_timestamp_idx ON forecast_logs (timestamp DESC);
+
+-- Creates the partition for the month starting at month_start (UTC). Rows that already
+-- landed in the default partition for that month are moved into it before attaching.
+CREATE OR REPLACE FUNCTION create_forecast_logs_partition(month_start DATE) RETURNS VOID AS $$
+DECLARE
+    partition_name TEXT := format('forecast_logs_p%s', to_char(month_start, 'YYYY_MM'));
+    range_start TIMESTAMPTZ := date_trunc('month', month_start)::timestamp AT TIME ZONE 'UTC';
+    range_end TIMESTAMPTZ := (date_trunc('month', month_start) + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC';
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE forecast_logs INCLUDING DEFAULTS)', partition_name);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM forecast_logs_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        range_start, range_end, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE forecast_logs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, range_start, range_end
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carry over rows from the old TEXT table, merging the request and response rows of each request
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    IF to_regclass('forecast_logs_legacy') IS NULL THEN
+        RETURN;
+    END IF;
+
+    FOR month_start IN
+        SELECT DISTINCT date_trunc('month', timestamp)::date FROM forecast_logs_legacy
+    LOOP
+        PERFORM create_forecast_logs_partition(month_start);
+    END LOOP;
+
+    INSERT INTO forecast_logs (request_id, request_data, response_data, timestamp, updated_at)
+    SELECT DISTINCT ON (request_id)
+        request_id,
+        request_data::jsonb,
+        response_data::jsonb,
+        (MIN(timestamp) OVER (PARTITION BY request_id)) AT TIME ZONE 'UTC',
+        timestamp AT TIME ZONE 'UTC'
+    FROM forecast_logs_legacy
+    ORDER BY request_id, (response_data <> '{}') DESC, timestamp DESC
+    ON CONFLICT DO NOTHING;
+
+    DROP TABLE forecast_logs_legacy;
+END $$;
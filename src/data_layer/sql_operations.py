@@ -1,14 +1,26 @@
+import asyncio
 import json
 import os
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone
-from psycopg2.pool import SimpleConnectionPool
+from pathlib import Path
+from typing import Dict, List, Optional
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 
+from config import config
+from src.data_layer.log_schema import apply_migrations, drop_expired_partitions, ensure_partitions
+
 # Load environment variables
 load_dotenv()
 
 def create_connection_pool():
-    """Create a PostgreSQL connection pool."""
+    """
+    Create a PostgreSQL connection pool. Connections are taken from asyncio.to_thread
+    workers (log writer, maintenance, log reads), so the pool has to be thread-safe.
+    """
     try:
         user = os.getenv("POSTGRES_USER")
         password = os.getenv("POSTGRES_PASSWORD")
@@ -20,7 +32,7 @@ def create_connection_pool():
             print("Warning: POSTGRES_PASSWORD not set in environment variables")
             return None
         
-        pool = SimpleConnectionPool(
+        pool = ThreadedConnectionPool(
             1, 10,
             user=user,
             password=password,
@@ -35,77 +47,308 @@ def create_connection_pool():
 
 connection_pool = create_connection_pool()
 
-async def log_request_response(request_id: str, request_data: dict, response_data: dict):
-    if connection_pool is None:
-        print("No database connection pool available.")
-        return False
+def close_connection_pool():
+    """Close every pooled PostgreSQL connection, called on application shutdown."""
+    if connection_pool is not None and not connection_pool.closed:
+        connection_pool.closeall()
 
-    conn = None
-    cursor = None
+def ensure_log_schema():
+    """Apply pending forecast_logs migrations and run partition maintenance, once at writer startup."""
+    conn = connection_pool.getconn()
     try:
-        conn = connection_pool.getconn()
-        cursor = conn.cursor()
+        apply_migrations(conn)
+        run_log_maintenance(conn)
+    finally:
+        connection_pool.putconn(conn)
+
+def run_log_maintenance(conn=None):
+    """Create upcoming monthly partitions and drop those past the retention window."""
+    pooled_conn = conn is None
+    conn = conn or connection_pool.getconn()
+    try:
+        ensure_partitions(conn, config.log_partitions_ahead)
+        drop_expired_partitions(conn, config.log_retention_months)
+    finally:
+        if pooled_conn:
+            connection_pool.putconn(conn)
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS forecast_logs (
-                id SERIAL PRIMARY KEY,
-                request_id VARCHAR(255) NOT NULL,
-                request_data TEXT NOT NULL,
-                response_data TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+def merge_log_records(records: List[Dict]) -> List[Dict]:
+    """
+    Collapse records of the same request into one, keeping the latest payloads. An upsert
+    statement cannot touch the same row twice, and a request's request-time and
+    response-time records often land in the same batch.
+    """
+    merged: Dict = {}
+    for record in records:
+        key = (record["request_id"], record["timestamp"])
+        previous = merged.get(key)
+        if previous is not None and record["response_data"] == "{}":
+            record = {**record, "response_data": previous["response_data"]}
+        merged[key] = record
+    return list(merged.values())
+
+def insert_log_records(records: List[Dict]):
+    """Upsert log records, one row per request, in one multi-row statement and a single commit."""
+    conn = connection_pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            rows = merge_log_records(records)
+            execute_values(
+                cursor,
+                """
+                INSERT INTO forecast_logs (request_id, request_data, response_data, timestamp)
+                VALUES %s
+                ON CONFLICT (request_id, timestamp) DO UPDATE SET
+                    request_data = EXCLUDED.request_data,
+                    response_data = CASE
+                        WHEN EXCLUDED.response_data = '{}'::jsonb THEN forecast_logs.response_data
+                        ELSE EXCLUDED.response_data
+                    END,
+                    updated_at = now()
+                """,
+                [
+                    (record["request_id"], record["request_data"], record["response_data"], record["timestamp"])
+                    for record in rows
+                ],
+                template="(%s, %s::jsonb, %s::jsonb, %s::timestamptz)",
+                page_size=len(rows)
             )
-        """)
         conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        connection_pool.putconn(conn)
 
-        cursor.execute("""
-            INSERT INTO forecast_logs (request_id, request_data, response_data, timestamp)
-            VALUES (%s, %s, %s, %s)
-        """, (
-            request_id,
-            json.dumps(request_data),
-            json.dumps(response_data),
-            datetime.now(timezone.utc)
-        ))
-        conn.commit()
+_STOP_WRITER = object()
 
-        cursor.execute("SELECT * FROM forecast_logs WHERE request_id = %s", (request_id,))
-        result = cursor.fetchall()
-        print(f"Logged record with request_id {request_id}: {result}")
-        return True
+class LogWriter:
+    """
+    Background writer for forecast_logs. Callers only enqueue; a single task drains the
+    bounded queue and inserts multi-row batches whenever batch_size records are waiting
+    or flush_interval seconds have passed. Batches that cannot be written, and records
+    that arrive while the queue is full, are appended to a JSONL spill file which is
+    replayed into Postgres after the next successful flush. A sink callable, when given,
+    receives the batches instead of Postgres (used by the offline benchmarks).
+    """
 
-    except Exception as e:
-        print(f"Database error while logging request/response: {e}")
+    def __init__(self, max_queue_size: int = None, batch_size: int = None,
+                 flush_interval: float = None, spill_path: str = None, sink=None):
+        self.max_queue_size = max_queue_size or config.log_queue_size
+        self.batch_size = batch_size or config.log_batch_size
+        self.flush_interval = flush_interval or config.log_flush_interval_seconds
+        self.spill_path = Path(spill_path or config.log_spill_path)
+        self.sink = sink
+        self.spill_lock = threading.Lock()
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.maintenance_task: Optional[asyncio.Task] = None
+        self.schema_ready = False
+        # First-seen timestamp per request, so every record of a request upserts the same row
+        self.request_timestamps: "OrderedDict[str, str]" = OrderedDict()
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None or connection_pool is not None
+
+    def write_records(self, records: List[Dict]):
+        (self.sink or insert_log_records)(records)
+
+    def start(self):
+        if self.running or not self.enabled:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.task = asyncio.create_task(self._run())
+        if self.sink is None:
+            self.maintenance_task = asyncio.create_task(self._run_maintenance())
+
+    def request_timestamp(self, request_id: str) -> str:
+        timestamp = self.request_timestamps.get(request_id)
+        if timestamp is None:
+            timestamp = datetime.now(timezone.utc).isoformat()
+            self.request_timestamps[request_id] = timestamp
+            while len(self.request_timestamps) > self.max_queue_size:
+                self.request_timestamps.popitem(last=False)
+        return timestamp
+
+    def enqueue(self, record: Dict) -> bool:
+        self.start()
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            print("Warning: Log queue full, spilling record to disk")
+            self.spill([record])
+            return False
+
+    async def _run(self):
+        try:
+            if self.sink is None:
+                await asyncio.to_thread(ensure_log_schema)
+            self.schema_ready = True
+        except Exception as e:
+            print(f"Database error while migrating forecast_logs schema: {e}")
+
+        stopping = False
+        while not stopping:
+            batch = [await self.queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            if _STOP_WRITER in batch:
+                batch = batch[:batch.index(_STOP_WRITER)]
+                stopping = True
+            if batch:
+                await self.flush(batch)
+
+    async def _run_maintenance(self):
+        # Startup maintenance runs with the migrations in ensure_log_schema
+        while True:
+            await asyncio.sleep(config.log_maintenance_interval_seconds)
+            try:
+                await asyncio.to_thread(run_log_maintenance)
+            except Exception as e:
+                print(f"Database error during log partition maintenance: {e}")
+
+    async def flush(self, batch: List[Dict]):
+        try:
+            if not self.schema_ready:
+                await asyncio.to_thread(ensure_log_schema)
+                self.schema_ready = True
+            await asyncio.to_thread(self.write_records, batch)
+        except Exception as e:
+            print(f"Database error while logging {len(batch)} records, spilling to disk: {e}")
+            await asyncio.to_thread(self.spill, batch)
+            return
+
+        if self.spill_path.exists():
+            await asyncio.to_thread(self.replay_spill)
+
+    def spill(self, records: List[Dict]):
+        with self.spill_lock:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+
+    def replay_spill(self):
+        with self.spill_lock:
+            if not self.spill_path.exists():
+                return
+            with open(self.spill_path, "r", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            try:
+                for start in range(0, len(records), self.batch_size):
+                    self.write_records(records[start:start + self.batch_size])
+            except Exception as e:
+                # Keep only what was not written, the next successful flush retries it
+                print(f"Database error while replaying spilled logs: {e}")
+                with open(self.spill_path, "w", encoding="utf-8") as f:
+                    for record in records[start:]:
+                        f.write(json.dumps(record) + "\n")
+                return
+            self.spill_path.unlink()
+            print(f"Replayed {len(records)} spilled log records")
+
+    async def stop(self):
+        """Flush everything still queued, then stop the writer task."""
+        if self.maintenance_task is not None:
+            self.maintenance_task.cancel()
+        if not self.running:
+            return
+        await self.queue.put(_STOP_WRITER)
+        try:
+            await asyncio.wait_for(self.task, timeout=self.flush_interval + config.http_timeout)
+        except asyncio.TimeoutError:
+            print("Warning: Log writer did not drain before shutdown")
+
+log_writer = LogWriter()
+
+async def log_request_response(request_id: str, request_data: dict, response_data: dict):
+    """Queue a log record for the background writer, never waits on the database."""
+    if not log_writer.enabled:
+        print("No database connection pool available.")
         return False
 
+    return log_writer.enqueue({
+        "request_id": request_id,
+        "request_data": json.dumps(request_data),
+        "response_data": json.dumps(response_data),
+        "timestamp": log_writer.request_timestamp(request_id)
+    })
+
+def fetch_logs(query: str, params: tuple) -> List[Dict]:
+    conn = None
+    cursor = None
+    try:
+        conn = connection_pool.getconn()
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        logs = cursor.fetchall()
+        # Convert to list of dicts for consistency
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in logs]
     finally:
         if cursor:
             cursor.close()
         if conn:
             connection_pool.putconn(conn)
 
-async def fetch_recent_logs(limit=20):
+# ThreadedConnectionPool raises instead of waiting when every connection is out, so reads are bounded
+log_read_slots = asyncio.Semaphore(config.log_read_concurrency)
+
+async def read_logs(query: str, params: tuple) -> List[Dict]:
+    async with log_read_slots:
+        return await asyncio.to_thread(fetch_logs, query, params)
+
+async def fetch_recent_logs(limit=20, since: Optional[datetime] = None):
+    """
+    Most recent requests. Served from the timestamp index, and a since bound lets
+    Postgres skip older partitions entirely.
+    """
     if connection_pool is None:
         print("No database connection pool available.")
         return []
-    
-    conn = None
-    cursor = None
+
     try:
-        conn = connection_pool.getconn()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT timestamp, request_data, response_data FROM forecast_logs ORDER BY timestamp DESC LIMIT %s", (limit,)
+        if since is None:
+            return await read_logs(
+                "SELECT request_id, timestamp, request_data, response_data FROM forecast_logs "
+                "ORDER BY timestamp DESC LIMIT %s",
+                (limit,)
+            )
+        return await read_logs(
+            "SELECT request_id, timestamp, request_data, response_data FROM forecast_logs "
+            "WHERE timestamp >= %s ORDER BY timestamp DESC LIMIT %s",
+            (since, limit)
         )
-        logs = cursor.fetchall()
-        # Convert to list of dicts for consistency
-        columns = [desc[0] for desc in cursor.description]
-        result = [dict(zip(columns, row)) for row in logs]
-        return result
     except Exception as e:
         print(f"Error fetching logs: {e}")
         return []
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            connection_pool.putconn(conn)
\ No newline at end of file
+
+async def fetch_request_log(request_id: str) -> Optional[Dict]:
+    if connection_pool is None:
+        print("No database connection pool available.")
+        return None
+
+    try:
+        logs = await read_logs(
+            "SELECT request_id, timestamp, updated_at, request_data, response_data FROM forecast_logs "
+            "WHERE request_id = %s",
+            (request_id,)
+        )
+        return logs[0] if logs else None
+    except Exception as e:
+        print(f"Error fetching log for request {request_id}: {e}")
+        return None
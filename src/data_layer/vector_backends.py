@@ -0,0 +1,181 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional
+from config import config
+
+
+def batch_chunks(lst, n=96):
+    """Split a list into batches of size n."""
+    for i in range(0, len(lst), n):
+        yield lst[i:i + n]
+
+
+class VectorBackend(ABC):
+    """
+    Storage and search half of VectorDBOperations. Implementations are synchronous,
+    VectorDBOperations runs every call on its executor.
+
+    Records passed to upsert are already validated and flattened:
+    {"_id": ..., "chunk_text": ..., <metadata fields>}.
+    """
+
+    name = "base"
+    embedding_model = None
+    upsert_batch_size = 96
+    delete_batch_size = 1000
+
+    @abstractmethod
+    def ensure_index(self):
+        ...
+
+    @abstractmethod
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        ...
+
+    @abstractmethod
+    def upsert(self, namespace: str, records: List[Dict]):
+        ...
+
+    @abstractmethod
+    def delete(self, namespace: str, ids: List[str]):
+        ...
+
+    @abstractmethod
+    def query(self, namespace: str, vector: List[float], top_k: int, metadata_filter: Optional[Dict] = None,
+              rerank: bool = False, include_values: bool = False) -> List[Dict]:
+        """
+        Return matches as [{"id": ..., "score": ..., "metadata": {...}}] ordered by score,
+        with include_values each match also carries its stored vector as "values".
+        """
+
+    def close(self):
+        pass
+
+
+class PineconeBackend(VectorBackend):
+    name = "pinecone"
+
+    def __init__(self):
+        from pinecone import Pinecone
+
+        if not config.pinecone_api_key:
+            raise ValueError("PINECONE_API_KEY not found in config")
+        if not config.pinecone_index_name:
+            raise ValueError("Pinecone index name not configured in config")
+        self.pc = Pinecone(api_key=config.pinecone_api_key)
+        self.index_name = config.pinecone_index_name
+        self.embedding_model = config.embedding_model
+        self.index = None
+        self.index_ready = False
+
+    def ensure_index(self):
+        if self.index_ready:
+            return self.index_name
+
+        if self.index_name not in self.pc.list_indexes().names():
+            self.pc.create_index_for_model(
+                name=self.index_name,
+                cloud="aws",
+                region="us-east-1",
+                embed={
+                    "model": self.embedding_model,
+                    "field_map": {"text": "chunk_text"}
+                }
+            )
+        self.index_ready = True
+        return self.index_name
+
+    def get_index(self):
+        # Reuse one Index handle so its connection pool is shared across requests, sized so every
+        # VectorDBOperations worker thread gets a connection
+        if self.index is None:
+            self.index = self.pc.Index(self.index_name, pool_threads=config.vectordb_max_workers)
+        return self.index
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        inference_model = self.pc.inference.embed(
+            model=self.embedding_model,
+            inputs=queries,
+            parameters={"input_type": "query"}
+        )
+
+        if hasattr(inference_model, 'data') and inference_model.data:
+            return [item.values for item in inference_model.data]
+        elif isinstance(inference_model, dict) and 'data' in inference_model:
+            return [item.get('values', []) for item in inference_model['data']]
+        elif hasattr(inference_model, 'values'):
+            return [inference_model.values]
+        return [[] for _ in queries]
+
+    def upsert(self, namespace: str, records: List[Dict]):
+        self.get_index().upsert_records(namespace, records)
+
+    def delete(self, namespace: str, ids: List[str]):
+        self.get_index().delete(ids=ids, namespace=namespace)
+
+    def query(self, namespace: str, vector: List[float], top_k: int, metadata_filter: Optional[Dict] = None,
+              rerank: bool = False, include_values: bool = False) -> List[Dict]:
+        query_params = {
+            "vector": vector,
+            "top_k": top_k,
+            "include_metadata": True,
+            "include_values": include_values,
+            "namespace": namespace
+        }
+
+        if metadata_filter:
+            query_params["filter"] = metadata_filter
+
+        if rerank:
+            query_params["rerank"] = {
+                "model": "bge-reranker-v2-m3",
+                "top_n": 10,
+                "rank_fields": ["chunk_text"]
+            }
+
+        results = self.get_index().query(**query_params)
+
+        if hasattr(results, 'matches'):
+            matches = results.matches
+        elif isinstance(results, dict):
+            matches = results.get("matches", [])
+        else:
+            matches = []
+
+        formatted_results = []
+        for match in matches:
+            if isinstance(match, dict):
+                match_id = match.get("id")
+                match_score = match.get("score", 0)
+                match_metadata = match.get("metadata", {})
+                match_values = match.get("values")
+                if not match_metadata:
+                    match_metadata = {k: v for k, v in match.items() if k not in ["id", "score", "values"]}
+            else:
+                match_id = getattr(match, "id", None)
+                match_score = getattr(match, "score", 0)
+                match_metadata = getattr(match, "metadata", {})
+                match_values = getattr(match, "values", None)
+                if not match_metadata or not isinstance(match_metadata, dict):
+                    match_metadata = {}
+                    for attr in ["type", "source_file", "chunk_index", "chunk_text", "text"]:
+                        if hasattr(match, attr):
+                            match_metadata[attr] = getattr(match, attr)
+
+            formatted_result = {
+                "id": match_id,
+                "score": match_score,
+                "metadata": match_metadata if isinstance(match_metadata, dict) else {}
+            }
+            if include_values and match_values:
+                formatted_result["values"] = list(match_values)
+            formatted_results.append(formatted_result)
+
+        return formatted_results
+
+    def close(self):
+        if self.index is not None and hasattr(self.index, "close"):
+            try:
+                self.index.close()
+            except Exception as e:
+                print(f"Warning: Error closing Pinecone index connection: {e}")
+        self.index = None
@@ -1,42 +1,64 @@
-from pinecone import Pinecone
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 from config import config
+from src.data_layer.embedding_cache import EmbeddingCache
+from src.data_layer.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from src.data_layer.vector_backends import VectorBackend, PineconeBackend, batch_chunks
+from src.utils.telemetry import CACHE_REQUESTS, span
 
 
-def batch_chunks(lst, n=96):
-    """Split a list into batches of size n."""
-    for i in range(0, len(lst), n):
-        yield lst[i:i + n]
+def namespace_for(ticker: str, doc_type: str) -> str:
+    """
+    Namespace a company's documents of one type are stored in: one namespace per ticker,
+    split per document type with NAMESPACE_PER_TYPE. Queries only ever scan one company.
+    """
+    return f"{ticker}.{doc_type}" if config.namespace_per_type else ticker
+
+
+def get_vector_backend(name: str = None) -> VectorBackend:
+    name = name or config.vector_backend
+    if name == "pinecone":
+        return PineconeBackend()
+    if name == "local":
+        from src.data_layer.local_vector_index import LocalVectorBackend
+        return LocalVectorBackend()
+    raise ValueError(f"Unknown vector backend: {name}")
 
 
 class VectorDBOperations:
-    def __init__(self):
-        if not config.pinecone_api_key:
-            raise ValueError("PINECONE_API_KEY not found in config")
-        if not config.pinecone_index_name:
-            raise ValueError("Pinecone index name not configured in config")
-        self.pc = Pinecone(api_key=config.pinecone_api_key)
-        self.index_name = config.pinecone_index_name
+    def __init__(self, backend: VectorBackend = None):
+        self.backend = backend or get_vector_backend()
+        self.index_ready = False
+        self.lexical_index = LexicalIndex(config.lexical_index_path)
+        self.embedding_cache = EmbeddingCache(
+            max_entries=config.embedding_cache_size,
+            ttl_seconds=config.embedding_cache_ttl_seconds,
+            disk_path=config.embedding_cache_path
+        )
+        # Backends are synchronous, every call is run on this bounded pool to keep the event loop free
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.vectordb_max_workers,
+            thread_name_prefix="vectordb"
+        )
+
+    async def run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
 
     async def create_index(self):
-        if self.index_name not in self.pc.list_indexes().names():
-            self.pc.create_index_for_model(
-                name=self.index_name,
-                cloud="aws",
-                region="us-east-1",
-                embed={
-                    "model": "llama-text-embed-v2",
-                    "field_map": {"text": "chunk_text"}
-                }
-            )
-        return self.index_name
+        if not self.index_ready:
+            await self.run_blocking(self.backend.ensure_index)
+            self.index_ready = True
 
-    def get_index(self):
-        return self.pc.Index(self.index_name)
+    def close(self):
+        self.backend.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.embedding_cache.close()
 
     async def upsert_records(self, records: List[Dict], namespace: Optional[str] = None):
         await self.create_index()
-        dense_index = self.get_index()
         
         validated_records = []
         for record in records:
@@ -66,79 +88,146 @@ class VectorDBOperations:
         
         namespace_param = namespace if namespace else "__default__"
         
-        for batch in batch_chunks(validated_records, n=96):
-            dense_index.upsert_records(namespace_param, batch)
+        with span("vector_upsert", self.backend.name, namespace=namespace_param, records=len(validated_records)):
+            await asyncio.gather(*[
+                self.run_blocking(self.backend.upsert, namespace_param, batch)
+                for batch in batch_chunks(validated_records, n=self.backend.upsert_batch_size)
+            ])
+            await self.run_blocking(self.lexical_index.add_documents, namespace_param, validated_records)
+
+    async def delete_records(self, ids: List[str], namespace: Optional[str] = None):
+        if not ids:
+            return
+        await self.create_index()
+        namespace_param = namespace if namespace else "__default__"
+
+        with span("vector_delete", self.backend.name, namespace=namespace_param, records=len(ids)):
+            await asyncio.gather(*[
+                self.run_blocking(self.backend.delete, namespace_param, batch)
+                for batch in batch_chunks(ids, n=self.backend.delete_batch_size)
+            ])
+            await self.run_blocking(self.lexical_index.remove_documents, namespace_param, ids)
+
+    async def persist_lexical_index(self):
+        await self.run_blocking(self.lexical_index.save)
+
+    async def embed_query(self, query: str) -> List[float]:
+        query_vectors = await self.embed_queries([query])
+        return query_vectors[0]
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries, serving what it can from the cache and batching the rest in one call."""
+        embedding_model = self.backend.embedding_model
+        query_vectors = self.embedding_cache.get_memory(queries, embedding_model)
+
+        # Memory misses are looked up on disk together, in one thread hop off the event loop
+        missing = [i for i, vector in enumerate(query_vectors) if vector is None]
+        if missing:
+            missing_queries = [queries[i] for i in missing]
+            if self.embedding_cache.disk is None:
+                disk_vectors = self.embedding_cache.get_disk(missing_queries, embedding_model)
+            else:
+                disk_vectors = await asyncio.to_thread(self.embedding_cache.get_disk, missing_queries, embedding_model)
+            for i, vector in zip(missing, disk_vectors):
+                query_vectors[i] = vector
+            missing = [i for i in missing if query_vectors[i] is None]
+
+        CACHE_REQUESTS.inc(len(queries) - len(missing), cache="embedding", result="hit")
+        CACHE_REQUESTS.inc(len(missing), cache="embedding", result="miss")
+        if missing:
+            missing_queries = list(dict.fromkeys(queries[i] for i in missing))
+            with span("embedding", embedding_model, queries=len(missing_queries), cache_hits=len(queries) - len(missing)):
+                embedded = await self.run_blocking(self.backend.embed_queries, missing_queries)
+            embedded_by_query = dict(zip(missing_queries, embedded))
+            for i in missing:
+                query_vectors[i] = embedded_by_query.get(queries[i]) or []
+
+            new_queries = [query for query in missing_queries if embedded_by_query.get(query)]
+            new_vectors = [embedded_by_query[query] for query in new_queries]
+            self.embedding_cache.set_memory(new_queries, embedding_model, new_vectors)
+            if self.embedding_cache.disk is not None and new_queries:
+                await asyncio.to_thread(self.embedding_cache.set_disk, new_queries, embedding_model, new_vectors)
+
+        return query_vectors
+
+    async def search_with_vector(self, query: str, query_vector: List[float], top_k: int, namespace: str,
+                                 rerank: bool, metadata_filter: Optional[Dict], mode: str,
+                                 include_values: bool = False):
+        if not query_vector:
+            return []
+
+        with span("vector_query", mode, namespace=namespace, top_k=top_k) as attributes:
+            results = await self._search_with_vector(
+                query, query_vector, top_k, namespace, rerank, metadata_filter, mode, include_values
+            )
+            attributes["results"] = len(results)
+            return results
+
+    async def _search_with_vector(self, query: str, query_vector: List[float], top_k: int, namespace: str,
+                                  rerank: bool, metadata_filter: Optional[Dict], mode: str,
+                                  include_values: bool = False):
+        if mode != "hybrid":
+            return await self.run_blocking(
+                self.backend.query,
+                namespace,
+                query_vector,
+                top_k,
+                metadata_filter=metadata_filter,
+                rerank=rerank,
+                include_values=include_values
+            )
+
+        candidate_k = top_k * config.hybrid_candidate_multiplier
+        dense_results, lexical_results = await asyncio.gather(
+            self.run_blocking(
+                self.backend.query,
+                namespace,
+                query_vector,
+                candidate_k,
+                metadata_filter=metadata_filter,
+                rerank=rerank,
+                include_values=include_values
+            ),
+            self.run_blocking(self.lexical_index.search, namespace, query, candidate_k, metadata_filter)
+        )
+        if not lexical_results:
+            return dense_results[:top_k]
+
+        return reciprocal_rank_fusion(
+            {"dense": dense_results, "lexical": lexical_results},
+            top_k=top_k,
+            rrf_k=config.rrf_k
+        )
 
-    async def search_records(self, query: str, top_k: int = 10, namespace: Optional[str] = None, rerank: bool = False):
-        dense_index = self.get_index()
+    async def search_records(self, query: str, top_k: int = 10, namespace: Optional[str] = None, rerank: bool = False,
+                             metadata_filter: Optional[Dict] = None, mode: Optional[str] = None,
+                             include_values: bool = False):
+        """
+        mode "dense" queries the vector backend only, "hybrid" also runs BM25 over the
+        lexical index and fuses both rankings with reciprocal rank fusion. include_values
+        returns the stored vectors of the dense matches as "values".
+        """
+        results = await self.search_records_batch(
+            [query], top_k, namespace, rerank, metadata_filter, mode, include_values
+        )
+        return results[0]
+
+    async def search_records_batch(self, queries: List[str], top_k: int = 10, namespace: Optional[str] = None,
+                                   rerank: bool = False, metadata_filter: Optional[Dict] = None,
+                                   mode: Optional[str] = None, include_values: bool = False) -> List[List[Dict]]:
+        """Search several queries at once: one embedding call, then every index query concurrently."""
         namespace_param = namespace if namespace else "__default__"
+        mode = mode or config.retrieval_mode
         
         try:
-            inference_model = self.pc.inference.embed(
-                model="llama-text-embed-v2",
-                inputs=[query],
-                parameters={"input_type": "query"}
-            )
-            
-            if hasattr(inference_model, 'data') and inference_model.data:
-                query_vector = inference_model.data[0].values
-            elif isinstance(inference_model, dict) and 'data' in inference_model:
-                query_vector = inference_model['data'][0].get('values', [])
-            else:
-                query_vector = inference_model.values if hasattr(inference_model, 'values') else []
-            
-            if not query_vector:
-                return []
-            
-            query_params = {
-                "vector": query_vector,
-                "top_k": top_k,
-                "include_metadata": True,
-                "namespace": namespace_param
-            }
-            
-            if rerank:
-                query_params["rerank"] = {
-                    "model": "bge-reranker-v2-m3",
-                    "top_n": 10,
-                    "rank_fields": ["chunk_text"]
-                }
-            
-            results = dense_index.query(**query_params)
-            
-            if hasattr(results, 'matches'):
-                matches = results.matches
-            elif isinstance(results, dict):
-                matches = results.get("matches", [])
-            else:
-                matches = []
-            
-            formatted_results = []
-            for match in matches:
-                if isinstance(match, dict):
-                    match_id = match.get("id")
-                    match_score = match.get("score", 0)
-                    match_metadata = match.get("metadata", {})
-                    if not match_metadata:
-                        match_metadata = {k: v for k, v in match.items() if k not in ["id", "score", "values"]}
-                else:
-                    match_id = getattr(match, "id", None)
-                    match_score = getattr(match, "score", 0)
-                    match_metadata = getattr(match, "metadata", {})
-                    if not match_metadata or not isinstance(match_metadata, dict):
-                        match_metadata = {}
-                        for attr in ["type", "source_file", "chunk_index", "chunk_text", "text"]:
-                            if hasattr(match, attr):
-                                match_metadata[attr] = getattr(match, attr)
-                
-                formatted_results.append({
-                    "id": match_id,
-                    "score": match_score,
-                    "metadata": match_metadata if isinstance(match_metadata, dict) else {}
-                })
-            
-            return formatted_results
+            query_vectors = await self.embed_queries(queries)
+            return list(await asyncio.gather(*[
+                self.search_with_vector(
+                    query, query_vector, top_k, namespace_param, rerank, metadata_filter, mode, include_values
+                )
+                for query, query_vector in zip(queries, query_vectors)
+            ]))
             
         except Exception as e:
             print(f"Error in search_records: {e}")
-            return []
\ No newline at end of file
+            return [[] for _ in queries]
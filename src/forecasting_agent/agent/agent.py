@@ -1,29 +1,90 @@
-import json
-import re
+import asyncio
+from contextlib import aclosing
 from datetime import datetime
+from pathlib import Path
+
+import httpx
 
 from config import config
 from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_community.callbacks.manager import get_openai_callback
+from langchain_core.messages import HumanMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 
+from src.data_layer.metrics_store import STANDARD_METRICS
+from src.forecasting_agent.models.forecast_schema import (
+    ForecastOutput,
+    forecast_parser,
+    is_forecast_field,
+    parse_forecast,
+    validate_forecast,
+)
 from src.forecasting_agent.prompts.prompts import ForecastingPrompts
+from src.utils.llm_scheduler import LLMScheduler, ScheduledChatModel
+from src.utils.telemetry import TelemetryCallbackHandler
 from src.forecasting_agent.tools.tools import (
     think,
     analyze,
     financial_data_extractor,
     qualitative_analysis,
+    multi_query_retriever,
+    financial_metrics_lookup,
+    quantitative_forecast,
+    baseline_forecasts,
+    context_sources,
+    get_metrics_store,
+    get_quant_forecaster,
+    get_ticker,
+    set_ticker,
+    lookup_metrics,
+    get_vector_db,
+    retrieve_matches_batch,
+)
+from src.forecasting_agent.tools.context_assembly import (
+    CONTEXT_SEPARATOR,
+    assemble_contexts,
+    pool_matches,
+    request_accounting,
+    start_request_accounting,
 )
 
+# Standard retrievals every forecast needs, prefetched by the fast path alongside the user query
+FAST_PATH_FINANCIAL_QUERIES = [
+    "quarterly sales revenue",
+    "quarterly net profit",
+    "quarterly operating profit and operating margin OPM",
+    "quarterly expenses",
+]
+FAST_PATH_TRANSCRIPT_QUERIES = [
+    "management outlook and guidance for upcoming quarters",
+    "deal wins order book and demand pipeline",
+    "key risks headwinds and challenges",
+    "growth drivers and strategic priorities",
+]
+
 class ForecastingAgent:
     def __init__(self):
         self.forecasting_model = config.forecasting_model
+
+        # Pooled clients so every request reuses the same keep-alive connections to Groq
+        limits = httpx.Limits(
+            max_connections=config.http_max_connections,
+            max_keepalive_connections=config.http_max_keepalive_connections
+        )
+        self.http_client = httpx.Client(limits=limits, timeout=config.http_timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=config.http_timeout)
         
-        self.forecasting_llm = ChatGroq(
-            model=self.forecasting_model,
-            temperature=0.1,
-            max_retries=2
+        # Paced to the provider's rate budgets; the scheduler owns retries so they honor the pacing too
+        self.llm_scheduler = LLMScheduler()
+        self.forecasting_llm = ScheduledChatModel(
+            model=ChatGroq(
+                model=self.forecasting_model,
+                temperature=0.1,
+                max_retries=0,
+                http_client=self.http_client,
+                http_async_client=self.http_async_client
+            ),
+            scheduler=self.llm_scheduler
         )
         # self.forecasting_llm = ChatOpenAI(
         #     model = config.forecasting_model,
@@ -32,38 +93,28 @@ class ForecastingAgent:
         # )
         self.forecasting_prompts = ForecastingPrompts()
         self.tools = [
+            financial_metrics_lookup,
+            quantitative_forecast,
             financial_data_extractor,
             qualitative_analysis,
+            multi_query_retriever,
             think,
             analyze,
         ]
 
+    async def aclose(self):
+        await self.http_async_client.aclose()
+        self.http_client.close()
+
     async def build_forecasting_prompt(self, query):
 
-        output_format = """{
-"financial_metrics_extracted": {
-    "sales": " quarterly sales/revenue",
-    "net_profit": "quaterly net profit",
-    "operating_profit": "quarterly operating profit",
-},
-"qualitative_analysis": {
-    "management_sentiment": "",
-    "recurring_themes": "Key themes mentioned across multiple conferences",
-    "forward_looking_statements": "Specific forward-looking statements made by management about future performance, guidance, or strategic direction",
-},
-"forecast": {
-    "revenue_outlook": "Projected revenue outlook for upcoming quarters",
-    "profitability_outlook": "Expected profitability trends and margin projections",
-    "key_growth_drivers": "Main factors expected to drive growth",
-    "risks": "Key risks and challenges identified",
-    "opportunities": "Potential opportunities and growth areas"
-}
-}"""
+        output_format = self.forecasting_prompts.output_format
 
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
         system_prompt = self.forecasting_prompts.system_prompt.format(
             query=query,
+            company=self.company_label(),
             output_format=output_format,
             current_time=current_time
         )
@@ -79,94 +130,218 @@ class ForecastingAgent:
         return prompt
 
     async def extract_json_from_text(self, text):
-        """Extract JSON from agent's text output."""
-        if not text:
-            return None
-        
-        cleaned_text = text.strip()
-        
-        if cleaned_text.startswith("```json"):
-            cleaned_text = cleaned_text[len("```json"):].strip()
-        if cleaned_text.startswith("```"):
-            cleaned_text = cleaned_text[len("```"):].strip()
-        if cleaned_text.endswith("```"):
-            cleaned_text = cleaned_text[:-len("```")].strip()
-        
+        """Forecast fields of the agent's text output, None when it has none."""
+        forecast = parse_forecast(text)
+        return forecast.model_dump(exclude_none=True) if forecast is not None else None
+
+    @staticmethod
+    def missing_fields(forecast_response):
+        if not forecast_response:
+            return ForecastOutput().missing_fields()
+        return ForecastOutput.model_validate(forecast_response).missing_fields()
+
+    @staticmethod
+    def company_label():
+        """Company the current request is about, e.g. 'TATA CONSULTANCY SERVICES LTD (TCS)'."""
+        ticker = get_ticker()
+        company_name = get_metrics_store().company_name(ticker)
+        return f"{company_name} ({ticker})" if company_name else ticker
+
+    @staticmethod
+    def quantitative_summary(session_id=None):
+        """Baseline projections of the standard metrics, returned alongside the narrative forecast."""
         try:
-            return json.loads(cleaned_text)
-        except Exception:
-            pass
-        
-        # Try to extract key fields using regex patterns
-        patterns = {
-            'financial_metrics_extracted': r'"financial_metrics_extracted"\s*:\s*(\{[^}]*\})',
-            'qualitative_analysis': r'"qualitative_analysis"\s*:\s*(\{[^}]*\})',
-            'forecast': r'"forecast"\s*:\s*(\{[^}]*\})',
-            'revenue_outlook': r'"revenue_outlook"\s*:\s*"([^"]*?)"',
-            'profitability_outlook': r'"profitability_outlook"\s*:\s*"([^"]*?)"',
-            'key_growth_drivers': r'"key_growth_drivers"\s*:\s*"([^"]*?)"',
-            'risks': r'"risks"\s*:\s*"([^"]*?)"',
-            'opportunities': r'"opportunities"\s*:\s*"([^"]*?)"',
-            'management_sentiment': r'"management_sentiment"\s*:\s*"([^"]*?)"',
-            'recurring_themes': r'"recurring_themes"\s*:\s*"([^"]*?)"',
-            'forward_looking_statements': r'"forward_looking_statements"\s*:\s*"([^"]*?)"'
+            return get_quant_forecaster().summary(get_ticker(), STANDARD_METRICS)
+        except Exception as e:
+            print(f"WARNING: {session_id or 'N/A'}: Could not compute the quantitative forecast: {e}")
+            return {}
+
+    def build_forecast_result(self, forecast_response, session_id=None):
+        if forecast_response:
+            print(f"{session_id or 'N/A'}: Successfully generated forecast")
+            result = {
+                'status_code': 200,
+                'ticker': get_ticker(),
+                'forecast_data': forecast_response,
+                'quantitative_forecast': self.quantitative_summary(session_id),
+                'context_tokens': request_accounting()
+            }
+            missing_fields = self.missing_fields(forecast_response)
+            if missing_fields:
+                # A partial answer is returned as is rather than paying for another run
+                print(f"WARNING: {session_id or 'N/A'}: Forecast is missing {', '.join(missing_fields)}")
+                result['missing_fields'] = missing_fields
+            return result
+        print(
+            f"WARNING: {session_id or 'N/A'}: Failed to extract forecast response from agent output"
+        )
+        return {
+            'status_code': 500,
+            'status_messages': 'Failed to extract forecast response from agent output'
         }
-        
-        result = {}
-        for key, pattern in patterns.items():
-            match = re.search(pattern, cleaned_text, re.DOTALL)
-            if match:
-                result[key] = match.group(1).strip()
-        
-        return result if result else None
 
-    async def forecasting_call(self, query, session_id=None):
+    def log_token_usage(self, telemetry: TelemetryCallbackHandler):
+        print(f"Token usage: {telemetry.usage_info()}")
+
+    def telemetry_handler(self, session_id=None):
+        """Callback handler recording each LLM iteration and tool call of one request."""
+        return TelemetryCallbackHandler(self.forecasting_model, request_id=session_id)
+
+    @staticmethod
+    def assemble_prefetched(matches_per_query, queries, stage):
+        """One context block from every query's matches, diversified and packed to FAST_PATH_TOKEN_BUDGET."""
+        contexts = assemble_contexts(
+            pool_matches(matches_per_query),
+            k=config.fast_path_k * len(queries),
+            token_budget=config.fast_path_token_budget,
+            stage=stage
+        )
+        return CONTEXT_SEPARATOR.join(contexts)
+
+    async def prefetch_contexts(self, query):
+        """Retrieve the current company's standard financial and transcript contexts in parallel."""
+        financial_queries = [query] + FAST_PATH_FINANCIAL_QUERIES
+        transcript_queries = [query] + FAST_PATH_TRANSCRIPT_QUERIES
+
+        # One embedding batch for every query, the per-type searches then hit the embedding cache
+        await get_vector_db().embed_queries(financial_queries + transcript_queries)
+        financial_matches, transcript_matches = await asyncio.gather(
+            retrieve_matches_batch(financial_queries, "quarterly_reports", config.fast_path_k),
+            retrieve_matches_batch(transcript_queries, "transcriptions", config.fast_path_k)
+        )
+
+        financial_context = (
+            self.assemble_prefetched(financial_matches, financial_queries, "fast_path_financial")
+            or "No relevant quarterly financial data found."
+        )
+        transcript_context = (
+            self.assemble_prefetched(transcript_matches, transcript_queries, "fast_path_transcripts")
+            or "No relevant transcript data found."
+        )
+
+        # Exact latest figures with QoQ/YoY from the metrics store ahead of the retrieved chunks
+        metrics_store = get_metrics_store()
+        if metrics_store.has_company(get_ticker()):
+            source_files = ", ".join(Path(source_file).name for source_file in metrics_store.source_files(get_ticker()))
+            metrics_summary = (
+                f"{lookup_metrics(STANDARD_METRICS)}\n"
+                f"Baseline statistical projections:\n{baseline_forecasts(STANDARD_METRICS)}"
+            )
+            financial_context = f"Source: {source_files} (structured metrics)\nContent:\n{metrics_summary}\n-------\n{financial_context}"
+        return financial_context, transcript_context
+
+    def build_fast_path_prompt(self, query, financial_context, transcript_context):
+        return self.forecasting_prompts.fast_path_prompt.format(
+            query=query,
+            company=self.company_label(),
+            financial_context=financial_context,
+            transcript_context=transcript_context,
+            output_format=self.forecasting_prompts.output_format,
+            current_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        )
+
+    @staticmethod
+    def partial_events(completed):
+        """A "partial" event for every forecast field the streamed answer just completed."""
+        for path, value in completed:
+            if is_forecast_field(path):
+                yield {"event": "partial", "data": {"field": ".".join(path), "value": value}}
+
+    async def complete_forecast(self, forecast_response, text, session_id=None, telemetry=None):
+        """
+        Repair an answer with no forecast in it (nothing parsed, or no field of the forecast
+        section) with one rewrite call. Valid answers that only omit some optional fields are
+        returned as they are, and the original is kept when the rewrite has no forecast either.
+        """
+        if self.has_outlook(forecast_response):
+            return forecast_response
+        repaired = await self.repair_json_output(text, session_id, telemetry)
+        if repaired and (not forecast_response or self.has_outlook(repaired)):
+            return repaired
+        return forecast_response
+
+    @staticmethod
+    def has_outlook(forecast_response):
+        return bool(forecast_response) and ForecastOutput.model_validate(forecast_response).has_outlook()
+
+    async def repair_json_output(self, text, session_id=None, telemetry=None):
+        """Ask the model once to rewrite an answer that did not parse as a forecast."""
+        print(f"WARNING: {session_id or 'N/A'}: Fast path output had no forecast, repairing")
+        repair_prompt = self.forecasting_prompts.json_repair_prompt.format(
+            output_format=self.forecasting_prompts.output_format,
+            response=text
+        )
+        response = await self.forecasting_llm.ainvoke(
+            [HumanMessage(content=repair_prompt)], config={"callbacks": [telemetry] if telemetry else []}
+        )
+        return await self.extract_json_from_text(response.content)
+
+    async def build_agent_executor(self, query, stream_runnable=False):
+        forecasting_prompt = await self.build_forecasting_prompt(query)
+
+        agent = create_tool_calling_agent(
+            self.forecasting_llm, self.tools, forecasting_prompt
+        )
+        return AgentExecutor(
+            agent=agent,
+            tools=self.tools,
+            verbose=True,
+            stream_runnable=stream_runnable,
+            max_iterations=25,
+            return_intermediate_steps=True
+        )
+
+    async def forecasting_call(self, query, session_id=None, mode=None, ticker=None):
+        # Scopes every retrieval and tool call of this request to the company, with its own context token accounting
+        set_ticker(ticker)
+        start_request_accounting()
+        mode = mode or config.forecast_mode
+        if mode == "agentic":
+            return await self.agentic_forecasting_call(query, session_id)
+        return await self.fast_forecasting_call(query, session_id)
+
+    async def fast_forecasting_call(self, query, session_id=None):
+        """
+        Answer from prefetched contexts in a single LLM call, with one repair call only
+        when no forecast can be parsed from the answer.
+        """
         try:
-            forecasting_prompt = await self.build_forecasting_prompt(query)
+            financial_context, transcript_context = await self.prefetch_contexts(query)
+            prompt = self.build_fast_path_prompt(query, financial_context, transcript_context)
 
-            agent = create_tool_calling_agent(
-                self.forecasting_llm, self.tools, forecasting_prompt
+            telemetry = self.telemetry_handler(session_id)
+            response = await self.forecasting_llm.ainvoke(
+                [HumanMessage(content=prompt)], config={"callbacks": [telemetry]}
             )
-            agent_executor = AgentExecutor(
-                agent=agent,
-                tools=self.tools,
-                verbose=True,
-                stream_runnable=False,
-                max_iterations=25,
-                return_intermediate_steps=True
+            forecast_response = await self.extract_json_from_text(response.content)
+            forecast_response = await self.complete_forecast(forecast_response, response.content, session_id, telemetry)
+
+            self.log_token_usage(telemetry)
+
+            return self.build_forecast_result(forecast_response, session_id)
+
+        except Exception as e:
+            print(
+                f"ERROR: {session_id or 'N/A'}: There was an error while forecasting: {e}"
             )
+            return {
+                'status_code': 500,
+                'status_messages': f'There was an error while forecasting: {e}'
+            }
 
-            with get_openai_callback() as cb:
-                forecast_resp = await agent_executor.ainvoke({
-                    "input": query
-                })
-                usage_info = {
-                    'model': self.forecasting_model,
-                    'usage': {
-                        'prompt_tokens': cb.prompt_tokens,
-                        'prompt_tokens_details_cached_tokens': cb.prompt_tokens_cached,
-                        'completion_tokens': cb.completion_tokens,
-                        'total_tokens': cb.total_tokens,
-                    }
-                }
-                print(f"Token usage: {usage_info}")
+    async def agentic_forecasting_call(self, query, session_id=None):
+        try:
+            agent_executor = await self.build_agent_executor(query)
+
+            telemetry = self.telemetry_handler(session_id)
+            forecast_resp = await agent_executor.ainvoke(
+                {"input": query}, config={"callbacks": [telemetry]}
+            )
+            self.log_token_usage(telemetry)
 
             forecast_response = await self.extract_json_from_text(forecast_resp['output'])
 
-            if forecast_response:
-                print(f"{session_id or 'N/A'}: Successfully generated forecast")
-                return {
-                    'status_code': 200,
-                    'forecast_data': forecast_response
-                }
-            else:
-                print(
-                    f"WARNING: {session_id or 'N/A'}: Failed to extract forecast response from agent output"
-                )
-                return {
-                    'status_code': 500,
-                    'status_messages': 'Failed to extract forecast response from agent output'
-                }
+            return self.build_forecast_result(forecast_response, session_id)
 
         except Exception as e:
             print(
@@ -176,3 +351,97 @@ class ForecastingAgent:
                 'status_code': 500,
                 'status_messages': f'There was an error while forecasting: {e}'
             }
+
+    async def stream_forecast(self, query, session_id=None, mode=None, ticker=None):
+        """
+        Async generator of forecast events ({"event": ..., "data": ...}): retrieved sources,
+        tool invocations, token deltas and a terminal "result" event with the same payload
+        forecasting_call returns. Closing the generator cancels the in-flight LLM call.
+        """
+        set_ticker(ticker)
+        start_request_accounting()
+        mode = mode or config.forecast_mode
+        try:
+            if mode == "agentic":
+                events = self.stream_agentic_forecast(query, session_id)
+            else:
+                events = self.stream_fast_forecast(query, session_id)
+            async with aclosing(events):
+                async for event in events:
+                    yield event
+
+        except Exception as e:
+            print(
+                f"ERROR: {session_id or 'N/A'}: There was an error while forecasting: {e}"
+            )
+            yield {"event": "result", "data": {
+                'status_code': 500,
+                'status_messages': f'There was an error while forecasting: {e}'
+            }}
+
+    async def stream_fast_forecast(self, query, session_id=None):
+        financial_context, transcript_context = await self.prefetch_contexts(query)
+        yield {"event": "sources", "data": {
+            "quarterly_reports": context_sources(financial_context),
+            "transcriptions": context_sources(transcript_context)
+        }}
+
+        prompt = self.build_fast_path_prompt(query, financial_context, transcript_context)
+        output = []
+        parser = forecast_parser()
+        telemetry = self.telemetry_handler(session_id)
+        async for chunk in self.forecasting_llm.astream(
+            [HumanMessage(content=prompt)], config={"callbacks": [telemetry]}
+        ):
+            if chunk.content:
+                output.append(chunk.content)
+                yield {"event": "token", "data": {"text": chunk.content}}
+                for event in self.partial_events(parser.feed(chunk.content)):
+                    yield event
+
+        forecast = validate_forecast(parser.value())
+        forecast_response = forecast.model_dump(exclude_none=True) if forecast is not None else None
+        forecast_response = await self.complete_forecast(forecast_response, ''.join(output), session_id, telemetry)
+
+        self.log_token_usage(telemetry)
+
+        yield {"event": "result", "data": self.build_forecast_result(forecast_response, session_id)}
+
+    async def stream_agentic_forecast(self, query, session_id=None):
+        agent_executor = await self.build_agent_executor(query, stream_runnable=True)
+        output = None
+
+        parser = forecast_parser()
+        telemetry = self.telemetry_handler(session_id)
+        async for event in agent_executor.astream_events(
+            {"input": query}, config={"callbacks": [telemetry]}, version="v2"
+        ):
+            kind = event["event"]
+            if kind == "on_chat_model_start":
+                # Only the last turn's answer is the forecast
+                parser = forecast_parser()
+            elif kind == "on_chat_model_stream":
+                content = event["data"]["chunk"].content
+                if content:
+                    yield {"event": "token", "data": {"text": content}}
+                    for partial_event in self.partial_events(parser.feed(content)):
+                        yield partial_event
+            elif kind == "on_tool_start":
+                yield {"event": "tool_start", "data": {
+                    "tool": event["name"],
+                    "input": event["data"].get("input")
+                }}
+            elif kind == "on_tool_end":
+                tool_output = event["data"].get("output")
+                tool_output = getattr(tool_output, "content", tool_output)
+                yield {"event": "tool_end", "data": {
+                    "tool": event["name"],
+                    "sources": context_sources(str(tool_output))
+                }}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                output = (event["data"].get("output") or {}).get("output")
+
+        self.log_token_usage(telemetry)
+
+        forecast_response = await self.extract_json_from_text(output)
+        yield {"event": "result", "data": self.build_forecast_result(forecast_response, session_id)}
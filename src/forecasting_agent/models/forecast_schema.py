@@ -0,0 +1,130 @@
+"""
+Pydantic model of the forecast JSON the agent is asked for (ForecastingPrompts.output_format).
+
+Every field is optional so partial and truncated answers still validate; missing_fields
+tells which ones the answer lacks. Numbers are accepted where text is expected, and
+fields the model put at the top level instead of in their section are moved back.
+"""
+from typing import Annotated, Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, ValidationError, model_validator
+
+from src.utils.json_stream import IncrementalJSONParser, parse_partial_json
+
+
+def scalar_to_text(value: Any) -> Any:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+FieldText = Annotated[Optional[Union[str, List[Any], Dict[str, Any]]], BeforeValidator(scalar_to_text)]
+
+
+class ForecastSection(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    def missing_fields(self) -> List[str]:
+        return [name for name in type(self).model_fields if getattr(self, name) in (None, "", [], {})]
+
+
+class FinancialMetrics(ForecastSection):
+    sales: FieldText = None
+    net_profit: FieldText = None
+    operating_profit: FieldText = None
+
+
+class QualitativeAnalysis(ForecastSection):
+    management_sentiment: FieldText = None
+    recurring_themes: FieldText = None
+    forward_looking_statements: FieldText = None
+
+
+class ForecastOutlook(ForecastSection):
+    revenue_outlook: FieldText = None
+    profitability_outlook: FieldText = None
+    key_growth_drivers: FieldText = None
+    risks: FieldText = None
+    opportunities: FieldText = None
+
+
+class ForecastOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    financial_metrics_extracted: Optional[FinancialMetrics] = None
+    qualitative_analysis: Optional[QualitativeAnalysis] = None
+    forecast: Optional[ForecastOutlook] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def nest_flat_fields(cls, data: Any) -> Any:
+        if not isinstance(data, dict):
+            return data
+        data = dict(data)
+        for section, section_model in SECTIONS.items():
+            if data.get(section) is not None and not isinstance(data[section], dict):
+                # A section that is not an object cannot be used, keep it out of validation
+                data.pop(section)
+            for name in section_model.model_fields:
+                if name in data and name not in SECTIONS:
+                    data.setdefault(section, {})
+                    if isinstance(data[section], dict):
+                        data[section] = {**data[section], name: data.pop(name)}
+        return data
+
+    def missing_fields(self) -> List[str]:
+        missing = []
+        for section, section_model in SECTIONS.items():
+            value = getattr(self, section)
+            names = section_model.model_fields if value is None else value.missing_fields()
+            missing.extend(f"{section}.{name}" for name in names)
+        return missing
+
+    def has_outlook(self) -> bool:
+        """Whether the answer has the forecast itself: at least one field of the forecast section."""
+        return self.forecast is not None and len(self.forecast.missing_fields()) < len(ForecastOutlook.model_fields)
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, section) is None for section in SECTIONS)
+
+
+SECTIONS = {
+    "financial_metrics_extracted": FinancialMetrics,
+    "qualitative_analysis": QualitativeAnalysis,
+    "forecast": ForecastOutlook,
+}
+
+
+FIELD_NAMES = {name for section_model in SECTIONS.values() for name in section_model.model_fields}
+
+
+def has_forecast_fields(value: Any) -> bool:
+    """Whether a parsed document has any forecast section or field, in place or at the top level."""
+    return isinstance(value, dict) and any(key in SECTIONS or key in FIELD_NAMES for key in value)
+
+
+def validate_forecast(value: Any) -> Optional[ForecastOutput]:
+    """The forecast in a parsed answer, None when it has none of the forecast's fields."""
+    if not isinstance(value, dict):
+        return None
+    try:
+        forecast = ForecastOutput.model_validate(value)
+    except ValidationError as e:
+        print(f"WARNING: Forecast output did not match the schema: {e}")
+        return None
+    return None if forecast.is_empty() else forecast
+
+
+def parse_forecast(text: str) -> Optional[ForecastOutput]:
+    """Parse a complete, fenced, malformed or truncated forecast answer."""
+    return validate_forecast(parse_partial_json(text, roots="{", accept=has_forecast_fields))
+
+
+def forecast_parser() -> IncrementalJSONParser:
+    """Parser for a streamed forecast answer."""
+    return IncrementalJSONParser(roots="{", accept=has_forecast_fields)
+
+
+def is_forecast_field(path) -> bool:
+    """Whether a completed (path, value) of the parser is one of the forecast's fields."""
+    return len(path) == 2 and path[0] in SECTIONS
@@ -0,0 +1,266 @@
+"""
+Baseline time-series models fitted over the metrics store: seasonal naive, simple
+exponential smoothing and linear trend, each with normal prediction intervals.
+
+Every model works on a (n_series, n_periods) matrix, so all metrics (and companies)
+sharing a history length are fitted together in one vectorized pass; the only Python
+loop is over time steps in the smoothing recursion. The model reported for a series is
+the one with the lowest error when refitted without its last periods (backtest).
+
+The models assume one value per period, so each series is first laid out on the full
+quarterly (or annual) calendar between its first and last period end; periods missing
+from the sheet are filled by linear interpolation and counted in interpolated_periods.
+"""
+import threading
+from datetime import datetime
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import config
+from src.data_layer.metrics_store import MetricsStore, fiscal_label, month_number, normalize_metric
+
+MODELS = ("seasonal_naive", "exponential_smoothing", "linear_trend")
+SEASON_LENGTHS = {"quarter": 4, "annual": 1}
+PERIOD_MONTHS = {"quarter": 3, "annual": 12}
+SMOOTHING_ALPHAS = np.linspace(0.05, 0.95, 19)
+# Shortest history a series is forecast from, and the shortest left to fit on when backtesting
+MIN_HISTORY = 3
+
+
+def seasonal_naive(Y: np.ndarray, horizon: int, season_length: int):
+    """Repeat the last observed season; the spread is that of the season-on-season changes."""
+    n_periods = Y.shape[1]
+    season_length = season_length if n_periods > season_length else 1
+    steps = np.arange(horizon)
+    mean = Y[:, n_periods - season_length + steps % season_length]
+    residuals = Y[:, season_length:] - Y[:, :-season_length]
+    sigma = np.sqrt(np.mean(residuals ** 2, axis=1))
+    return mean, sigma[:, None] * np.sqrt(steps // season_length + 1)[None, :]
+
+
+def exponential_smoothing(Y: np.ndarray, horizon: int, season_length: int = None):
+    """
+    Simple exponential smoothing. The recursion runs for every candidate alpha and every
+    series at once, and each series keeps the alpha with the lowest one-step error.
+    """
+    n_series, n_periods = Y.shape
+    alphas = SMOOTHING_ALPHAS[:, None]
+    level = np.repeat(Y[None, :, 0], len(SMOOTHING_ALPHAS), axis=0)
+    sse = np.zeros_like(level)
+    for t in range(1, n_periods):
+        error = Y[None, :, t] - level
+        sse += error ** 2
+        level = level + alphas * error
+
+    best = np.argmin(sse, axis=0)
+    columns = np.arange(n_series)
+    alpha = SMOOTHING_ALPHAS[best]
+    sigma = np.sqrt(sse[best, columns] / max(n_periods - 1, 1))
+    mean = np.repeat(level[best, columns][:, None], horizon, axis=1)
+    scale = np.sqrt(1 + np.arange(horizon)[None, :] * alpha[:, None] ** 2)
+    return mean, sigma[:, None] * scale
+
+
+def linear_trend(Y: np.ndarray, horizon: int, season_length: int = None):
+    """Least-squares line through each series, closed form over the whole matrix."""
+    n_periods = Y.shape[1]
+    t = np.arange(n_periods, dtype=float)
+    t_mean = t.mean()
+    sxx = ((t - t_mean) ** 2).sum()
+    y_mean = Y.mean(axis=1)
+    slope = (Y - y_mean[:, None]) @ (t - t_mean) / sxx
+    intercept = y_mean - slope * t_mean
+
+    fitted = intercept[:, None] + slope[:, None] * t[None, :]
+    sigma = np.sqrt(((Y - fitted) ** 2).sum(axis=1) / max(n_periods - 2, 1))
+    future = np.arange(n_periods, n_periods + horizon, dtype=float)
+    mean = intercept[:, None] + slope[:, None] * future[None, :]
+    scale = np.sqrt(1 + 1 / n_periods + (future - t_mean) ** 2 / sxx)
+    return mean, sigma[:, None] * scale[None, :]
+
+
+MODEL_FUNCTIONS = {
+    "seasonal_naive": seasonal_naive,
+    "exponential_smoothing": exponential_smoothing,
+    "linear_trend": linear_trend,
+}
+
+
+def fit_models(Y: np.ndarray, horizon: int, season_length: int) -> Dict[str, tuple]:
+    return {name: MODEL_FUNCTIONS[name](Y, horizon, season_length) for name in MODELS}
+
+
+def forecast_matrix(Y: np.ndarray, horizon: int, season_length: int, interval: float) -> Dict:
+    """
+    Fit every model over Y (n_series, n_periods) and backtest them on the last periods.
+    Returns per model the (n_series, horizon) mean, lower and upper bounds and the
+    backtest MAE, plus the index of the selected model per series.
+    """
+    z = NormalDist().inv_cdf(0.5 + interval / 2)
+    fits = fit_models(Y, horizon, season_length)
+
+    holdout = min(horizon, Y.shape[1] - MIN_HISTORY)
+    if holdout >= 1:
+        backtests = fit_models(Y[:, :-holdout], holdout, season_length)
+        errors = np.stack([
+            np.mean(np.abs(backtests[name][0] - Y[:, -holdout:]), axis=1) for name in MODELS
+        ])
+    else:
+        errors = np.full((len(MODELS), Y.shape[0]), np.nan)
+
+    results = {
+        name: {"mean": mean, "lower": mean - z * sd, "upper": mean + z * sd, "backtest_mae": errors[i]}
+        for i, (name, (mean, sd)) in enumerate(fits.items())
+    }
+    # Without a backtest, fall back to exponential smoothing
+    selected = np.where(
+        np.isnan(errors).all(axis=0),
+        MODELS.index("exponential_smoothing"),
+        np.argmin(np.nan_to_num(errors, nan=np.inf), axis=0)
+    )
+    return {"models": results, "selected": selected}
+
+
+def calendar_values(rows: List[Dict], period_type: str) -> Tuple[np.ndarray, int]:
+    """
+    Values of a series at every period end from its first to its last, missing periods
+    linearly interpolated, and the number of periods that were missing.
+    """
+    months = np.array([month_number(datetime.fromisoformat(row["period_end"])) for row in rows])
+    values = np.array([row["value"] for row in rows], dtype=float)
+    calendar = np.arange(months[0], months[-1] + 1, PERIOD_MONTHS[period_type])
+    if len(calendar) == len(months) and (calendar == months).all():
+        return values, 0
+    return np.interp(calendar, months, values), len(calendar) - len(np.intersect1d(calendar, months))
+
+
+def future_period_ends(last_period_end: str, horizon: int, period_type: str) -> List[pd.Timestamp]:
+    months = PERIOD_MONTHS[period_type]
+    last = pd.Timestamp(last_period_end)
+    return [last + pd.DateOffset(months=months * step) + pd.offsets.MonthEnd(0) for step in range(1, horizon + 1)]
+
+
+class QuantForecaster:
+    """
+    Baseline forecasts for every series of the metrics store, recomputed only when the
+    store changes. Series are batched by calendar length, one vectorized fit per batch.
+    """
+
+    def __init__(self, metrics_store: MetricsStore, horizon: int = None, interval: float = None):
+        self.metrics_store = metrics_store
+        self.horizon = horizon or config.quant_forecast_horizon
+        self.interval = interval or config.quant_forecast_interval
+        self.lock = threading.Lock()
+        self.cache: Dict = {}
+
+    def forecasts(self, period_type: str = "quarter") -> Dict[Tuple[str, str], Dict]:
+        key = (self.metrics_store.version, period_type)
+        with self.lock:
+            cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        forecasts = self.fit(period_type)
+        with self.lock:
+            self.cache = {k: v for k, v in self.cache.items() if k[0] == key[0]}
+            self.cache[key] = forecasts
+        return forecasts
+
+    def fit(self, period_type: str) -> Dict[Tuple[str, str], Dict]:
+        """Forecasts keyed by (ticker, metric), every company's series in the same batches."""
+        series_by_length: Dict[int, List] = {}
+        for (ticker, metric, series_period_type), rows in self.metrics_store.series.items():
+            if series_period_type == period_type and len(rows) >= MIN_HISTORY:
+                values, interpolated = calendar_values(rows, period_type)
+                series_by_length.setdefault(len(values), []).append(((ticker, metric), rows, values, interpolated))
+
+        forecasts = {}
+        for length, batch in series_by_length.items():
+            Y = np.array([values for _, _, values, _ in batch], dtype=float)
+            fitted = forecast_matrix(Y, self.horizon, SEASON_LENGTHS[period_type], self.interval)
+
+            for i, ((ticker, metric), rows, _, interpolated) in enumerate(batch):
+                last = rows[-1]
+                period_ends = future_period_ends(last["period_end"], self.horizon, period_type)
+                models = {}
+                for name, result in fitted["models"].items():
+                    mae = result["backtest_mae"][i]
+                    models[name] = {
+                        "backtest_mae": None if np.isnan(mae) else round(float(mae), 2),
+                        "forecast": [
+                            {
+                                "period": fiscal_label(period_end, period_type),
+                                "period_end": period_end.date().isoformat(),
+                                "value": round(float(result["mean"][i, step]), 2),
+                                "lower": round(float(result["lower"][i, step]), 2),
+                                "upper": round(float(result["upper"][i, step]), 2),
+                            }
+                            for step, period_end in enumerate(period_ends)
+                        ],
+                    }
+                forecasts[(ticker, metric)] = {
+                    "ticker": ticker,
+                    "metric": metric,
+                    "label": last["label"],
+                    "company": last.get("company"),
+                    "unit": last["unit"],
+                    "last_period": last["period"],
+                    "last_value": last["value"],
+                    "history_periods": length,
+                    "interpolated_periods": interpolated,
+                    "interval": self.interval,
+                    "selected_model": MODELS[int(fitted["selected"][i])],
+                    "models": models,
+                }
+        return forecasts
+
+    def forecast(self, ticker: str, metric: str, period_type: str = "quarter") -> Optional[Dict]:
+        return self.forecasts(period_type).get((ticker, normalize_metric(metric)))
+
+    def company_metrics(self, ticker: str, period_type: str = "quarter") -> List[str]:
+        return sorted(metric for forecast_ticker, metric in self.forecasts(period_type) if forecast_ticker == ticker)
+
+    def summary(self, ticker: str, metrics: List[str], period_type: str = "quarter") -> Dict[str, Dict]:
+        """Selected model projections only, the compact form returned with every forecast response."""
+        summary = {}
+        for metric in metrics:
+            forecast = self.forecast(ticker, metric, period_type)
+            if forecast is None:
+                continue
+            selected = forecast["selected_model"]
+            summary[forecast["metric"]] = {
+                "unit": forecast["unit"],
+                "last_period": forecast["last_period"],
+                "last_value": forecast["last_value"],
+                "model": selected,
+                "interval": forecast["interval"],
+                "forecast": forecast["models"][selected]["forecast"],
+            }
+        return summary
+
+
+def format_forecast(forecast: Dict, all_models: bool = False) -> str:
+    """
+    One line per series (or per model with all_models), e.g.
+    'Sales (INR Cr, last Q2 FY26: 65,799) exponential_smoothing, 80% interval: Q3 FY26 65,683 [64,143, 67,224], ...'
+    """
+    unit = forecast["unit"]
+    number = "{:,.2f}" if unit == "%" else "{:,.0f}"
+    header = f"{forecast['label']} ({unit}, last {forecast['last_period']}: {number.format(forecast['last_value'])})"
+    names = MODELS if all_models else (forecast["selected_model"],)
+
+    lines = []
+    for name in names:
+        model = forecast["models"][name]
+        points = ", ".join(
+            f"{point['period']} {number.format(point['value'])} "
+            f"[{number.format(point['lower'])}, {number.format(point['upper'])}]"
+            for point in model["forecast"]
+        )
+        selected = " (selected)" if all_models and name == forecast["selected_model"] else ""
+        mae = f", backtest MAE {number.format(model['backtest_mae'])}" if model["backtest_mae"] is not None else ""
+        lines.append(f"{header} {name}{selected}{mae}, {forecast['interval']:.0%} interval: {points}")
+    return "\n".join(lines)
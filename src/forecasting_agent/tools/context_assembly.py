@@ -0,0 +1,273 @@
+"""
+Context assembly for the retrieval tools and the fast path: picks a diverse set of
+chunks by maximal marginal relevance over their vectors, merges chunks that are
+adjacent in the same source file (dropping the text the splitter repeats between
+them) and packs the result into a token budget.
+
+Every assembly is accounted to the current request: the tokens the raw top-k chunks
+would have cost against the tokens actually returned.
+"""
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import tiktoken
+
+from config import config
+from src.data_layer.embedders import HashingEmbedder, normalize_rows
+from src.utils.telemetry import CONTEXT_TOKENS, span
+
+CONTEXT_SEPARATOR = '\n-------\n'
+# Shortest run of text two chunks must share to be merged, and the longest the splitter repeats
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+# A truncated piece shorter than this is dropped rather than packed
+MIN_PIECE_TOKENS = 64
+# Fallback embeddings kept, the same chunks come back request after request
+FALLBACK_CACHE_SIZE = 4096
+
+_encoding = None
+_fallback_embedder = HashingEmbedder()
+_fallback_cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+_fallback_lock = threading.Lock()
+
+# Token accounting and returned chunk ids of the current request
+context_stats_var: ContextVar[Optional[Dict]] = ContextVar("context_stats", default=None)
+
+
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.encoding_for_model(config.chunking_model)
+    return _encoding
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    if not texts:
+        return []
+    encoded = get_encoding().encode_batch(texts, num_threads=config.tokenizer_threads)
+    return [len(tokens) for tokens in encoded]
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    tokens = get_encoding().encode(text)
+    return text if len(tokens) <= max_tokens else get_encoding().decode(tokens[:max_tokens])
+
+
+def start_request_accounting() -> Dict:
+    """Start token accounting for the current request, every later assembly in this context adds to it."""
+    stats = {"retrieved_tokens": 0, "packed_tokens": 0, "saved_tokens": 0, "returned_ids": set()}
+    context_stats_var.set(stats)
+    return stats
+
+
+def request_accounting() -> Dict:
+    stats = context_stats_var.get()
+    if stats is None:
+        return {"retrieved_tokens": 0, "packed_tokens": 0, "saved_tokens": 0}
+    return {key: value for key, value in stats.items() if key != "returned_ids"}
+
+
+def returned_ids() -> Set[str]:
+    """Chunk ids already returned to the model during the current request."""
+    stats = context_stats_var.get()
+    return stats["returned_ids"] if stats is not None else set()
+
+
+def format_context(source_file: str, text: str) -> str:
+    return f"Source: {source_file}\nContent: {text}"
+
+
+def match_text(match: Dict) -> str:
+    metadata = match.get("metadata", {})
+    return metadata.get("chunk_text") or metadata.get("text") or "[Content embedded in vector]"
+
+
+def match_vectors(matches: List[Dict]) -> np.ndarray:
+    """
+    Unit vectors of the matches. Lexical-only hybrid matches come without a stored
+    vector, in which case every match is embedded with the hashing embedder instead so
+    all similarities are measured in the same space.
+    """
+    values = [match.get("values") for match in matches]
+    if all(values) and len({len(vector) for vector in values}) == 1:
+        return normalize_rows(np.asarray(values, dtype=np.float32))
+    return fallback_vectors([match_text(match) for match in matches])
+
+
+def fallback_vectors(texts: List[str]) -> np.ndarray:
+    keys = [hash(text) for text in texts]
+    with _fallback_lock:
+        cached = {key: _fallback_cache[key] for key in keys if key in _fallback_cache}
+        for key in cached:
+            _fallback_cache.move_to_end(key)
+
+    missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+    if missing:
+        embedded = dict(zip(missing, _fallback_embedder.embed_documents(list(missing.values()))))
+        cached.update(embedded)
+        with _fallback_lock:
+            _fallback_cache.update(embedded)
+            while len(_fallback_cache) > FALLBACK_CACHE_SIZE:
+                _fallback_cache.popitem(last=False)
+    return np.stack([cached[key] for key in keys])
+
+
+def mmr_select(matches: List[Dict], k: int, lambda_mult: float = None) -> List[Dict]:
+    """
+    Order up to k matches by maximal marginal relevance: each pick maximises
+    lambda * relevance - (1 - lambda) * max similarity to the picks before it.
+    """
+    if len(matches) <= 1 or k <= 1:
+        return matches[:k]
+    lambda_mult = config.context_mmr_lambda if lambda_mult is None else lambda_mult
+
+    vectors = match_vectors(matches)
+    similarity = vectors @ vectors.T
+    relevance = np.array([match.get("score", 0.0) for match in matches], dtype=np.float32)
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(len(matches), dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(k, len(matches)):
+        mmr = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        mmr[~available] = -np.inf
+        pick = int(np.argmax(mmr))
+        selected.append(pick)
+        available[pick] = False
+        max_similarity = np.maximum(max_similarity, similarity[pick])
+    return [matches[i] for i in selected]
+
+
+def merge_overlap(first: str, second: str) -> Optional[str]:
+    """
+    first followed by second without the text they share, or None when second does not
+    start with the end of first. The splitter repeats up to its chunk overlap between
+    neighbouring chunks, so only the tail of first is searched.
+    """
+    head = second[:MIN_OVERLAP_CHARS]
+    if len(head) < MIN_OVERLAP_CHARS:
+        return None
+    search_from = max(0, len(first) - MAX_OVERLAP_CHARS)
+    position = first.find(head, search_from)
+    while position != -1:
+        overlap = len(first) - position
+        if second.startswith(first[position:]):
+            return first + second[overlap:]
+        position = first.find(head, position + 1)
+    return None
+
+
+def merge_adjacent(matches: List[Dict]) -> List[Dict]:
+    """
+    Merge matches that are consecutive chunks of the same source file into one piece.
+    Pieces keep the rank of their best match, the returned list is in rank order.
+    """
+    pieces = []
+    by_source: Dict[str, List] = {}
+    for rank, match in enumerate(matches):
+        metadata = match.get("metadata", {})
+        piece = {
+            "rank": rank,
+            "ids": [match.get("id")],
+            "source_file": metadata.get("source_file", "Unknown"),
+            "chunk_index": metadata.get("chunk_index"),
+            "text": match_text(match),
+        }
+        if isinstance(piece["chunk_index"], (int, float)):
+            by_source.setdefault(piece["source_file"], []).append(piece)
+        else:
+            pieces.append(piece)
+
+    for source_pieces in by_source.values():
+        source_pieces.sort(key=lambda piece: piece["chunk_index"])
+        current = source_pieces[0]
+        for piece in source_pieces[1:]:
+            if piece["chunk_index"] == current["chunk_index"] + 1:
+                merged = merge_overlap(current["text"], piece["text"])
+                current["text"] = merged if merged is not None else f"{current['text']}\n{piece['text']}"
+                current["ids"].extend(piece["ids"])
+                current["rank"] = min(current["rank"], piece["rank"])
+                current["chunk_index"] = piece["chunk_index"]
+            else:
+                pieces.append(current)
+                current = piece
+        pieces.append(current)
+
+    return sorted(pieces, key=lambda piece: piece["rank"])
+
+
+def pack(pieces: List[Dict], token_budget: int) -> List[str]:
+    """Formatted pieces in rank order until the budget is spent, the last one truncated to fit."""
+    contexts = [format_context(piece["source_file"], piece["text"]) for piece in pieces]
+    separator_tokens = count_tokens([CONTEXT_SEPARATOR])[0]
+    packed = []
+    remaining = token_budget
+    for context, tokens in zip(contexts, count_tokens(contexts)):
+        cost = tokens + (separator_tokens if packed else 0)
+        if cost <= remaining:
+            packed.append(context)
+            remaining -= cost
+            continue
+        room = remaining - (separator_tokens if packed else 0)
+        if room >= MIN_PIECE_TOKENS:
+            packed.append(truncate_tokens(context, room))
+        break
+    return packed
+
+
+def pool_matches(matches_per_query: Iterable[List[Dict]]) -> List[Dict]:
+    """Matches of several queries as one ranked list, each chunk once with its best score."""
+    pooled: Dict[str, Dict] = {}
+    for matches in matches_per_query:
+        for match in matches:
+            current = pooled.get(match.get("id"))
+            if current is None or match.get("score", 0) > current.get("score", 0):
+                pooled[match.get("id")] = match
+    return sorted(pooled.values(), key=lambda match: match.get("score", 0), reverse=True)
+
+
+def assemble_contexts(matches: List[Dict], k: int, token_budget: int = None, stage: str = "tool",
+                      exclude_ids: Optional[Set[str]] = None) -> List[str]:
+    """
+    Context strings for the model from ranked matches: up to k diverse matches, adjacent
+    chunks merged, packed to token_budget (CONTEXT_TOKEN_BUDGET by default). Matches in
+    exclude_ids, and ones already returned earlier in the request, are skipped; the ids
+    returned are added to exclude_ids.
+    """
+    token_budget = token_budget or config.context_token_budget
+    stats = context_stats_var.get()
+    skip = (exclude_ids or set()) | returned_ids()
+    candidates = [match for match in matches if match.get("id") not in skip]
+    if not candidates:
+        return []
+
+    with span("context_assembly", stage, candidates=len(candidates), token_budget=token_budget) as attributes:
+        selected = mmr_select(candidates, k)
+        pieces = merge_adjacent(selected)
+        contexts = pack(pieces, token_budget)
+
+        # Baseline is what the tool returned before: the top k raw chunks, overlap and all
+        baseline = [format_context(match.get("metadata", {}).get("source_file", "Unknown"), match_text(match))
+                    for match in matches[:k]]
+        retrieved_tokens = sum(count_tokens(baseline)) + count_tokens([CONTEXT_SEPARATOR])[0] * max(len(baseline) - 1, 0)
+        packed_tokens = sum(count_tokens(contexts)) + count_tokens([CONTEXT_SEPARATOR])[0] * max(len(contexts) - 1, 0)
+        attributes.update(
+            selected=len(selected), pieces=len(pieces), packed=len(contexts),
+            retrieved_tokens=retrieved_tokens, packed_tokens=packed_tokens
+        )
+
+    packed_ids = [chunk_id for piece in pieces[:len(contexts)] for chunk_id in piece["ids"]]
+    if exclude_ids is not None:
+        exclude_ids.update(packed_ids)
+    CONTEXT_TOKENS.inc(retrieved_tokens, kind="retrieved")
+    CONTEXT_TOKENS.inc(packed_tokens, kind="packed")
+    if stats is not None:
+        stats["retrieved_tokens"] += retrieved_tokens
+        stats["packed_tokens"] += packed_tokens
+        stats["saved_tokens"] = max(stats["retrieved_tokens"] - stats["packed_tokens"], 0)
+        stats["returned_ids"].update(packed_ids)
+    return contexts
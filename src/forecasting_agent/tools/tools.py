@@ -1,7 +1,64 @@
+import asyncio
+import re
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
 from langchain.tools import tool
 
-from src.data_layer.vectordb_operations import VectorDBOperations
-vector_db = VectorDBOperations()
+from config import config
+from src.data_layer.companies import normalize_ticker
+from src.data_layer.metrics_store import MetricsStore, format_lookup
+from src.data_layer.vectordb_operations import VectorDBOperations, namespace_for
+from src.forecasting_agent.models.time_series import QuantForecaster, format_forecast
+from src.forecasting_agent.tools.context_assembly import CONTEXT_SEPARATOR, assemble_contexts, pool_matches
+
+# Maximum number of chunks a retrieval tool returns to the agent
+MAX_CONTEXTS = 5
+ALREADY_RETURNED = "Every matching chunk was already returned earlier in this conversation."
+
+SOURCE_PATTERN = re.compile(r"^Source: (.+)$", re.MULTILINE)
+
+_vector_db = None
+_metrics_store = None
+_quant_forecaster = None
+
+# Company the current request is about, every tool call of the request is scoped to it
+ticker_var: ContextVar[Optional[str]] = ContextVar("ticker", default=None)
+
+def set_ticker(ticker: Optional[str]):
+    """Scope the tools to a company for the current context, returns the token to reset it with."""
+    return ticker_var.set(normalize_ticker(ticker))
+
+def get_ticker() -> str:
+    return ticker_var.get() or normalize_ticker()
+
+def set_vector_db(vector_db: VectorDBOperations):
+    """Share the application's VectorDBOperations instance with the tools."""
+    global _vector_db
+    _vector_db = vector_db
+
+def get_vector_db() -> VectorDBOperations:
+    global _vector_db
+    if _vector_db is None:
+        _vector_db = VectorDBOperations()
+    return _vector_db
+
+def set_metrics_store(metrics_store: MetricsStore):
+    """Share the application's MetricsStore instance with the tools."""
+    global _metrics_store
+    _metrics_store = metrics_store
+
+def get_metrics_store() -> MetricsStore:
+    global _metrics_store
+    if _metrics_store is None:
+        _metrics_store = MetricsStore()
+    return _metrics_store
+
+def get_quant_forecaster() -> QuantForecaster:
+    global _quant_forecaster
+    if _quant_forecaster is None or _quant_forecaster.metrics_store is not get_metrics_store():
+        _quant_forecaster = QuantForecaster(get_metrics_store())
+    return _quant_forecaster
 
 @tool(parse_docstring=True)
 async def think(thought: str):
@@ -27,8 +84,49 @@ async def analyze(analysis: str):
         print(f"Analysis: {analysis}")
     return "Analysis logged."
 
+def relevant_matches(results, doc_type: str) -> List[Dict]:
+    """Keep the relevant matches of doc_type, in rank order."""
+    matches = []
+    for result in results:
+        if isinstance(result, dict) and result.get('score', 0) > 0.1:
+            metadata = result.get('metadata', {})
+            if isinstance(metadata, dict) and metadata.get('type') == doc_type:
+                matches.append(result)
+    return matches
+
+def context_sources(text: str) -> List[str]:
+    """Source files cited in formatted retrieval output, in order of first appearance."""
+    return list(dict.fromkeys(SOURCE_PATTERN.findall(text or "")))
+
+async def retrieve_contexts(query: str, doc_type: str, k: int):
+    """Assembled contexts of the current company's best k chunks of a single document type, filtered server-side."""
+    k = min(k, MAX_CONTEXTS)
+    results = await get_vector_db().search_records(
+        query=query,
+        top_k=k * config.context_candidate_multiplier,
+        namespace=namespace_for(get_ticker(), doc_type),
+        metadata_filter={"type": {"$eq": doc_type}},
+        include_values=True
+    )
+    matches = relevant_matches(results, doc_type)
+    contexts = assemble_contexts(matches, k)
+    if matches and not contexts:
+        return [ALREADY_RETURNED]
+    return contexts
+
+async def retrieve_matches_batch(queries: List[str], doc_type: str, k: int) -> List[List[Dict]]:
+    """Per-query candidate matches (k per query, before assembly) against one document type of the current company."""
+    results_per_query = await get_vector_db().search_records_batch(
+        queries=queries,
+        top_k=min(k, MAX_CONTEXTS) * config.context_candidate_multiplier,
+        namespace=namespace_for(get_ticker(), doc_type),
+        metadata_filter={"type": {"$eq": doc_type}},
+        include_values=True
+    )
+    return [relevant_matches(results, doc_type) for results in results_per_query]
+
 @tool(parse_docstring=True)
-async def financial_data_extractor(query: str, k: int = 10):
+async def financial_data_extractor(query: str, k: int = 5):
     """
     A robust tool designed to understand quarterly financial reports and extract key financial metrics (e.g., Total Revenue, Net Profit, Operating Margin).
 
@@ -37,25 +135,9 @@ async def financial_data_extractor(query: str, k: int = 10):
         k: The number of results to be returned.
     """
     try:
-        results = await vector_db.search_records(
-            query=query,
-            top_k=k,
-            namespace=None
-        )
-
-        contexts = []
-        for result in results:
-            if isinstance(result, dict) and result.get('score', 0) > 0.1:
-                metadata = result.get('metadata', {})
-                if isinstance(metadata, dict) and metadata.get('type') == 'quarterly_reports':
-                    chunk_content = metadata.get('chunk_text') or metadata.get('text') or ''
-                    if not chunk_content:
-                        chunk_content = "[Content embedded in vector]"
-                    contexts.append(f"Source: {metadata.get('source_file', 'Unknown')}\nContent: {chunk_content}")
-                if len(contexts) >= 5:
-                    break
-
-        context = '\n-------\n'.join(contexts)
+        contexts = await retrieve_contexts(query, "quarterly_reports", k)
+
+        context = CONTEXT_SEPARATOR.join(contexts)
         return context if context else "No relevant quarterly financial data found."
 
     except Exception as e:
@@ -63,7 +145,7 @@ async def financial_data_extractor(query: str, k: int = 10):
         return "There was an error extracting financial data."
 
 @tool(parse_docstring=True)
-async def qualitative_analysis(query: str, k: int = 10):
+async def qualitative_analysis(query: str, k: int = 5):
     """
     A RAG-based tool that performs semantic search and analysis across 2-3 past earnings call transcripts to identify recurring themes, management sentiment, and forward-looking statements.
 
@@ -72,27 +154,126 @@ async def qualitative_analysis(query: str, k: int = 10):
         k: The number of results to be returned.
     """
     try:
-        results = await vector_db.search_records(
-            query=query,
-            top_k=k,
-            namespace=None
-        )
-
-        contexts = []
-        for result in results:
-            if isinstance(result, dict) and result.get('score', 0) > 0.1:
-                metadata = result.get('metadata', {})
-                if isinstance(metadata, dict) and metadata.get('type') == 'transcriptions':
-                    chunk_content = metadata.get('chunk_text') or metadata.get('text') or ''
-                    if not chunk_content:
-                        chunk_content = "[Content embedded in vector]"
-                    contexts.append(f"Source: {metadata.get('source_file', 'Unknown')}\nContent: {chunk_content}")
-                if len(contexts) >= 5:
-                    break
-
-        context = '\n-------\n'.join(contexts)
+        contexts = await retrieve_contexts(query, "transcriptions", k)
+
+        context = CONTEXT_SEPARATOR.join(contexts)
         return context if context else "No relevant transcript data found."
 
     except Exception as e:
         print(f"There was an error in the qualitative_analysis tool: {e}")
-        return "There was an error performing qualitative analysis."
\ No newline at end of file
+        return "There was an error performing qualitative analysis."
+
+
+@tool(parse_docstring=True)
+async def multi_query_retriever(queries: List[str], source: str = "all", k: int = 3):
+    """
+    Retrieve context for several queries in a single call, e.g. every metric and theme needed for a forecast at once. Results are grouped per query and chunks already returned for an earlier query are not repeated.
+
+    Args:
+        queries: List of search queries, one per piece of information needed.
+        source: Which documents to search: "quarterly_reports", "transcriptions" or "all".
+        k: The number of results to be returned per query and document type.
+    """
+    try:
+        if source == "all":
+            doc_types = ["quarterly_reports", "transcriptions"]
+        elif source in ("quarterly_reports", "transcriptions"):
+            doc_types = [source]
+        else:
+            return f"Unknown source '{source}', use quarterly_reports, transcriptions or all."
+
+        queries = [query for query in queries if query and query.strip()]
+        if not queries:
+            return "No queries provided."
+
+        # One embedding batch for all queries, the per-type searches below then hit the embedding cache
+        await get_vector_db().embed_queries(queries)
+        per_type_matches = await asyncio.gather(*[
+            retrieve_matches_batch(queries, doc_type, k) for doc_type in doc_types
+        ])
+
+        # The sections share one token budget, each assembled without the chunks of the sections before it
+        token_budget = max(config.context_token_budget // len(queries), 1)
+        seen_ids = set()
+        sections = []
+        for i, query in enumerate(queries):
+            matches = pool_matches(type_matches[i] for type_matches in per_type_matches)
+            contexts = assemble_contexts(matches, k * len(doc_types), token_budget, exclude_ids=seen_ids)
+            body = CONTEXT_SEPARATOR.join(contexts) if contexts else "No new relevant data found."
+            sections.append(f"### Query: {query}\n{body}")
+
+        return '\n\n'.join(sections)
+
+    except Exception as e:
+        print(f"There was an error in the multi_query_retriever tool: {e}")
+        return "There was an error retrieving data for the queries."
+
+
+def lookup_metrics(metrics: List[str], periods: Optional[List[str]] = None, period_type: str = "quarter") -> str:
+    """Formatted metrics store lookups for the current company, one line per metric and period."""
+    store = get_metrics_store()
+    ticker = get_ticker()
+    if not store.has_company(ticker):
+        return f"The structured metrics store has no figures for {ticker}, ingest its quarterly reports first."
+    if period_type not in ("quarter", "annual"):
+        return f"Unknown period_type '{period_type}', use quarter or annual."
+
+    lines = [
+        format_lookup(store.lookup(ticker, metric, period, period_type))
+        for metric in metrics if metric and metric.strip()
+        for period in (periods or ["latest"])
+    ]
+    if any(line.startswith("Unknown") for line in lines):
+        lines.append(f"Available {period_type} metrics: {', '.join(store.available_metrics(ticker, period_type))}")
+    return "\n".join(lines) if lines else "No metrics provided."
+
+@tool(parse_docstring=True)
+async def financial_metrics_lookup(metrics: List[str], periods: Optional[List[str]] = None, period_type: str = "quarter"):
+    """
+    Exact reported figures from the structured results table, with quarter-on-quarter (QoQ) and year-on-year (YoY) changes computed for you. Answers directly from the parsed spreadsheet without any search, prefer it over financial_data_extractor whenever you need numbers.
+
+    Args:
+        metrics: Metric names, e.g. sales, expenses, operating_profit, operating_margin, net_profit, profit_before_tax, tax, other_income.
+        periods: Periods to look up, e.g. "latest", "Q1 FY26", "2025-06-30", "Jun 2025" or "FY25" for annual figures. Defaults to the latest period.
+        period_type: "quarter" for quarterly results or "annual" for yearly profit & loss, balance sheet and cash flow figures.
+    """
+    try:
+        return lookup_metrics(metrics, periods, period_type)
+
+    except Exception as e:
+        print(f"There was an error in the financial_metrics_lookup tool: {e}")
+        return "There was an error looking up financial metrics."
+
+
+def baseline_forecasts(metrics: Optional[List[str]] = None, period_type: str = "quarter", all_models: bool = False) -> str:
+    """Formatted baseline projections of the current company's series, every series when metrics is empty."""
+    forecaster = get_quant_forecaster()
+    ticker = get_ticker()
+    company_metrics = forecaster.company_metrics(ticker, period_type)
+    if not company_metrics:
+        return f"No metric history of {ticker} available to forecast from, ingest its quarterly reports first."
+
+    lines = []
+    for metric in (metrics or company_metrics):
+        forecast = forecaster.forecast(ticker, metric, period_type)
+        lines.append(format_forecast(forecast, all_models) if forecast else f"No {period_type} history for metric '{metric}'")
+    return "\n".join(lines)
+
+@tool(parse_docstring=True)
+async def quantitative_forecast(metrics: Optional[List[str]] = None, period_type: str = "quarter", all_models: bool = False):
+    """
+    Statistical baseline projections for the next periods with prediction intervals, fitted on the reported history (seasonal naive, exponential smoothing and linear trend; the model with the lowest backtest error is selected). Use it to ground the numbers in your revenue and profitability outlook.
+
+    Args:
+        metrics: Metric names, e.g. sales, expenses, operating_profit, operating_margin, net_profit. Defaults to every metric.
+        period_type: "quarter" for the next quarters or "annual" for the next fiscal years.
+        all_models: Return the projection of every model instead of only the selected one.
+    """
+    try:
+        if period_type not in ("quarter", "annual"):
+            return f"Unknown period_type '{period_type}', use quarter or annual."
+        return baseline_forecasts(metrics, period_type, all_models)
+
+    except Exception as e:
+        print(f"There was an error in the quantitative_forecast tool: {e}")
+        return "There was an error computing the quantitative forecast."
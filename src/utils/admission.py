@@ -0,0 +1,153 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from config import config
+from src.utils.llm_scheduler import BATCH, PRIORITIES, get_llm_priority
+from src.utils.telemetry import ADMISSION_DECISIONS, span
+
+
+class AdmissionRejected(Exception):
+    """A forecast run that was not admitted: 429 when the wait queue is full, 503 when the wait timed out."""
+
+    def __init__(self, status_code: int, message: str, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    def response(self) -> Dict:
+        return {"status_code": self.status_code, "status_messages": str(self), "retry_after": self.retry_after}
+
+
+class AdmissionController:
+    """
+    Global limit on concurrent forecast runs (agent loops and fast path LLM calls).
+
+    Up to max_concurrent runs hold a slot, up to max_queue more wait for one, interactive
+    runs ahead of batch work and each in arrival order. A run arriving to a full queue
+    is rejected at once with 429, one that waited queue_timeout_seconds without getting
+    a slot with 503. Both carry a Retry-After estimated from the recent run durations
+    and the current backlog.
+    """
+
+    def __init__(self, max_concurrent: int = None, max_queue: int = None, queue_timeout_seconds: float = None):
+        self.max_concurrent = max_concurrent or config.max_concurrent_forecasts
+        self.max_queue = config.forecast_queue_size if max_queue is None else max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds or config.forecast_queue_timeout_seconds
+        self.running = 0
+        self.waiters: Dict[str, "deque[asyncio.Future]"] = {priority: deque() for priority in PRIORITIES}
+        # Exponentially weighted mean run duration, seeds the Retry-After estimate
+        self.mean_run_seconds = 10.0
+
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self.waiters.values())
+
+    def retry_after(self) -> int:
+        backlog = self.queued() + 1
+        return max(1, math.ceil(self.mean_run_seconds * backlog / self.max_concurrent))
+
+    async def acquire(self, priority: str = None):
+        if self.running < self.max_concurrent and not self.queued():
+            self.running += 1
+            ADMISSION_DECISIONS.inc(result="admitted")
+            return
+
+        if self.queued() >= self.max_queue:
+            ADMISSION_DECISIONS.inc(result="rejected_queue_full")
+            raise AdmissionRejected(
+                429, f"Too many forecasts in progress ({self.running} running, {self.queued()} queued)",
+                self.retry_after()
+            )
+
+        priority = priority or get_llm_priority()
+        waiters = self.waiters.get(priority, self.waiters[BATCH])
+        waiter = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        try:
+            with span("admission", "queue", priority=priority, queued=self.queued()):
+                await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended, pass it on
+                self.release_slot()
+            else:
+                waiter.cancel()
+                waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            ADMISSION_DECISIONS.inc(result="rejected_timeout")
+            raise AdmissionRejected(
+                503, f"No forecast slot freed up within {self.queue_timeout_seconds:g} seconds", self.retry_after()
+            )
+        ADMISSION_DECISIONS.inc(result="queued")
+
+    def release_slot(self):
+        # A freed slot goes straight to the next waiter, so running stays the same
+        for priority in sorted(PRIORITIES, key=PRIORITIES.get):
+            waiters = self.waiters[priority]
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.running -= 1
+
+    def release(self, start_time: float):
+        """Give back a slot acquired at start_time, its run duration feeds the Retry-After estimate."""
+        self.mean_run_seconds = 0.8 * self.mean_run_seconds + 0.2 * (time.perf_counter() - start_time)
+        self.release_slot()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(start_time)
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "queued": self.queued(),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "mean_run_seconds": round(self.mean_run_seconds, 3),
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls: while a call for a key runs, later callers with
+    the same key await its result instead of starting their own. The call runs as its
+    own task, so a caller that goes away does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable], on_coalesced: Optional[Callable] = None):
+        task = self.calls.get(key)
+        if task is not None:
+            ADMISSION_DECISIONS.inc(result="coalesced")
+            if on_coalesced is not None:
+                on_coalesced()
+            return await asyncio.shield(task)
+
+        task = asyncio.create_task(func())
+        self.calls[key] = task
+        task.add_done_callback(lambda done: self.finished(key, done))
+        return await asyncio.shield(task)
+
+    def finished(self, key: Hashable, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # Retrieved here too, every caller may have gone away before it finished
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self):
+        return len(self.calls)
@@ -0,0 +1,57 @@
+from src.data_extraction.text_extraction import TextExtractor
+from src.data_layer.metrics_store import MetricsStore
+from src.data_layer.sql_operations import close_connection_pool, log_writer
+from src.data_layer.vectordb_operations import VectorDBOperations
+from src.forecasting_agent.agent.agent import ForecastingAgent
+from src.forecasting_agent.tools.tools import set_metrics_store, set_vector_db
+from src.utils.admission import AdmissionController
+from src.utils.ingestion_service import IngestionService
+from src.utils.utils import ProcessRequest
+
+
+class AppContainer:
+    """
+    Application-lifetime singletons. Built once in the FastAPI lifespan and shared by
+    every request, so clients, connection pools and the tokenizer are created once.
+    """
+
+    def __init__(self, vector_db: VectorDBOperations = None, forecasting_agent: ForecastingAgent = None):
+        self.text_extractor = TextExtractor()
+        self.vector_db = vector_db or VectorDBOperations()
+        self.forecasting_agent = forecasting_agent or ForecastingAgent()
+        self.metrics_store = MetricsStore()
+        self.admission = AdmissionController()
+        self.process_request = ProcessRequest(
+            text_extractor=self.text_extractor,
+            vector_db=self.vector_db,
+            forecasting_agent=self.forecasting_agent,
+            metrics_store=self.metrics_store,
+            admission=self.admission
+        )
+        self.ingestion_service = IngestionService(self.process_request)
+        if self.process_request.response_cache is not None:
+            # Keeps the cached responses of every company whose corpus is unchanged
+            self.ingestion_service.on_corpus_change(
+                lambda _: self.process_request.response_cache.invalidate(self.process_request.corpus_versions())
+            )
+
+        set_vector_db(self.vector_db)
+        set_metrics_store(self.metrics_store)
+
+    async def start(self):
+        # Creates the log schema once and starts the background log writer
+        log_writer.start()
+
+    async def shutdown(self):
+        await self.ingestion_service.shutdown()
+
+        try:
+            await self.forecasting_agent.aclose()
+        except Exception as e:
+            print(f"Warning: Error closing LLM http clients: {e}")
+
+        self.vector_db.close()
+        self.text_extractor.close()
+        await log_writer.stop()
+        close_connection_pool()
+        print("Application resources released")
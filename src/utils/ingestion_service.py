@@ -0,0 +1,106 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from config import config
+from src.utils.telemetry import set_request_id
+
+
+class IngestionService:
+    """
+    Runs vector ingestion as background jobs so that /chat only ever queries the
+    already-indexed corpus. At most one ingestion job runs at a time; requesting a new
+    job while one is in flight returns the running job instead of starting another.
+    """
+
+    def __init__(self, process_request, job_history: int = None):
+        self.process_request = process_request
+        self.corpus_change_callbacks = []
+        self.job_history = job_history or config.ingestion_job_history
+        self.jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self.active_job_id: Optional[str] = None
+        self.active_task: Optional[asyncio.Task] = None
+
+    @property
+    def corpus_version(self):
+        return self.process_request.corpus_version()
+
+    def on_corpus_change(self, callback):
+        """Register callback(corpus_version), called after a job changes the indexed corpus (of any company)."""
+        self.corpus_change_callbacks.append(callback)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        return self.jobs.get(job_id)
+
+    def start_job(self, trigger: str = "api", tickers: Optional[List[str]] = None) -> Dict:
+        if self.active_job_id and self.jobs[self.active_job_id]["status"] in ("queued", "running"):
+            return self.jobs[self.active_job_id]
+
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "trigger": trigger,
+            "tickers": tickers,
+            "status": "queued",
+            "progress": {"files_processed": 0, "files_total": None},
+            "result": None,
+            "corpus_version": self.corpus_version,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self.jobs[job_id] = job
+        while len(self.jobs) > self.job_history:
+            self.jobs.popitem(last=False)
+
+        self.active_job_id = job_id
+        self.active_task = asyncio.create_task(self._run_job(job))
+        return job
+
+    async def _run_job(self, job: Dict):
+        job_id = job["job_id"]
+        # The job runs in its own task, so its spans carry the job ID as request ID
+        set_request_id(job_id)
+
+        def update_progress(files_processed, files_total):
+            job["progress"] = {"files_processed": files_processed, "files_total": files_total}
+
+        previous_corpus_version = self.corpus_version
+        job["status"] = "running"
+        job["started_at"] = datetime.now(timezone.utc).isoformat()
+        print(f"{job_id}: Ingestion job started ({job['trigger']})")
+
+        try:
+            result = await self.process_request.ingestion_to_vector(
+                job_id, progress_callback=update_progress, tickers=job["tickers"]
+            )
+            job["result"] = result
+            job["status"] = "failed" if result.get("status") == "error" else "completed"
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            raise
+        except Exception as e:
+            print(f"ERROR: {job_id}: Ingestion job failed: {e}")
+            job["result"] = {"status": "error", "message": str(e)}
+            job["status"] = "failed"
+        finally:
+            job["corpus_version"] = self.corpus_version
+            job["finished_at"] = datetime.now(timezone.utc).isoformat()
+            print(f"{job_id}: Ingestion job {job['status']}, corpus version {job['corpus_version']}")
+
+            if job["corpus_version"] != previous_corpus_version:
+                for callback in self.corpus_change_callbacks:
+                    try:
+                        callback(job["corpus_version"])
+                    except Exception as e:
+                        print(f"ERROR: {job_id}: Corpus change callback failed: {e}")
+
+    async def shutdown(self):
+        if self.active_task and not self.active_task.done():
+            self.active_task.cancel()
+            try:
+                await self.active_task
+            except asyncio.CancelledError:
+                pass
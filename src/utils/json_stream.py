@@ -0,0 +1,296 @@
+import json
+import re
+from typing import Any, Callable, List, Optional, Tuple
+
+CLOSERS = {"{": "}", "[": "]"}
+LITERALS = {"True": "true", "False": "false", "None": "null"}
+# Opening of a ```json fence, the answer block models wrap their JSON in
+JSON_FENCE = re.compile(r"```json[ \t]*\n?", re.IGNORECASE)
+
+
+class IncrementalJSONParser:
+    """
+    Tolerant JSON parser fed one chunk of model output at a time.
+
+    Text before the first '{' or '[' (prose, a ```json fence) and after the document
+    ends is ignored. Trailing, doubled and missing commas, raw newlines inside strings,
+    Python literals and keys without a value are repaired as the text is scanned. feed()
+    returns the (path, value) of every member or element completed by the chunk, and
+    value() the document parsed so far: everything up to the last completed value, with
+    the open objects and arrays closed, so a truncated answer still yields its fields.
+
+    With accept, a document it rejects (a brace in the lead-in prose, "{context}") is
+    dropped and parsing starts over from the next root character. A backtick outside a
+    string ends the document: the end of a fenced answer, or prose that only looked
+    like one, in which case it starts over too.
+    """
+
+    def __init__(self, roots: str = "{[", accept: Optional[Callable[[Any], bool]] = None):
+        # Characters a document may start with, "{" skips any bracket in leading prose
+        self.roots = roots
+        self.accept = accept
+        # All text fed so far, kept to start over from a later root
+        self.text = ""
+        self.position = 0
+        self.root_position = 0
+        self.completed: List[Tuple[Tuple, Any]] = []
+        self.reset()
+
+    def reset(self):
+        self.out: List[str] = []
+        self.stack: List[dict] = []
+        self.started = False
+        self.done = False
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.primitive_start: Optional[int] = None
+        # Length of out and closing brackets at the last point it parses when closed
+        self.safe_length = 0
+        self.safe_closers = ""
+
+    def feed(self, text: str) -> List[Tuple[Tuple, Any]]:
+        self.text += text
+        while self.position < len(self.text) and not self.done:
+            char = self.text[self.position]
+            self.position += 1
+            if not self.started:
+                if char in self.roots:
+                    self.started = True
+                    self.root_position = self.position - 1
+                    self.open_container(char)
+                continue
+            if self.in_string:
+                self.scan_string(char)
+            elif char == "`":
+                self.end_document()
+            else:
+                self.scan(char)
+            if self.done and not self.accepted(self.parsed_value()):
+                self.start_over()
+        completed, self.completed = self.completed, []
+        return completed
+
+    def accepted(self, value: Any) -> bool:
+        return value is not None if self.accept is None else self.accept(value)
+
+    def start_over(self):
+        """Drop the current document and scan again from the root character after it."""
+        self.reset()
+        self.position = self.root_position + 1
+
+    def end_document(self):
+        if self.primitive_start is not None:
+            self.end_primitive()
+        if self.accepted(self.parsed_value()):
+            self.done = True
+        else:
+            self.start_over()
+
+    def value(self) -> Optional[Any]:
+        """
+        The document parsed so far, None before its first complete value. When accept
+        rejects it, the first accepted document starting at a later root, if any.
+        """
+        value = self.parsed_value()
+        if self.accept is None or self.accept(value) or not self.started:
+            return value
+        # A truncated document that was never accepted, try the rest of the text on its own
+        rest = IncrementalJSONParser(self.roots, self.accept)
+        rest.feed(self.text[self.root_position + 1:])
+        return rest.value()
+
+    def parsed_value(self) -> Optional[Any]:
+        if not self.started:
+            return None
+        if self.done:
+            try:
+                return json.loads("".join(self.out), strict=False)
+            except json.JSONDecodeError:
+                pass
+        try:
+            return json.loads("".join(self.out[:self.safe_length]) + self.safe_closers, strict=False)
+        except json.JSONDecodeError:
+            return None
+
+    def scan_string(self, char: str):
+        if self.escape:
+            self.escape = False
+            if char not in '"\\/bfnrtu':
+                # Not a JSON escape, keep the backslash as a literal one
+                self.out.append("\\")
+            self.out.append(char)
+        elif char == "\\":
+            self.escape = True
+            self.out.append(char)
+        elif char == '"':
+            self.in_string = False
+            self.out.append(char)
+            frame = self.stack[-1] if self.stack else None
+            if frame is not None and frame["kind"] == "{" and frame["state"] == "key":
+                frame["key"] = self.decode(self.string_start, len(self.out))
+                frame["key_start"] = self.string_start
+                frame["state"] = "colon"
+            else:
+                self.value_end(self.string_start)
+        elif char == "\n":
+            self.out.append("\\n")
+        elif char == "\r":
+            self.out.append("\\r")
+        elif char == "\t":
+            self.out.append("\\t")
+        else:
+            self.out.append(char)
+
+    def scan(self, char: str):
+        if self.primitive_start is not None:
+            if char.isspace() or char in ",:]}":
+                self.end_primitive()
+            else:
+                self.out.append(char)
+                return
+
+        if char.isspace():
+            return
+        frame = self.stack[-1]
+        if char == '"':
+            if self.value_completed(frame):
+                # A new member or element right after a completed one, the comma is missing
+                self.out.append(",")
+                if frame["kind"] == "{":
+                    frame["state"] = "key"
+                    frame["key"] = None
+            self.in_string = True
+            self.string_start = len(self.out)
+            self.out.append(char)
+        elif char in CLOSERS:
+            self.open_container(char)
+        elif char in "}]":
+            self.close_container()
+        elif char == ":":
+            if frame["kind"] == "{" and frame["state"] == "colon":
+                self.out.append(char)
+                frame["state"] = "value"
+        elif char == ",":
+            if frame["kind"] == "{":
+                self.drop_dangling_key(frame)
+                frame["state"] = "key"
+                frame["key"] = None
+            if self.out and self.out[-1] not in "{[,":
+                self.out.append(char)
+        else:
+            self.primitive_start = len(self.out)
+            self.out.append(char)
+
+    def value_completed(self, frame: dict) -> bool:
+        if frame["kind"] == "{":
+            return frame["state"] == "after"
+        return bool(self.out) and self.out[-1] not in "[,"
+
+    def end_primitive(self):
+        start, self.primitive_start = self.primitive_start, None
+        token = LITERALS.get("".join(self.out[start:]), "".join(self.out[start:]))
+        try:
+            json.loads(token)
+        except json.JSONDecodeError:
+            # Not a number or literal, drop it (and its key)
+            del self.out[start:]
+            return
+        self.out[start:] = list(token)
+        self.value_end(start)
+
+    def open_container(self, char: str):
+        parent = self.stack[-1] if self.stack else None
+        self.stack.append({
+            "kind": char,
+            "state": "key" if char == "{" else "value",
+            "key": None,
+            "key_start": None,
+            "index": 0,
+            "start": len(self.out),
+            "path": self.child_path(parent),
+        })
+        self.out.append(char)
+        self.mark_safe()
+
+    def drop_dangling_key(self, frame: dict):
+        """Remove a key that never got its value."""
+        if frame["state"] in ("colon", "value"):
+            del self.out[frame["key_start"]:]
+            frame["state"] = "after"
+
+    def close_container(self):
+        frame = self.stack[-1]
+        if frame["kind"] == "{":
+            self.drop_dangling_key(frame)
+        while self.out and self.out[-1] == ",":
+            self.out.pop()
+        self.out.append(CLOSERS[frame["kind"]])
+        self.stack.pop()
+        self.value_end(frame["start"])
+
+    def value_end(self, start: int):
+        if not self.stack:
+            self.done = True
+            return
+        frame = self.stack[-1]
+        if frame["kind"] == "{" and frame["state"] != "value":
+            return
+        path = self.child_path(frame)
+        try:
+            self.completed.append((path, json.loads("".join(self.out[start:]), strict=False)))
+        except json.JSONDecodeError:
+            return
+        if frame["kind"] == "{":
+            frame["state"] = "after"
+        else:
+            frame["index"] += 1
+        self.mark_safe()
+
+    def mark_safe(self):
+        self.safe_length = len(self.out)
+        self.safe_closers = "".join(CLOSERS[frame["kind"]] for frame in reversed(self.stack))
+
+    def decode(self, start: int, end: int) -> Any:
+        try:
+            return json.loads("".join(self.out[start:end]), strict=False)
+        except json.JSONDecodeError:
+            return "".join(self.out[start + 1:end - 1])
+
+    @staticmethod
+    def child_path(frame: Optional[dict]) -> Tuple:
+        if frame is None:
+            return ()
+        return frame["path"] + ((frame["key"],) if frame["kind"] == "{" else (frame["index"],))
+
+
+def parse_partial_json(text: str, roots: str = "{[", accept: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+    """
+    Best-effort parse of a complete, fenced, malformed or truncated JSON answer. The
+    content of a ```json fence is preferred over the text around it; with accept, only
+    a document it accepts is returned.
+    """
+    text = text or ""
+    fence = JSON_FENCE.search(text)
+    if fence is not None:
+        fence_end = text.find("```", fence.end())
+        value = parse_partial_json(text[fence.end():fence_end if fence_end != -1 else len(text)], roots, accept)
+        if value is not None:
+            return value
+
+    # Well-formed answers (possibly wrapped in prose) skip the character scan
+    start = min((text.find(root) for root in roots if root in text), default=-1)
+    if start != -1:
+        end = text.rfind(CLOSERS[text[start]])
+        if end > start:
+            try:
+                value = json.loads(text[start:end + 1], strict=False)
+                if accept is None or accept(value):
+                    return value
+            except json.JSONDecodeError:
+                pass
+
+    parser = IncrementalJSONParser(roots, accept)
+    parser.feed(text)
+    value = parser.value()
+    return value if accept is None or accept(value) else None
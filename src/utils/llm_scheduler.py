@@ -0,0 +1,307 @@
+"""
+Rate-limit aware scheduling of the forecasting LLM's calls.
+
+Every call reserves one request and its estimated tokens from per-minute token buckets
+sized to the provider budgets (LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE) and waits
+until both have room. The reservation is settled against the usage the provider reports.
+Interactive /chat calls are served before batch work, which also has to leave
+LLM_INTERACTIVE_RESERVE of each bucket free. A 429 from the provider pauses every call
+for the retry hint it carries (or an exponential backoff), with jitter, before the call
+is retried.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import re
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatResult
+from langchain_core.runnables import RunnableBinding
+from pydantic import ConfigDict
+
+from config import config
+from src.utils.telemetry import LLM_SCHEDULER, span
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+# Priority of the LLM calls made in the current context, /chat requests set it to interactive
+llm_priority_var: ContextVar[str] = ContextVar("llm_priority", default=BATCH)
+
+# "2m59.56s", "7.66s", "120ms": the duration format of Groq's x-ratelimit-reset-* headers
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def set_llm_priority(priority: str):
+    return llm_priority_var.set(priority)
+
+
+def get_llm_priority() -> str:
+    return llm_priority_var.get()
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def retry_hint(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked to wait before retrying, from the headers of its 429 response."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after_ms = parse_duration(headers.get("retry-after-ms"))
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000
+    hints = [parse_duration(headers.get(name))
+             for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+    hints = [hint for hint in hints if hint is not None]
+    return max(hints) if hints else None
+
+
+class TokenBucket:
+    """Bucket of capacity units refilled continuously at capacity per period."""
+
+    def __init__(self, capacity: float, period_seconds: float):
+        self.capacity = capacity
+        self.rate = capacity / period_seconds
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until amount can be taken with reserve left over, a call larger than the bucket waits for a full one."""
+        needed = min(amount + reserve, self.capacity)
+        return max(0.0, (needed - self.level) / self.rate)
+
+    def take(self, amount: float):
+        # May go negative (a call larger than the bucket, usage above its estimate), later calls wait off the debt
+        self.level -= amount
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_minute: int = None, tokens_per_minute: int = None, period_seconds: float = 60.0,
+                 max_retries: int = None, backoff_base_seconds: float = None, backoff_max_seconds: float = None,
+                 interactive_reserve: float = None):
+        requests_per_minute = config.llm_requests_per_minute if requests_per_minute is None else requests_per_minute
+        tokens_per_minute = config.llm_tokens_per_minute if tokens_per_minute is None else tokens_per_minute
+        # A budget of 0 is not paced
+        self.requests = TokenBucket(requests_per_minute, period_seconds) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute, period_seconds) if tokens_per_minute > 0 else None
+        self.max_retries = config.llm_max_retries if max_retries is None else max_retries
+        self.backoff_base_seconds = backoff_base_seconds or config.llm_backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds or config.llm_backoff_max_seconds
+        self.interactive_reserve = config.llm_interactive_reserve if interactive_reserve is None else interactive_reserve
+        # No call starts before this (monotonic) time, set when the provider answers 429
+        self.paused_until = 0.0
+        self.waiting: List = []
+        self.sequence = itertools.count()
+        self.condition = asyncio.Condition()
+
+    def buckets(self):
+        return [bucket for bucket in (self.requests, self.tokens) if bucket is not None]
+
+    def delay(self, tokens: int, priority: str) -> float:
+        now = time.monotonic()
+        delay = max(0.0, self.paused_until - now)
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is None:
+                continue
+            bucket.refill(now)
+            reserve = bucket.capacity * self.interactive_reserve if priority == BATCH else 0.0
+            delay = max(delay, bucket.delay(amount, reserve))
+        return delay
+
+    async def acquire(self, tokens: int, priority: str = None, sequence: int = None) -> Dict:
+        """
+        Wait for the turn of a call of about tokens tokens and reserve them. Calls are served
+        by priority, then in arrival order; a retried call keeps its original sequence.
+        """
+        priority = priority or get_llm_priority()
+        sequence = next(self.sequence) if sequence is None else sequence
+        reservation = {"tokens": tokens, "priority": priority, "sequence": sequence}
+        if not self.waiting and self.delay(tokens, priority) <= 0:
+            self.take(tokens)
+            return reservation
+
+        entry = (PRIORITIES.get(priority, PRIORITIES[BATCH]), sequence)
+        LLM_SCHEDULER.inc(priority=priority, result="throttled")
+        with span("llm_scheduler", priority, tokens=tokens, waiting=len(self.waiting) + 1):
+            async with self.condition:
+                heapq.heappush(self.waiting, entry)
+                try:
+                    while True:
+                        if self.waiting[0] == entry:
+                            delay = self.delay(tokens, priority)
+                            if delay <= 0:
+                                heapq.heappop(self.waiting)
+                                self.take(tokens)
+                                self.condition.notify_all()
+                                return reservation
+                            try:
+                                await asyncio.wait_for(self.condition.wait(), timeout=delay)
+                            except asyncio.TimeoutError:
+                                pass
+                        else:
+                            await self.condition.wait()
+                except BaseException:
+                    if entry in self.waiting:
+                        self.waiting.remove(entry)
+                        heapq.heapify(self.waiting)
+                        self.condition.notify_all()
+                    raise
+
+    def take(self, tokens: int):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    def settle(self, reservation: Dict, used_tokens: Optional[int]):
+        """Correct the token bucket by the difference between the reported usage and the estimate."""
+        if self.tokens is not None and used_tokens:
+            self.tokens.take(used_tokens - reservation["tokens"])
+
+    def retry_delay(self, error: BaseException, attempt: int, reservation: Dict) -> Optional[float]:
+        """
+        Seconds to wait before retrying a call that failed with error, None when it should
+        not be retried. A rate limit pauses every call, not only this one.
+        """
+        if not is_rate_limited(error):
+            return None
+        LLM_SCHEDULER.inc(priority=reservation["priority"], result="rate_limited")
+        if attempt >= self.max_retries:
+            LLM_SCHEDULER.inc(priority=reservation["priority"], result="exhausted")
+            return None
+
+        backoff = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt)
+        hint = retry_hint(error)
+        # Jitter keeps the calls paused by the same 429 from all retrying at the same instant
+        if hint is not None:
+            delay = min(hint, self.backoff_max_seconds) + random.uniform(0, self.backoff_base_seconds)
+        else:
+            delay = random.uniform(backoff / 2, backoff)
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+        # Sync the buckets down to what the provider reports is left
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        for bucket, header in ((self.requests, "x-ratelimit-remaining-requests"),
+                               (self.tokens, "x-ratelimit-remaining-tokens")):
+            remaining = headers.get(header)
+            if bucket is not None and remaining and remaining.isdigit():
+                bucket.level = min(bucket.level, int(remaining))
+        LLM_SCHEDULER.inc(priority=reservation["priority"], result="retried")
+        return delay
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        for bucket in self.buckets():
+            bucket.refill(now)
+        return {
+            "waiting": len(self.waiting),
+            "requests_available": None if self.requests is None else round(self.requests.level, 2),
+            "tokens_available": None if self.tokens is None else round(self.tokens.level),
+            "paused_seconds": round(max(0.0, self.paused_until - now), 3),
+        }
+
+
+def estimate_tokens(messages, completion_tokens: int = None) -> int:
+    """Tokens a call will use: its prompt at about four characters a token, plus the completion estimate."""
+    completion_tokens = config.llm_completion_tokens_estimate if completion_tokens is None else completion_tokens
+    prompt_chars = sum(len(str(message.content)) for message in messages)
+    return math.ceil(prompt_chars / 4) + completion_tokens
+
+
+def usage_tokens(message) -> Optional[int]:
+    usage_metadata = getattr(message, "usage_metadata", None)
+    return usage_metadata.get("total_tokens") if usage_metadata else None
+
+
+class ScheduledChatModel(BaseChatModel):
+    """
+    Chat model that runs every async call of the wrapped model through an LLMScheduler.
+    Tools bound to it are bound to the wrapped model's calls, so the agent loop's calls
+    are scheduled as well. A stream is only retried when it failed before its first chunk.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: BaseChatModel
+    scheduler: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"scheduled-{self.model._llm_type}"
+
+    def bind_tools(self, tools, **kwargs):
+        bound = self.model.bind_tools(tools, **kwargs)
+        if isinstance(bound, RunnableBinding):
+            return self.bind(**bound.kwargs)
+        return self.model_copy(update={"model": bound})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        # Sync calls are not used by the service and are not scheduled
+        return self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        reservation = None
+        for attempt in itertools.count():
+            reservation = await self.scheduler.acquire(
+                estimate_tokens(messages), sequence=reservation["sequence"] if reservation else None
+            )
+            try:
+                result = await self.model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                delay = self.scheduler.retry_delay(e, attempt, reservation)
+                if delay is None:
+                    raise
+                print(f"WARNING: LLM rate limited, retrying in {delay:.2f}s (attempt {attempt + 1})")
+                await asyncio.sleep(delay)
+                continue
+            self.scheduler.settle(reservation, sum(
+                usage_tokens(generation.message) or 0 for generation in result.generations
+            ))
+            return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        reservation = None
+        for attempt in itertools.count():
+            reservation = await self.scheduler.acquire(
+                estimate_tokens(messages), sequence=reservation["sequence"] if reservation else None
+            )
+            used_tokens = 0
+            started = False
+            try:
+                async for chunk in self.model._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    used_tokens += usage_tokens(chunk.message) or 0
+                    yield chunk
+            except Exception as e:
+                delay = None if started else self.scheduler.retry_delay(e, attempt, reservation)
+                if delay is None:
+                    raise
+                print(f"WARNING: LLM rate limited, retrying in {delay:.2f}s (attempt {attempt + 1})")
+                await asyncio.sleep(delay)
+                continue
+            self.scheduler.settle(reservation, used_tokens)
+            return
@@ -0,0 +1,120 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+
+class ForecastResponseCache:
+    """
+    Cache of successful forecast responses keyed by normalized query, corpus version and
+    variant (the company and forecast mode that produced the response).
+
+    Entries only ever match the corpus version they were produced against, and entries of
+    a company are dropped when ingestion changes that company's corpus. With an embed function and a
+    similarity threshold configured, a miss on the exact key falls back to the most
+    similar cached query of the same corpus version.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600, embed_fn=None,
+                 similarity_threshold: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.entries: "OrderedDict[Tuple[str, str, str], Dict]" = OrderedDict()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split()).rstrip("?.! ")
+
+    @property
+    def similarity_enabled(self) -> bool:
+        return self.embed_fn is not None and bool(self.similarity_threshold)
+
+    def _expired(self, entry: Dict) -> bool:
+        return time.time() - entry["created_at"] > self.ttl_seconds
+
+    def key(self, query: str, corpus_version: Optional[str], variant: str = "") -> Tuple[str, str, str]:
+        return (corpus_version or "", variant or "", self.normalize(query))
+
+    async def get(self, query: str, corpus_version: Optional[str], variant: str = "") -> Optional[Dict]:
+        key = self.key(query, corpus_version, variant)
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            if not self._expired(entry):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry["response"]
+            del self.entries[key]
+
+        if self.similarity_enabled:
+            best_entry = await self._most_similar(key)
+            if best_entry is not None:
+                self.hits += 1
+                self.similar_hits += 1
+                return best_entry["response"]
+
+        self.misses += 1
+        return None
+
+    async def _most_similar(self, key: Tuple[str, str, str]) -> Optional[Dict]:
+        candidates = [
+            entry for (version, variant, _), entry in self.entries.items()
+            if (version, variant) == key[:2] and entry.get("vector") is not None and not self._expired(entry)
+        ]
+        if not candidates:
+            return None
+
+        query_vector = await self._embed(key[2])
+        if query_vector is None:
+            return None
+
+        matrix = np.stack([entry["vector"] for entry in candidates])
+        similarities = matrix @ query_vector
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.similarity_threshold:
+            return candidates[best]
+        return None
+
+    async def _embed(self, normalized_query: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(await self.embed_fn(normalized_query), dtype=np.float32)
+        except Exception as e:
+            print(f"Warning: Could not embed query for response cache: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    async def set(self, query: str, corpus_version: Optional[str], response: Dict, variant: str = ""):
+        key = self.key(query, corpus_version, variant)
+        vector = await self._embed(key[2]) if self.similarity_enabled else None
+
+        self.entries[key] = {"response": response, "created_at": time.time(), "vector": vector}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, corpus_version: Union[str, Iterable[str], None] = None):
+        """
+        Drop every entry not produced against corpus_version, a single version or the
+        current versions of every company (all entries when None).
+        """
+        if corpus_version is None:
+            self.entries.clear()
+            return
+        current = {corpus_version} if isinstance(corpus_version, str) else set(corpus_version)
+        for key in [key for key in self.entries if key[0] not in current]:
+            del self.entries[key]
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,58 @@
+import asyncio
+import json
+from contextlib import aclosing, suppress
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+_STREAM_END = object()
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def sse_stream(events: AsyncIterator[Dict], is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                     queue_size: int = 64, heartbeat_seconds: float = 15.0) -> AsyncIterator[str]:
+    """
+    Relay {"event", "data"} dicts from an async generator to the client as SSE frames.
+
+    The producer runs as its own task and feeds a bounded queue, so a slow client blocks
+    the producer (and with it the LLM stream) instead of events piling up in memory.
+    Heartbeat comments keep idle connections open during long tool calls and are also
+    where a disconnect is noticed. When the client goes away or this generator is closed,
+    the producer task is cancelled, which aborts the in-flight LLM call.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def produce():
+        async with aclosing(events):
+            try:
+                async for event in events:
+                    await queue.put(event)
+            except Exception as e:
+                print(f"ERROR: Event stream failed: {e}")
+                await queue.put({"event": "error", "data": {
+                    "status_code": 500,
+                    "status_messages": f"An error occurred: {str(e)}"
+                }})
+        await queue.put(_STREAM_END)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                if is_disconnected is not None and await is_disconnected():
+                    print("Client disconnected, cancelling stream")
+                    break
+                yield ": keep-alive\n\n"
+                continue
+
+            if event is _STREAM_END:
+                break
+            yield format_sse(event["event"], event["data"])
+    finally:
+        if not producer.done():
+            producer.cancel()
+            with suppress(asyncio.CancelledError):
+                await producer
@@ -0,0 +1,264 @@
+import json
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from config import config
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_current_span_var: ContextVar[Optional[str]] = ContextVar("current_span", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def get_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+def set_request_id(request_id: Optional[str]):
+    """Attach request_id to the current context, returns the token to reset it with."""
+    return request_id_var.set(request_id)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # per label set: [bucket counts..., +Inf count], sum
+        self.values: Dict[Tuple, Tuple[list, float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    bucket_labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+STAGE_DURATION = Histogram(
+    "forecast_stage_duration_seconds",
+    "Latency of pipeline stages (ingestion, extraction, chunking, embedding, vector_query, llm, tool).",
+    ["stage", "name"]
+)
+STAGE_ERRORS = Counter("forecast_stage_errors_total", "Pipeline stages that raised.", ["stage", "name"])
+LLM_TOKENS = Counter("forecast_llm_tokens_total", "LLM tokens by model and kind.", ["model", "kind"])
+CACHE_REQUESTS = Counter("forecast_cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"])
+CONTEXT_TOKENS = Counter(
+    "forecast_context_tokens_total", "Retrieved context tokens before (retrieved) and after (packed) assembly.", ["kind"]
+)
+ADMISSION_DECISIONS = Counter(
+    "forecast_admission_decisions_total",
+    "Forecast runs admitted, queued, coalesced with an identical run, or rejected.", ["result"]
+)
+LLM_SCHEDULER = Counter(
+    "forecast_llm_scheduler_total",
+    "LLM calls that waited for the rate budget, were rate limited by the provider, retried or gave up.",
+    ["priority", "result"]
+)
+HTTP_DURATION = Histogram(
+    "forecast_http_request_duration_seconds", "HTTP request latency.", ["method", "path", "status"]
+)
+HTTP_ERRORS = Counter("forecast_http_errors_total", "HTTP requests answered with a 5xx status.", ["method", "path"])
+
+REGISTRY = [
+    STAGE_DURATION, STAGE_ERRORS, LLM_TOKENS, CACHE_REQUESTS, CONTEXT_TOKENS, ADMISSION_DECISIONS,
+    LLM_SCHEDULER, HTTP_DURATION, HTTP_ERRORS
+]
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def emit_span(stage: str, name: str, span_id: str, parent_id: Optional[str], request_id: Optional[str],
+              duration: float, status: str, attributes: Dict):
+    STAGE_DURATION.observe(duration, stage=stage, name=name)
+    if status == "error":
+        STAGE_ERRORS.inc(stage=stage, name=name)
+    if config.span_logging:
+        print(json.dumps({
+            "span": stage,
+            "name": name,
+            "request_id": request_id,
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "duration_ms": round(duration * 1000, 2),
+            "status": status,
+            **attributes
+        }, default=str))
+
+
+@contextmanager
+def span(stage: str, name: str = "", **attributes):
+    """
+    Time a pipeline stage. Records the stage latency histogram (and error counter when the
+    block raises) and, with SPAN_LOGGING on, prints the span as one JSON line carrying the
+    request ID and the enclosing span. Attributes can be added inside the block through
+    the yielded dict.
+    """
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _current_span_var.get()
+    token = _current_span_var.set(span_id)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except BaseException as e:
+        status = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+        attributes["error"] = str(e) or type(e).__name__
+        raise
+    finally:
+        try:
+            _current_span_var.reset(token)
+        except ValueError:
+            # Exited in a different context than it was entered in (e.g. a generator closed by another task)
+            pass
+        emit_span(stage, name, span_id, parent_id, get_request_id(), time.perf_counter() - start, status, attributes)
+
+
+class TelemetryCallbackHandler(AsyncCallbackHandler):
+    """
+    LangChain callback that turns every LLM iteration and tool call of a run into spans
+    and accumulates token usage. Usage is read from the message usage_metadata, which
+    ChatGroq fills for both regular and streamed responses.
+    """
+
+    def __init__(self, model: str, request_id: Optional[str] = None):
+        self.model = model
+        self.request_id = request_id or get_request_id()
+        self.parent_id = _current_span_var.get()
+        self.runs: Dict = {}
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.prompt_tokens_cached = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+
+    def _start(self, run_id, stage: str, name: str, **attributes):
+        self.runs[run_id] = (stage, name, time.perf_counter(), attributes)
+
+    def _end(self, run_id, status: str = "ok", **attributes):
+        run = self.runs.pop(run_id, None)
+        if run is None:
+            return
+        stage, name, start, start_attributes = run
+        emit_span(stage, name, uuid.uuid4().hex[:16], self.parent_id, self.request_id,
+                  time.perf_counter() - start, status, {**start_attributes, **attributes})
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.llm_calls += 1
+        self._start(run_id, "llm", self.model, iteration=self.llm_calls)
+
+    async def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.llm_calls += 1
+        self._start(run_id, "llm", self.model, iteration=self.llm_calls)
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = self.extract_usage(response)
+        self.prompt_tokens += usage["prompt"]
+        self.prompt_tokens_cached += usage["cached"]
+        self.completion_tokens += usage["completion"]
+        self.total_tokens += usage["prompt"] + usage["completion"]
+        for kind, count in usage.items():
+            if count:
+                LLM_TOKENS.inc(count, model=self.model, kind=kind)
+        self._end(run_id, prompt_tokens=usage["prompt"], completion_tokens=usage["completion"])
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, status="error", error=str(error))
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, "tool", (serialized or {}).get("name") or kwargs.get("name", "tool"))
+
+    async def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    async def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, status="error", error=str(error))
+
+    @staticmethod
+    def extract_usage(response) -> Dict[str, int]:
+        usage = {"prompt": 0, "completion": 0, "cached": 0}
+        for generations in response.generations:
+            for generation in generations:
+                usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage_metadata:
+                    usage["prompt"] += usage_metadata.get("input_tokens", 0)
+                    usage["completion"] += usage_metadata.get("output_tokens", 0)
+                    usage["cached"] += (usage_metadata.get("input_token_details") or {}).get("cache_read", 0)
+        if not usage["prompt"] and not usage["completion"]:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            usage["prompt"] = token_usage.get("prompt_tokens", 0)
+            usage["completion"] = token_usage.get("completion_tokens", 0)
+        return usage
+
+    def usage_info(self) -> Dict:
+        return {
+            'model': self.model,
+            'llm_calls': self.llm_calls,
+            'usage': {
+                'prompt_tokens': self.prompt_tokens,
+                'prompt_tokens_details_cached_tokens': self.prompt_tokens_cached,
+                'completion_tokens': self.completion_tokens,
+                'total_tokens': self.total_tokens,
+            }
+        }
@@ -1,95 +1,465 @@
+import asyncio
+from collections import defaultdict
 from pathlib import Path
+import time
 import uuid
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from src.data_extraction.text_extraction import TextExtractor
-from src.data_layer.vectordb_operations import VectorDBOperations
+from src.data_layer.companies import discover_companies, normalize_ticker
+from src.data_layer.ingestion_manifest import IngestionManifest
+from src.data_layer.metrics_store import MetricsStore
+from src.data_layer.vectordb_operations import VectorDBOperations, namespace_for
 from src.forecasting_agent.agent.agent import ForecastingAgent
+from src.utils.admission import AdmissionController, AdmissionRejected, SingleFlight
+from src.utils.response_cache import ForecastResponseCache
+from src.utils.telemetry import CACHE_REQUESTS, span
+from config import config
 
 class ProcessRequest:
-    def __init__(self):
-        self.text_extractor = TextExtractor()
-        self.vector_db = VectorDBOperations()
-        self.forecasting_agent = ForecastingAgent()
+    def __init__(self, text_extractor: TextExtractor = None, vector_db: VectorDBOperations = None,
+                 forecasting_agent: ForecastingAgent = None, metrics_store: MetricsStore = None,
+                 admission: AdmissionController = None):
+        self.text_extractor = text_extractor or TextExtractor()
+        self.vector_db = vector_db or VectorDBOperations()
+        self.manifest = IngestionManifest()
+        # Companies are ingested concurrently, each one's manifest update and save happen under this lock
+        self.manifest_lock = asyncio.Lock()
+        self.metrics_store = metrics_store or MetricsStore()
+        self.forecasting_agent = forecasting_agent or ForecastingAgent()
+        self.response_cache = ForecastResponseCache(
+            max_entries=config.response_cache_size,
+            ttl_seconds=config.response_cache_ttl_seconds,
+            embed_fn=self.vector_db.embed_query,
+            similarity_threshold=config.response_cache_similarity_threshold
+        ) if config.response_cache_enabled else None
+        self.admission = admission or AdmissionController()
+        # Identical forecasts in flight share one run
+        self.single_flight = SingleFlight()
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1500,
             chunk_overlap=200,
             length_function=len
         )
 
-    async def ingestion_to_vector(self, session_id: str = None):
-        session_id = session_id or "default"
+    async def build_pdf_records(self, session_id: str, pdf_path: Path, ticker: str) -> List[Dict]:
+        records = []
+        text = await self.text_extractor.extract_pdf_text_pymupdf(session_id, str(pdf_path))
+        if text:
+            with span("chunking", "pdf", file=pdf_path.name) as attributes:
+                chunks = self.text_splitter.split_text(text)
+                attributes["chunks"] = len(chunks)
+            for i, chunk in enumerate(chunks):
+                record_id = f"{ticker}_{pdf_path.stem}_chunk_{i}"
+                records.append({
+                    "id": record_id,
+                    "text": chunk,
+                    "type": "transcriptions",
+                    "ticker": ticker,
+                    "source_file": pdf_path.name,
+                    "chunk_index": i
+                })
+        return records
+
+    async def build_excel_records(self, session_id: str, excel_path: Path, ticker: str) -> List[Dict]:
         records = []
-        
-        transcripts_dir = Path("data/transcripts")
-        quarterly_dir = Path("data/quaterly")
-        
-        if transcripts_dir.exists():
-            pdf_files = list(transcripts_dir.glob("*.pdf"))
-            for pdf_path in pdf_files:
-                try:
-                    text = await self.text_extractor.extract_pdf_text_pymupdf(session_id, str(pdf_path))
-                    if text:
-                        chunks = self.text_splitter.split_text(text)
-                        for i, chunk in enumerate(chunks):
-                            record_id = f"{pdf_path.stem}_chunk_{i}"
-                            records.append({
-                                "id": record_id,
-                                "text": chunk,
-                                "type": "transcriptions",
-                                "source_file": pdf_path.name,
-                                "chunk_index": i
-                            })
-                except Exception as e:
-                    print(f"{session_id}: Error processing {pdf_path}: {e}")
-        
-        if quarterly_dir.exists():
-            excel_files = list(quarterly_dir.glob("*.xlsx"))
-            for excel_path in excel_files:
-                try:
-                    chunks = await self.text_extractor.chunk_excel(
-                        session_id, 
-                        str(excel_path), 
-                        self.text_splitter, 
-                        chunk_size=1000
-                    )
-                    if chunks:
-                        for i, chunk in enumerate(chunks):
-                            record_id = f"{excel_path.stem}_chunk_{i}"
-                            records.append({
-                                "id": record_id,
-                                "text": chunk,
-                                "type": "quarterly_reports",
-                                "source_file": excel_path.name,
-                                "chunk_index": i
-                            })
-                except Exception as e:
-                    print(f"{session_id}: Error processing {excel_path}: {e}")
-        
-        if records:
+        chunks = await self.text_extractor.chunk_excel(
+            session_id, 
+            str(excel_path), 
+            self.text_splitter, 
+            chunk_size=1000
+        )
+        if chunks:
+            for i, chunk in enumerate(chunks):
+                record_id = f"{ticker}_{excel_path.stem}_chunk_{i}"
+                records.append({
+                    "id": record_id,
+                    "text": chunk,
+                    "type": "quarterly_reports",
+                    "ticker": ticker,
+                    "source_file": excel_path.name,
+                    "chunk_index": i
+                })
+        return records
+
+    def company_sources(self, ticker: str, dirs: Dict[str, List[Path]]) -> List[Tuple]:
+        """(path, record builder, namespace) of every document of a company."""
+        sources = []
+        for directory in dirs.get("transcriptions", []):
+            sources.extend(
+                (pdf_path, self.build_pdf_records, namespace_for(ticker, "transcriptions"))
+                for pdf_path in sorted(directory.glob("*.pdf"))
+            )
+        for directory in dirs.get("quarterly_reports", []):
+            sources.extend(
+                (excel_path, self.build_excel_records, namespace_for(ticker, "quarterly_reports"))
+                for excel_path in sorted(directory.glob("*.xlsx"))
+            )
+        return sources
+
+    async def refresh_metrics_store(self, session_id: str, ticker: str, excel_hashes: List) -> int:
+        """
+        Re-parse the company's results workbooks whose content changed since they were last
+        loaded into the metrics store, and drop the ones that no longer exist. Independent
+        of the vector manifest, so a deleted store is rebuilt even when no chunk changed.
+        """
+        rows_ingested = 0
+        current_files = set()
+        for excel_path, file_hash in excel_hashes:
+            current_files.add(str(excel_path))
+            if self.metrics_store.is_current(str(excel_path), file_hash):
+                continue
             try:
-                await self.vector_db.upsert_records(records)
-                print(f"{session_id}: Successfully ingested {len(records)} records to vector database")
-                return {"status": "success", "records_ingested": len(records)}
+                with span("metrics_store", "ingest", file=excel_path.name, ticker=ticker) as attributes:
+                    rows = await asyncio.to_thread(self.metrics_store.ingest_excel, str(excel_path), ticker, file_hash)
+                    attributes["rows"] = rows
+                rows_ingested += rows
+                print(f"{session_id}: {ticker}: Loaded {rows} metric values from {excel_path} into the metrics store")
             except Exception as e:
-                print(f"{session_id}: Error upserting to vector database: {e}")
-                return {"status": "error", "message": str(e)}
-        else:
+                print(f"{session_id}: {ticker}: Error loading {excel_path} into the metrics store: {e}")
+
+        for source_file in self.metrics_store.source_files(ticker):
+            if source_file not in current_files:
+                await asyncio.to_thread(self.metrics_store.remove_source, source_file)
+        return rows_ingested
+
+    async def ingestion_to_vector(self, session_id: str = None, progress_callback=None, tickers: List[str] = None):
+        with span("ingestion") as attributes:
+            result = await self._ingestion_to_vector(session_id, progress_callback, tickers)
+            attributes.update(status=result.get("status"), records_ingested=result.get("records_ingested", 0))
+            return result
+
+    async def _ingestion_to_vector(self, session_id: str = None, progress_callback=None, tickers: List[str] = None):
+        """
+        Ingest every company under the data directory (only tickers, when given). Each
+        company is checked, extracted, diffed and upserted into its own namespace as one
+        unit; up to INGESTION_MAX_CONCURRENT_COMPANIES companies run at a time, which also
+        bounds how many extracted records are held in memory.
+        """
+        session_id = session_id or "default"
+        companies = discover_companies()
+        requested = {normalize_ticker(ticker) for ticker in tickers} if tickers else None
+        if requested is not None:
+            companies = {ticker: dirs for ticker, dirs in companies.items() if ticker in requested}
+
+        sources_by_company = {ticker: self.company_sources(ticker, dirs) for ticker, dirs in companies.items()}
+        all_sources = [source for sources in sources_by_company.values() for source in sources]
+
+        # A manifest without a lexical index (first hybrid run, or a deleted index file) needs a full rebuild
+        rebuild_all = bool(self.manifest.files) and self.vector_db.lexical_index.is_empty()
+        if rebuild_all:
+            print(f"{session_id}: Lexical index is empty, re-ingesting every file")
+
+        files_done = 0
+        if progress_callback:
+            progress_callback(files_done, len(all_sources))
+
+        def file_done():
+            nonlocal files_done
+            files_done += 1
+            if progress_callback:
+                progress_callback(files_done, len(all_sources))
+
+        semaphore = asyncio.Semaphore(config.ingestion_max_concurrent_companies)
+
+        async def run_company(ticker, sources):
+            async with semaphore:
+                with span("ingestion", ticker, files=len(sources)) as attributes:
+                    result = await self.ingest_company(session_id, ticker, sources, rebuild_all, file_done)
+                    attributes.update(status=result.get("status"), records_ingested=result.get("records_ingested", 0))
+                    return result
+
+        results = await asyncio.gather(
+            *[run_company(ticker, sources) for ticker, sources in sources_by_company.items()],
+            return_exceptions=True
+        )
+        company_results = {}
+        for ticker, result in zip(sources_by_company, results):
+            if isinstance(result, Exception):
+                print(f"{session_id}: {ticker}: Ingestion failed: {result}")
+                result = {"status": "error", "message": str(result)}
+            company_results[ticker] = result
+
+        # Files (or whole companies) that disappeared since the last run
+        removed_files = self.manifest.missing_files([source[0] for source in all_sources], tickers=requested)
+        orphaned_by_namespace = defaultdict(list)
+        for removed_file in removed_files:
+            orphaned_by_namespace[self.manifest.namespace(removed_file)].extend(self.manifest.chunk_ids(removed_file))
+        records_deleted = sum(len(ids) for ids in orphaned_by_namespace.values())
+        try:
+            for namespace, ids in orphaned_by_namespace.items():
+                if ids:
+                    await self.vector_db.delete_records(ids, namespace=namespace)
+            for removed_file in removed_files:
+                self.manifest.remove(removed_file)
+                await asyncio.to_thread(self.metrics_store.remove_source, removed_file)
+        except Exception as e:
+            print(f"{session_id}: Error deleting records of removed files: {e}")
+            company_results["_removed_files"] = {"status": "error", "message": str(e)}
+            records_deleted = 0
+
+        async with self.manifest_lock:
+            await self.vector_db.persist_lexical_index()
+            await asyncio.to_thread(self.manifest.save)
+
+        records_ingested = sum(result.get("records_ingested", 0) for result in company_results.values())
+        records_deleted += sum(result.get("records_deleted", 0) for result in company_results.values())
+
+        failed = sorted(ticker for ticker, result in company_results.items() if result.get("status") == "error")
+        if not all_sources and not removed_files:
             print(f"{session_id}: No records to ingest")
             return {"status": "no_data", "message": "No data found to ingest"}
 
-    async def process_request(self, query: str, session_id: str = None):
-        session_id = session_id or str(uuid.uuid4())
-        
-        ingestion_result = await self.ingestion_to_vector(session_id)
-        
-        if ingestion_result.get("status") == "error":
+        if failed:
+            status = "error"
+        elif records_ingested or records_deleted:
+            status = "success"
+        else:
+            status = "unchanged"
+
+        files_skipped = sum(result.get("files_skipped", 0) for result in company_results.values())
+        print(
+            f"{session_id}: Ingested {len(company_results)} companies: {records_ingested} records upserted, "
+            f"{records_deleted} deleted, {files_skipped} unchanged files skipped"
+            + (f", failed: {', '.join(failed)}" if failed else "")
+        )
+        result = {
+            "status": status,
+            "records_ingested": records_ingested,
+            "records_deleted": records_deleted,
+            "files_skipped": files_skipped,
+            "metrics_rows_ingested": sum(result.get("metrics_rows_ingested", 0) for result in company_results.values()),
+            "file_timings": sorted(
+                (timing for result in company_results.values() for timing in result.get("file_timings", [])),
+                key=lambda t: t["seconds"], reverse=True
+            ),
+            "companies": {
+                ticker: {key: value for key, value in result.items() if key != "file_timings"}
+                for ticker, result in company_results.items()
+            },
+        }
+        if failed:
+            result["message"] = f"Ingestion failed for {', '.join(failed)}"
+        return result
+
+    async def ingest_company(self, session_id: str, ticker: str, sources: List[Tuple], rebuild_all: bool,
+                             file_done=None) -> Dict:
+        """Bring one company's namespaces, manifest entries and metrics store rows up to date."""
+        records_by_namespace = defaultdict(list)
+        orphaned_by_namespace = defaultdict(list)
+        pending_updates = []
+        files_skipped = 0
+
+        changed_sources = []
+        excel_hashes = []
+        for source_path, build_records, namespace in sources:
+            try:
+                # Hashing a changed file reads all of it, off the event loop
+                unchanged, file_hash = await asyncio.to_thread(self.manifest.check_file, source_path, namespace)
+                if build_records == self.build_excel_records:
+                    excel_hashes.append((source_path, file_hash))
+                if unchanged and not rebuild_all:
+                    files_skipped += 1
+                    if file_done:
+                        file_done()
+                else:
+                    changed_sources.append((source_path, build_records, namespace, file_hash))
+            except Exception as e:
+                print(f"{session_id}: {ticker}: Error processing {source_path}: {e}")
+                if file_done:
+                    file_done()
+
+        metrics_rows_ingested = await self.refresh_metrics_store(session_id, ticker, excel_hashes)
+
+        file_timings = []
+
+        async def build_source(source_path, build_records):
+            start_time = time.time()
+            try:
+                return await build_records(session_id, source_path, ticker)
+            finally:
+                file_timings.append({
+                    "file": str(source_path),
+                    "seconds": round(time.time() - start_time, 3)
+                })
+                if file_done:
+                    file_done()
+
+        # A company's changed files are extracted concurrently, the extractor's process pool bounds the actual parallelism
+        build_results = await asyncio.gather(
+            *[build_source(source_path, build_records) for source_path, build_records, _, _ in changed_sources],
+            return_exceptions=True
+        )
+
+        for (source_path, _, namespace, file_hash), file_records in zip(changed_sources, build_results):
+            if isinstance(file_records, Exception):
+                print(f"{session_id}: {ticker}: Error processing {source_path}: {file_records}")
+                continue
+            if not file_records:
+                # Extraction errors surface as empty results, keep the previously ingested chunks
+                print(f"{session_id}: {ticker}: No chunks extracted from {source_path}, keeping previously ingested records")
+                continue
+
+            changed_records, file_orphaned_ids = self.manifest.diff_chunks(source_path, file_records, namespace)
+            if rebuild_all:
+                changed_records = file_records
+            records_by_namespace[namespace].extend(changed_records)
+            for orphaned_namespace, ids in file_orphaned_ids.items():
+                orphaned_by_namespace[orphaned_namespace].extend(ids)
+            pending_updates.append((source_path, file_hash, file_records, namespace))
+
+        for timing in sorted(file_timings, key=lambda t: t["seconds"], reverse=True):
+            print(f"{session_id}: {ticker}: Extracted {timing['file']} in {timing['seconds']} seconds")
+
+        records_ingested = sum(len(records) for records in records_by_namespace.values())
+        records_deleted = sum(len(ids) for ids in orphaned_by_namespace.values())
+
+        if not records_ingested and not records_deleted:
+            # Stat refreshes for touched-but-identical files are persisted with the manifest
             return {
-                "status_code": 500,
-                "status_messages": f"Ingestion failed: {ingestion_result.get('message')}"
+                "status": "unchanged",
+                "records_ingested": 0,
+                "records_deleted": 0,
+                "files_skipped": files_skipped,
+                "metrics_rows_ingested": metrics_rows_ingested,
+                "file_timings": file_timings
             }
-        
-        forecast_result = await self.forecasting_agent.forecasting_call(query, session_id)
-        
-        return forecast_result
+
+        try:
+            for namespace, records in records_by_namespace.items():
+                if records:
+                    await self.vector_db.upsert_records(records, namespace=namespace)
+            for namespace, ids in orphaned_by_namespace.items():
+                if ids:
+                    await self.vector_db.delete_records(ids, namespace=namespace)
+        except Exception as e:
+            print(f"{session_id}: {ticker}: Error upserting to vector database: {e}")
+            return {"status": "error", "message": str(e), "metrics_rows_ingested": metrics_rows_ingested}
+
+        # Saved per company, so an interrupted run keeps the companies it finished. The lexical
+        # index goes first: a file the manifest marks ingested must already have its BM25 postings.
+        # The lock keeps another company's updates out of the manifest until its own postings are saved
+        async with self.manifest_lock:
+            for source_path, file_hash, file_records, namespace in pending_updates:
+                self.manifest.update(source_path, file_hash, file_records, namespace, ticker)
+            await self.vector_db.persist_lexical_index()
+            await asyncio.to_thread(self.manifest.save)
+
+        print(f"{session_id}: {ticker}: Successfully ingested {records_ingested} records to vector database, deleted {records_deleted} orphaned records, skipped {files_skipped} unchanged files")
+        return {
+            "status": "success",
+            "records_ingested": records_ingested,
+            "records_deleted": records_deleted,
+            "files_skipped": files_skipped,
+            "metrics_rows_ingested": metrics_rows_ingested,
+            "file_timings": file_timings
+        }
+
+    def corpus_version(self, ticker: Optional[str] = None):
+        return self.manifest.corpus_version(ticker)
+
+    def corpus_versions(self) -> List[str]:
+        """Current corpus version of every ingested company."""
+        versions = (self.manifest.corpus_version(ticker) for ticker in self.manifest.tickers())
+        return [version for version in versions if version]
+
+    def resolve_ticker(self, ticker: Optional[str]):
+        """Normalized ticker and None, or None and the error response for an unknown company."""
+        try:
+            ticker = normalize_ticker(ticker)
+        except ValueError as e:
+            return None, {"status_code": 400, "status_messages": str(e)}
+        if ticker not in self.manifest.tickers():
+            return None, {"status_code": 404, "status_messages": f"No documents ingested for ticker '{ticker}'"}
+        return ticker, None
+
+    async def process_request(self, query: str, session_id: str = None, mode: str = None, ticker: str = None):
+        session_id = session_id or str(uuid.uuid4())
+        ticker, error = self.resolve_ticker(ticker)
+        if error is not None:
+            return error
+        corpus_version = self.corpus_version(ticker)
+        mode = mode or config.forecast_mode
+        variant = f"{ticker}:{mode}"
+
+        if self.response_cache is not None:
+            cached_result = await self.response_cache.get(query, corpus_version, variant=variant)
+            CACHE_REQUESTS.inc(cache="response", result="miss" if cached_result is None else "hit")
+            if cached_result is not None:
+                print(f"{session_id}: Serving cached {ticker} forecast for corpus version {corpus_version}")
+                return {**cached_result, "cache_status": "HIT"}
+
+        async def run_forecast():
+            async with self.admission.slot():
+                with span("forecast", mode, ticker=ticker):
+                    forecast_result = await self.forecasting_agent.forecasting_call(query, session_id, mode, ticker)
+            forecast_result["corpus_version"] = corpus_version
+            forecast_result["forecast_mode"] = mode
+            forecast_result["ticker"] = ticker
+
+            if self.response_cache is not None and forecast_result.get("status_code") == 200:
+                await self.response_cache.set(query, corpus_version, forecast_result, variant=variant)
+            return forecast_result
+
+        coalesced = False
+
+        def on_coalesced():
+            nonlocal coalesced
+            coalesced = True
+            print(f"{session_id}: Joining the in-flight {ticker} forecast for the same query")
+
+        key = (ticker, mode, corpus_version, ForecastResponseCache.normalize(query))
+        try:
+            forecast_result = await self.single_flight.run(key, run_forecast, on_coalesced)
+        except AdmissionRejected as e:
+            print(f"{session_id}: Forecast not admitted: {e}")
+            return e.response()
+
+        return {**forecast_result, "cache_status": "COALESCED" if coalesced else "MISS"}
+
+    async def stream_request(self, query: str, session_id: str = None, mode: str = None, ticker: str = None):
+        """Streaming counterpart of process_request, yields the agent's forecast events."""
+        session_id = session_id or str(uuid.uuid4())
+        ticker, error = self.resolve_ticker(ticker)
+        if error is not None:
+            yield {"event": "result", "data": error}
+            return
+        corpus_version = self.corpus_version(ticker)
+        mode = mode or config.forecast_mode
+        variant = f"{ticker}:{mode}"
+
+        if self.response_cache is not None:
+            cached_result = await self.response_cache.get(query, corpus_version, variant=variant)
+            CACHE_REQUESTS.inc(cache="response", result="miss" if cached_result is None else "hit")
+            if cached_result is not None:
+                print(f"{session_id}: Serving cached {ticker} forecast for corpus version {corpus_version}")
+                yield {"event": "result", "data": {**cached_result, "cache_status": "HIT"}}
+                return
+
+        # Streams are not coalesced, each client gets its own tokens, but they take a slot like any run
+        queued_at = time.perf_counter()
+        try:
+            await self.admission.acquire()
+        except AdmissionRejected as e:
+            print(f"{session_id}: Forecast not admitted: {e}")
+            yield {"event": "result", "data": e.response()}
+            return
+
+        start_time = time.perf_counter()
+        try:
+            yield {"event": "admitted", "data": {"queued_seconds": round(start_time - queued_at, 3)}}
+            async for event in self.forecasting_agent.stream_forecast(query, session_id, mode, ticker):
+                if event["event"] == "result":
+                    forecast_result = event["data"]
+                    forecast_result["corpus_version"] = corpus_version
+                    forecast_result["forecast_mode"] = mode
+                    forecast_result["ticker"] = ticker
+
+                    if self.response_cache is not None and forecast_result.get("status_code") == 200:
+                        await self.response_cache.set(query, corpus_version, forecast_result, variant=variant)
+
+                    event = {"event": "result", "data": {**forecast_result, "cache_status": "MISS"}}
+                yield event
+        finally:
+            self.admission.release(start_time)
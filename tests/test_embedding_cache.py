@@ -0,0 +1,45 @@
+from src.data_layer.embedding_cache import SQLITE_MAX_PARAMETERS, EmbeddingCache
+
+
+def test_memory_tier_normalizes_queries(tmp_path):
+    cache = EmbeddingCache(disk_path=str(tmp_path / "embeddings.sqlite"))
+    cache.set_memory(["Net  Profit"], "model", [[1.0, 2.0]])
+    assert cache.get_memory(["net profit", "revenue"], "model") == [[1.0, 2.0], None]
+    assert cache.get_memory(["net profit"], "other-model") == [None]
+
+
+def test_disk_tier_survives_restart_in_one_batch(tmp_path):
+    disk_path = str(tmp_path / "embeddings.sqlite")
+    texts = [f"query {i}" for i in range(SQLITE_MAX_PARAMETERS + 10)]
+    cache = EmbeddingCache(disk_path=disk_path)
+    cache.set_disk(texts, "model", [[float(i)] for i in range(len(texts))])
+    cache.close()
+
+    cache = EmbeddingCache(disk_path=disk_path)
+    assert cache.get_memory(texts[:2], "model") == [None, None]
+    assert cache.get_disk(texts + ["unknown"], "model") == [[float(i)] for i in range(len(texts))] + [None]
+    assert cache.get_memory(texts[-1:], "model") == [[float(len(texts) - 1)]]
+    assert cache.stats()["disk_hits"] == len(texts)
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_entries_are_not_served(tmp_path):
+    cache = EmbeddingCache(ttl_seconds=-1, disk_path=str(tmp_path / "embeddings.sqlite"))
+    cache.set("net profit", "model", [1.0])
+    assert cache.get("net profit", "model") is None
+
+
+def test_without_disk_tier(tmp_path):
+    cache = EmbeddingCache()
+    cache.set("net profit", "model", [1.0])
+    assert cache.get("net profit", "model") == [1.0]
+    assert cache.get_disk(["revenue"], "model") == [None]
+
+
+def test_unreadable_disk_tier_counts_as_misses(tmp_path):
+    cache = EmbeddingCache(disk_path=str(tmp_path / "embeddings.sqlite"))
+    cache.set("net profit", "model", [1.0])
+    cache.entries.clear()
+    cache.disk.execute("DROP TABLE embeddings")
+    assert cache.get_disk(["net profit", "revenue"], "model") == [None, None]
+    assert cache.stats()["misses"] == 2
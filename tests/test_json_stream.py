@@ -0,0 +1,73 @@
+import json
+
+from src.forecasting_agent.models.forecast_schema import forecast_parser, is_forecast_field, parse_forecast
+from src.utils.json_stream import IncrementalJSONParser, parse_partial_json
+
+BRACE_IN_PROSE = 'Based on the {context} provided:\n```json\n{"forecast": {"risks": "FX"}}\n```'
+
+
+def stream(parser, text, chunk_size=1):
+    completed = []
+    for i in range(0, len(text), chunk_size):
+        completed.extend(parser.feed(text[i:i + chunk_size]))
+    return completed
+
+
+def test_clean_document():
+    assert parse_partial_json('{"a": [1, 2, {"b": null}]}') == {"a": [1, 2, {"b": None}]}
+
+
+def test_missing_comma_between_members():
+    assert parse_partial_json('{"a": 1 "b": 2}') == {"a": 1, "b": 2}
+    assert parse_partial_json('{"a": "x"\n"b": "y"}') == {"a": "x", "b": "y"}
+
+
+def test_missing_comma_between_elements():
+    assert parse_partial_json('["x" "y", 1 "z"]') == ["x", "y", 1, "z"]
+
+
+def test_trailing_comma_and_truncation():
+    assert parse_partial_json('{"a": 1, "b": [1, 2,], "c": "trunc') == {"a": 1, "b": [1, 2]}
+
+
+def test_fenced_block_preferred_over_prose_braces():
+    forecast = parse_forecast(BRACE_IN_PROSE)
+    assert forecast is not None
+    assert forecast.forecast.risks == "FX"
+
+
+def test_rejected_root_starts_over_at_next_brace():
+    text = 'See {the data: here} and {"forecast": {"risks": "FX"}}'
+    assert parse_forecast(text).forecast.risks == "FX"
+
+
+def test_truncated_fenced_answer_after_unclosed_prose_brace():
+    text = 'Use {the data\n```json\n{"forecast": {"risks": "FX", "opportunities": "A'
+    assert parse_forecast(text).forecast.risks == "FX"
+
+
+def test_closing_fence_ends_unclosed_document():
+    forecast = parse_forecast('{"forecast": {"risks": "FX"}\n```\nThat is all.')
+    assert forecast.forecast.risks == "FX"
+
+
+def test_streamed_fields_after_brace_in_prose():
+    parser = forecast_parser()
+    completed = stream(parser, BRACE_IN_PROSE)
+    assert [(path, value) for path, value in completed if is_forecast_field(path)] == [(("forecast", "risks"), "FX")]
+    assert parser.value() == {"forecast": {"risks": "FX"}}
+
+
+def test_streamed_chunks_match_whole_parse():
+    document = {"forecast": {"risks": "FX", "opportunities": ["AI", "cloud"]}, "note": 1.5}
+    text = "```json\n" + json.dumps(document, indent=2) + "\n```"
+    for chunk_size in (1, 7, len(text)):
+        parser = IncrementalJSONParser(roots="{")
+        stream(parser, text, chunk_size)
+        assert parser.value() == document
+
+
+def test_outlook_is_what_makes_an_answer_usable():
+    assert parse_forecast('{"forecast": {"risks": "FX"}}').has_outlook()
+    assert not parse_forecast('{"qualitative_analysis": {"management_sentiment": "upbeat"}}').has_outlook()
+    assert not parse_forecast('{"forecast": {"risks": ""}, "sales": "1,200"}').has_outlook()
@@ -0,0 +1,28 @@
+import pytest
+
+from src.data_layer.lexical_index import matches_filter
+
+METADATA = {"type": "transcript", "fiscal_year": 2026, "quarter": "Q2"}
+
+
+def test_equality_and_membership():
+    assert matches_filter(METADATA, {"type": "transcript"})
+    assert matches_filter(METADATA, {"type": {"$ne": "report"}, "quarter": {"$in": ["Q1", "Q2"]}})
+    assert not matches_filter(METADATA, {"quarter": {"$nin": ["Q2"]}})
+
+
+def test_range_operators():
+    assert matches_filter(METADATA, {"fiscal_year": {"$gte": 2026, "$lt": 2027}})
+    assert not matches_filter(METADATA, {"fiscal_year": {"$gt": 2026}})
+    assert not matches_filter(METADATA, {"fiscal_year": {"$lte": 2025}})
+    assert matches_filter(METADATA, {"$or": [{"fiscal_year": {"$lt": 2020}}, {"type": "transcript"}]})
+
+
+def test_range_on_missing_or_text_value_does_not_match():
+    assert not matches_filter(METADATA, {"quarter": {"$gt": 1}})
+    assert not matches_filter(METADATA, {"page": {"$lte": 10}})
+
+
+def test_unsupported_operator_raises():
+    with pytest.raises(ValueError):
+        matches_filter(METADATA, {"type": {"$exists": True}})
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import groq
+import pytest
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fakes import RateLimitedChatModel
+from src.utils.llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, ScheduledChatModel, parse_duration
+
+
+def test_parse_duration():
+    assert parse_duration("2m59.56s") == pytest.approx(179.56)
+    assert parse_duration("120ms") == pytest.approx(0.12)
+    assert parse_duration("7") == 7.0
+    assert parse_duration("soon") is None
+
+
+def test_interactive_calls_are_served_before_waiting_batch_calls():
+    async def run():
+        scheduler = LLMScheduler(requests_per_minute=1, tokens_per_minute=0, period_seconds=0.05,
+                                 interactive_reserve=0)
+        await scheduler.acquire(1, BATCH)
+        served = []
+
+        async def call(name, priority):
+            await scheduler.acquire(1, priority)
+            served.append(name)
+
+        tasks = [asyncio.create_task(call("batch-1", BATCH)), asyncio.create_task(call("batch-2", BATCH))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call("interactive", INTERACTIVE)))
+        await asyncio.gather(*tasks)
+        return served
+
+    assert asyncio.run(run()) == ["interactive", "batch-1", "batch-2"]
+
+
+def test_batch_calls_leave_the_interactive_reserve():
+    scheduler = LLMScheduler(requests_per_minute=10, tokens_per_minute=0, interactive_reserve=0.5)
+    for _ in range(5):
+        scheduler.take(0)
+    assert scheduler.delay(0, BATCH) > 0
+    assert scheduler.delay(0, INTERACTIVE) == 0
+
+
+def scheduled_model(max_retries):
+    provider = RateLimitedChatModel(requests_per_window=1, window_seconds=0.3, latency_seconds=0)
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0, max_retries=max_retries,
+                             backoff_base_seconds=0.01, backoff_max_seconds=1)
+    return provider, ScheduledChatModel(model=provider, scheduler=scheduler)
+
+
+def test_rate_limited_call_waits_for_the_retry_hint():
+    provider, model = scheduled_model(max_retries=3)
+
+    async def run():
+        messages = [HumanMessage(content="forecast")]
+        await model.ainvoke(messages)
+        start_time = time.monotonic()
+        response = await model.ainvoke(messages)
+        return response, time.monotonic() - start_time
+
+    response, seconds = asyncio.run(run())
+    assert response.content
+    assert provider.quota.rejected >= 1
+    assert seconds >= 0.25
+
+
+def test_rate_limit_fails_once_retries_are_exhausted():
+    provider, model = scheduled_model(max_retries=0)
+
+    async def run():
+        messages = [HumanMessage(content="forecast")]
+        await model.ainvoke(messages)
+        await model.ainvoke(messages)
+
+    with pytest.raises(groq.RateLimitError):
+        asyncio.run(run())
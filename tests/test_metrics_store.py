@@ -0,0 +1,28 @@
+from src.data_layer.metrics_store import MetricsStore
+
+
+def store_with_sales(tmp_path, period_ends):
+    store = MetricsStore(str(tmp_path / "metrics.sqlite"))
+    store.index_company("TCS", [
+        {"source_file": "tcs.xlsx", "ticker": "TCS", "company": "TCS", "metric": "sales", "label": "Sales",
+         "period_type": "quarter", "period_end": period_end, "period": period_end, "value": value, "unit": "INR Cr"}
+        for period_end, value in period_ends
+    ])
+    return store
+
+
+def test_changes_against_previous_and_year_ago_quarters(tmp_path):
+    store = store_with_sales(tmp_path, [("2024-06-30", 100), ("2024-09-30", 105), ("2024-12-31", 110),
+                                        ("2025-03-31", 120), ("2025-06-30", 130)])
+    result = store.lookup("TCS", "sales")
+    assert result["qoq"]["period"] == "2025-03-31"
+    assert result["yoy"]["period"] == "2024-06-30"
+
+
+def test_missing_quarter_is_not_replaced_by_an_earlier_one(tmp_path):
+    # 2024-12-31 is missing from the sheet
+    store = store_with_sales(tmp_path, [("2024-03-31", 90), ("2024-06-30", 100), ("2024-09-30", 105),
+                                        ("2025-03-31", 120), ("2025-06-30", 130)])
+    assert store.lookup("TCS", "sales", "2025-03-31")["qoq"] is None
+    assert store.lookup("TCS", "sales", "2025-03-31")["yoy"]["period"] == "2024-03-31"
+    assert store.lookup("TCS", "sales")["yoy"]["period"] == "2024-06-30"
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_extraction.structured_data_handler import StructuredDataHandler
+
+FRAMES = {
+    "int_and_float": pd.DataFrame({"a": [1, 2], "b": [1.5, np.nan]}),
+    "ints": pd.DataFrame({"a": [1, 2], "b": [3, 4]}),
+    "mixed_types": pd.DataFrame({"a": [1, 2], "b": [1.5, 2.5], "c": ["x", None]}),
+    "bool_and_int": pd.DataFrame({"a": [True, False], "b": [1, 2]}),
+    "dates_and_floats": pd.DataFrame({"a": pd.to_datetime(["2025-06-30", "2025-09-30"]), "b": [1.5, 2.0]}),
+}
+
+
+@pytest.mark.parametrize("name", FRAMES)
+def test_rows_serialize_like_iterrows(name):
+    df = FRAMES[name]
+    rows = StructuredDataHandler.join_columns(StructuredDataHandler.to_str_frame(StructuredDataHandler.upcast_rows(df)), ",").tolist()
+    assert rows == [",".join(map(str, row.values)) for _, row in df.iterrows()]
+
+
+def test_int_and_float_rows_are_upcast():
+    str_df = StructuredDataHandler.to_str_frame(StructuredDataHandler.upcast_rows(FRAMES["int_and_float"]))
+    assert StructuredDataHandler.join_columns(str_df, ",").tolist() == ["1.0,1.5", "2.0,nan"]
+
+
+def test_cells_keep_their_column_type_without_upcast():
+    str_df = StructuredDataHandler.to_str_frame(FRAMES["int_and_float"])
+    assert StructuredDataHandler.join_columns(str_df, ",").tolist() == ["1,1.5", "2,nan"]
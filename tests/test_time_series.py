@@ -0,0 +1,38 @@
+import numpy as np
+
+from src.data_layer.metrics_store import MetricsStore
+from src.forecasting_agent.models.time_series import QuantForecaster, calendar_values
+
+
+def rows(period_ends, values):
+    return [
+        {"source_file": "tcs.xlsx", "ticker": "TCS", "company": "TCS", "metric": "sales", "label": "Sales",
+         "period_type": "quarter", "period_end": period_end, "period": period_end, "value": value, "unit": "INR Cr"}
+        for period_end, value in zip(period_ends, values)
+    ]
+
+
+def test_missing_quarter_is_interpolated_on_the_calendar():
+    values, interpolated = calendar_values(
+        rows(["2024-06-30", "2024-09-30", "2025-03-31", "2025-06-30"], [100, 110, 130, 140]), "quarter"
+    )
+    assert interpolated == 1
+    np.testing.assert_allclose(values, [100, 110, 120, 130, 140])
+
+
+def test_contiguous_series_is_unchanged():
+    values, interpolated = calendar_values(rows(["2024-12-31", "2025-03-31", "2025-06-30"], [1, 2, 3]), "quarter")
+    assert interpolated == 0
+    np.testing.assert_allclose(values, [1, 2, 3])
+
+
+def test_gapped_trend_is_extrapolated_from_the_calendar(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.sqlite"))
+    # A straight line of +10 a quarter with 2024-12-31 missing
+    store.index_company("TCS", rows(["2024-06-30", "2024-09-30", "2025-03-31", "2025-06-30"], [100, 110, 130, 140]))
+    forecast = QuantForecaster(store, horizon=2).forecast("TCS", "sales")
+    assert forecast["history_periods"] == 5
+    assert forecast["interpolated_periods"] == 1
+    points = forecast["models"]["linear_trend"]["forecast"]
+    assert [point["period_end"] for point in points] == ["2025-09-30", "2025-12-31"]
+    assert [point["value"] for point in points] == [150.0, 160.0]